@@ -0,0 +1,3 @@
+"""
+Performance benchmarks of the aligners, see benchmarks.run
+"""
@@ -0,0 +1,91 @@
+"""
+Compare two benchmark reports written by benchmarks.run.
+
+    python -m benchmarks.compare before.json after.json --tolerance 0.2
+
+Exits with 1 when a case got slower or bigger by more than the tolerance, when its cost gap to the optimum grew,
+or when it stopped finishing.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+_KEY = ('case', 'scoring', 'length', 'error_rate', 'seed')
+
+
+def _by_key(report: Dict) -> Dict[Tuple, Dict]:
+    return {tuple(result[name] for name in _KEY): result for result in report['results']}
+
+
+def _ratio(before, after):
+    if before is None or after is None:
+        return None
+    return after / before if before else (1. if not after else float('inf'))
+
+
+def compare(before: Dict, after: Dict, tolerance: float = 0.2) -> List[Dict]:
+    """
+    Changes of the cases measured in both reports.
+
+    :param before: report of the baseline
+    :param after: report of the candidate
+    :param tolerance: relative time and memory increase accepted before a case counts as a regression
+    :return: per case: key, time and memory ratios (after / before), both cost gaps and a list of regressions
+    :rtype: list
+    """
+    old = _by_key(before)
+    changes = []
+    for key, new_result in _by_key(after).items():
+        old_result = old.get(key)
+        if old_result is None:
+            continue
+        change = dict(zip(_KEY, key))
+        regressions = []
+        if old_result['status'] == 'ok' and new_result['status'] != 'ok':
+            regressions.append(new_result['status'])
+        if old_result['status'] == 'ok' and new_result['status'] == 'ok':
+            change['time'] = _ratio(old_result['seconds'], new_result['seconds'])
+            change['memory'] = _ratio(old_result.get('peak_bytes'), new_result.get('peak_bytes'))
+            change['gap'] = (old_result.get('cost_gap'), new_result.get('cost_gap'))
+            if change['time'] > 1 + tolerance:
+                regressions.append('time')
+            if change['memory'] is not None and change['memory'] > 1 + tolerance:
+                regressions.append('memory')
+            if None not in change['gap'] and change['gap'][1] > change['gap'][0] + 1e-9:
+                regressions.append('gap')
+        change['status'] = (old_result['status'], new_result['status'])
+        change['regressions'] = regressions
+        changes.append(change)
+    return changes
+
+
+def format_change(change: Dict) -> str:
+    head = "{case:<20} {scoring:<12} n={length:<8} err={error_rate:<5}".format(**change)
+    if 'time' not in change:
+        return "{} {} -> {}".format(head, *change['status'])
+    memory = "{:6.2f}x mem".format(change['memory']) if change['memory'] is not None else ""
+    gap = "gap {} -> {}".format(*change['gap'])
+    flags = " REGRESSION: {}".format(', '.join(change['regressions'])) if change['regressions'] else ""
+    return "{} {:6.2f}x time {} {}{}".format(head, change['time'], memory, gap, flags)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    with open(args.before) as ifp:
+        before = json.load(ifp)
+    with open(args.after) as ifp:
+        after = json.load(ifp)
+    changes = compare(before, after, args.tolerance)
+    for change in changes:
+        print(format_change(change))
+    return 1 if any(change['regressions'] for change in changes) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Time, peak memory and cost gap of every engine / scoring combination on synthetic pairs.
+
+    python -m benchmarks.run --sizes 100 1000 10000 --error-rates 0.05 0.2 --output before.json
+    python -m benchmarks.compare before.json after.json
+
+Every measurement runs in a process of its own, so peak memory (how far the alignment raises the resident memory
+high-water mark) is not polluted by earlier cases and a case which exceeds --timeout can be stopped. The optimum
+each cost is compared against comes from the full DP (or Hirschberg's linear memory DP) and is left out where even
+that is too large.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from queue import Empty
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # not on windows; peak memory is left out
+    resource = None
+
+from benchmarks.synthetic import make_pair
+from yasa import EXACT_MAX_CELLS, make_aligner
+
+# case -> make_aligner arguments, plus the longest source each case is run on
+CASES = {
+    'beam-10': dict(engine='beam', heap_size=10, max_length=100000),
+    'beam-100': dict(engine='beam', heap_size=100, max_length=100000),
+    'beam-100-width-1': dict(engine='beam', heap_size=100, beam_size=1, max_length=100000),
+    'beam-100-recombine': dict(engine='beam', heap_size=100, recombine=True, max_length=100000),
+    'astar-bag': dict(engine='beam', heuristic='bag', max_length=3000),
+    'exact': dict(engine='exact', max_length=5000),
+    'banded': dict(engine='banded', max_length=1000000),
+    'hirschberg': dict(engine='hirschberg', max_length=20000),
+    'anchored-beam': dict(engine='beam', heap_size=100, anchors=True, max_length=1000000),
+    'anchored-exact': dict(engine='exact', anchors=True, max_length=1000000),
+}
+SCORINGS = ('levinshtein', 'nested')
+# nested scoring calls a Levinshtein distance per substitution; keep it to sizes which finish
+NESTED_MAX_LENGTH = 10000
+# largest table the optimum is computed for with Hirschberg's algorithm
+REFERENCE_MAX_CELLS = 400000000
+
+
+def _aligner(case: str, scoring: str):
+    settings = dict(CASES[case]) if case in CASES else dict(engine=case)
+    settings.pop('max_length', None)
+    return make_aligner(settings.pop('heap_size', 100), settings.pop('beam_size', 0), scoring, **settings)
+
+
+def reference_engine(length: int, target_length: int) -> Optional[str]:
+    """Exact engine the optimum is computed with, or None when the table is too large"""
+    cells = length * target_length
+    if cells <= EXACT_MAX_CELLS:
+        return 'exact'
+    if cells <= REFERENCE_MAX_CELLS:
+        return 'hirschberg'
+    return None
+
+
+def _max_rss() -> Optional[int]:
+    """High-water mark of this process' resident memory in bytes"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def measure(case: str, scoring: str, length: int, error_rate: float, seed: int = 0, repeat: int = 1) -> Dict:
+    """
+    Align one synthetic pair repeat times, keeping the fastest time. Peak memory is how far the first run raised
+    the resident memory high-water mark, so it is only meaningful in a fresh process (see measure_isolated).
+
+    :param case: key of CASES, or an engine name
+    :param scoring: 'levinshtein' or 'nested'
+    :param length: source length
+    :param error_rate: edits per token of the target
+    :param seed: seed of the pair
+    :param repeat: number of timed runs
+    :rtype: dict
+    """
+    source, target = make_pair(length, error_rate, seed)
+    before = _max_rss()
+    seconds = []
+    peak_bytes = alignment = None
+    for run_n in range(max(repeat, 1)):
+        aligner = _aligner(case, scoring)
+        start = time.perf_counter()
+        alignment = aligner.align(source, target)
+        seconds.append(time.perf_counter() - start)
+        if run_n == 0 and before is not None:
+            peak_bytes = _max_rss() - before
+
+    return dict(case=case, scoring=scoring, length=length, target_length=len(target), error_rate=error_rate,
+                seed=seed, status='ok', seconds=min(seconds), peak_bytes=peak_bytes, cost=float(alignment.cost),
+                errors=alignment.errors_n())
+
+
+def _measure_into(queue, kwargs):
+    try:
+        queue.put(measure(**kwargs))
+    except Exception as e:
+        queue.put(dict(kwargs, status='error', error=repr(e)))
+
+
+def measure_isolated(timeout: float, **kwargs) -> Dict:
+    """measure() in a process of its own, stopped after timeout seconds"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure_into, args=(queue, kwargs))
+    process.start()
+    try:
+        result = queue.get(timeout=timeout)
+    except Empty:
+        process.terminate()
+        result = dict(kwargs, status='timeout')
+    process.join()
+    result.pop('repeat', None)
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(cases: List[str], scorings: List[str], sizes: List[int], error_rates: List[float], seed: int = 0,
+        repeat: int = 1, timeout: float = 300., log=sys.stderr) -> Dict:
+    """
+    Measure every case on every scoring, size and error rate, skipping combinations past a case's max_length.
+
+    :return: {'meta': ..., 'results': [...]} with cost_gap (cost - optimum) set where the optimum is known
+    :rtype: dict
+    """
+    results = []
+    for scoring in scorings:
+        for length in sizes:
+            if scoring == 'nested' and length > NESTED_MAX_LENGTH:
+                continue
+            for error_rate in error_rates:
+                settings = dict(scoring=scoring, length=length, error_rate=error_rate, seed=seed)
+                target_length = len(make_pair(length, error_rate, seed)[1])
+                engine = reference_engine(length, target_length)
+                optimum = None
+                if engine is not None:
+                    reference = measure_isolated(timeout, case=engine, **settings)
+                    if reference['status'] == 'ok':
+                        optimum = reference['cost']
+
+                for case in cases:
+                    if length > CASES[case]['max_length']:
+                        continue
+                    result = measure_isolated(timeout, case=case, repeat=repeat, **settings)
+                    result['optimum'] = optimum
+                    result['cost_gap'] = (result['cost'] - optimum
+                                          if optimum is not None and result['status'] == 'ok' else None)
+                    results.append(result)
+                    if log is not None:
+                        print(format_result(result), file=log)
+                        log.flush()
+
+    meta = dict(commit=_git_commit(), python=platform.python_version(), numpy=np.__version__,
+                platform=platform.platform(), date=datetime.datetime.now().isoformat(timespec='seconds'),
+                repeat=repeat, timeout=timeout)
+    return dict(meta=meta, results=results)
+
+
+def format_result(result: Dict) -> str:
+    head = "{case:<20} {scoring:<12} n={length:<8} err={error_rate:<5}".format(**result)
+    if result['status'] != 'ok':
+        return "{} {}".format(head, result['status'])
+    peak = "{:10.1f}MB".format(result['peak_bytes'] / 1e6) if result['peak_bytes'] is not None else ""
+    gap = "gap={:g}".format(result['cost_gap']) if result['cost_gap'] is not None else "gap=?"
+    return "{} {:9.3f}s {} cost={:g} {}".format(head, result['seconds'], peak, result['cost'], gap)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--scorings', nargs='+', default=list(SCORINGS), choices=list(SCORINGS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000])
+    parser.add_argument('--error-rates', nargs='+', type=float, default=[0.05, 0.2])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case, the fastest is kept")
+    parser.add_argument('--timeout', type=float, default=300., help="seconds before a case is stopped")
+    parser.add_argument('--output', help="JSON file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args.cases, args.scorings, args.sizes, args.error_rates, args.seed, args.repeat,
+                 args.timeout)
+    if args.output:
+        with open(args.output, 'w') as ofp:
+            json.dump(report, ofp, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Synthetic (source, target) pairs of controlled length and error rate
+"""
+import random
+from typing import List, Tuple
+
+_LETTERS = 'etaoinshrdlucmfwypvbgkjqxz'
+
+
+def vocabulary(size: int, rng: random.Random) -> List[str]:
+    """size distinct pseudo-words of 1 to 10 letters"""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(_LETTERS) for _ in range(rng.randint(1, 10))))
+    return sorted(words)
+
+
+def tokens(length: int, words: List[str], rng: random.Random) -> List[str]:
+    """length words drawn with Zipfian frequencies, like running text"""
+    weights = [1. / rank for rank in range(1, len(words) + 1)]
+    return rng.choices(words, weights, k=length)
+
+
+def jumble(tokens: List, swap_prob: float, rng: random.Random, distance: int = 5):
+    """swap tokens in place with a token at most distance positions ahead"""
+    for i in range(len(tokens) - 1):
+        if rng.random() < swap_prob:
+            swapx = rng.randint(i + 1, min(i + distance, len(tokens) - 1))
+            tokens[i], tokens[swapx] = tokens[swapx], tokens[i]
+
+
+def del_some(tokens: List, del_prob: float, rng: random.Random, m_del_prob: float = 0.4) -> List:
+    """drop tokens with probability del_prob, each deletion extending to the next token with m_del_prob"""
+    kept = []
+    i = 0
+    while i < len(tokens):
+        if rng.random() > del_prob:
+            kept.append(tokens[i])
+        else:
+            while rng.random() < m_del_prob:
+                i += 1
+        i += 1
+    return kept
+
+
+def sub_some(tokens: List, sub_prob: float, words: List[str], rng: random.Random) -> List:
+    """replace tokens with a random word, and insert random words, with probability sub_prob each"""
+    changed = []
+    for token in tokens:
+        changed.append(rng.choice(words) if rng.random() < sub_prob else token)
+        if rng.random() < sub_prob:
+            changed.append(rng.choice(words))
+    return changed
+
+
+def make_pair(length: int, error_rate: float, seed: int = 0, vocabulary_size: int = 5000) -> Tuple[List, List]:
+    """
+    A source of length tokens and a target with about error_rate errors per source token, split between
+    substitutions, insertions, (multi-token) deletions and local swaps.
+
+    :param length: number of source tokens
+    :param error_rate: rough number of edits per token
+    :param seed: same seed, same pair
+    :param vocabulary_size: number of distinct words
+    :rtype: tuple
+    """
+    rng = random.Random(seed)
+    words = vocabulary(vocabulary_size, rng)
+    source = tokens(length, words, rng)
+    target = del_some(source, error_rate / 4, rng)
+    target = sub_some(target, error_rate / 4, words, rng)
+    jumble(target, error_rate / 8, rng)
+    return source, target
@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(name='YASA',
       version='0.2.0',
@@ -8,6 +8,12 @@ setup(name='YASA',
       url='https://github.com/riklopfer/YASA',
       packages=['yasa'],
       install_requires=[
+          'numpy',
       ],
-      python_requires='>=3.7'
+      python_requires='>=3.7',
+      entry_points={
+          'console_scripts': [
+              'yasa-score = yasa.cli:main',
+          ],
+      },
       )
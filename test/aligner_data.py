@@ -1,5 +1,6 @@
 # coding=utf-8
 import os.path
+import random
 
 _THIS_LOC = os.path.dirname(__file__)
 
@@ -9,6 +10,28 @@ def load_declaration() -> str:
         return ifp.read().strip()
 
 
+WORDS = "the cat and a hat sat on mat with bat".split()
+
+
+def random_pairs(n, seed=0, words=WORDS, max_length=20, substitute=None, delete=0.):
+    """
+    n random (source, target) pairs of 0 to max_length words, the same for the same seed. Targets are drawn like
+    the sources, or with substitute, made from the source by dropping each token with probability delete and
+    replacing the others with a random word with probability substitute.
+    """
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n):
+        source = [rng.choice(words) for _ in range(rng.randint(0, max_length))]
+        if substitute is None:
+            target = [rng.choice(words) for _ in range(rng.randint(0, max_length))]
+        else:
+            target = [rng.choice(words) if rng.random() < substitute else token for token in source
+                      if rng.random() > delete]
+        pairs.append((source, target))
+    return pairs
+
+
 WORD_SOURCE_TARGET_PAIRS = [
     # disproportionately long target
     ("how many chucks could a wood chuck",
@@ -5,8 +5,13 @@ import random
 import re
 import unittest
 
+import pytest
+
 import aligner_data
 import yasa
+from yasa.aligner import (Aligner, Alignment, AlignmentType, BackpointerStore, BoundedNodeHeap,
+                          Insertion, Match, NodeHeap)
+from yasa.heuristic import RemainingCost
 
 # do we want randomized results to be reproducible?
 random.seed(98723432)
@@ -116,3 +121,257 @@ def test_error_counts_2():
         print('{}\t{}'.format(error, count))
 
     assert 2 == len(error_counts)
+
+
+def test_recombine_keeps_cheapest_per_cell():
+    heap = NodeHeap(0, 0, recombine=True)
+    # (rank, source_pos, target_pos, parent, op, cost)
+    heap.add((2., 0, 0, 1, 4, 2.))
+    heap.add((1., 0, 0, 0, 2, 1.))
+    heap.add((2., 0, 0, 2, 3, 2.))
+    heap.add((1., 1, 0, 0, 4, 1.))
+    assert 2 == len(heap)
+    assert (1., 0, 0, 0, 2, 1.) in list(heap)
+
+
+def test_recombine_big_text():
+    text = aligner_data.load_declaration()
+    target = del_some(get_words(text))
+    source = del_some(get_words(text))
+    plain = yasa.align(source, target, heap_size=10, engine='beam')
+    recombined = yasa.align(source, target, heap_size=10, recombine=True, engine='beam')
+    assert recombined.cost <= plain.cost
+    assert recombined.cost == recombined.errors_n()
+
+
+def test_bounded_heap_matches_sorted_heap():
+    scorer = yasa.LevinshteinScoring()
+    pairs = [(get_words(source), get_words(target)) for source, target in aligner_data.WORD_SOURCE_TARGET_PAIRS]
+    # a small vocabulary gives many ties in cost, which both heaps must break the same way
+    pairs += aligner_data.random_pairs(150, 11, "the of and to a in".split(), 30)
+    for recombine in (False, True):
+        for heap_size, beam in ((5, 0), (10, 2), (20, 2), (50, 1)):
+            expected_aligner = Aligner(scorer, heap_size, beam, recombine=recombine)
+            bounded_aligner = Aligner(scorer, heap_size, beam, recombine=recombine, heap_class=BoundedNodeHeap)
+            for source, target in pairs:
+                expected = expected_aligner.align(source, target)
+                bounded = bounded_aligner.align(source, target)
+                assert expected.cost == bounded.cost
+                assert list(expected) == list(bounded)
+
+
+def test_bounded_heap_recombine():
+    text = aligner_data.load_declaration()
+    target = del_some(get_words(text))
+    source = del_some(get_words(text))
+    scorer = yasa.LevinshteinScoring()
+    for beam in (0, 2):
+        expected = Aligner(scorer, 10, beam, recombine=True).align(source, target)
+        bounded = Aligner(scorer, 10, beam, recombine=True, heap_class=BoundedNodeHeap).align(source, target)
+        assert expected.cost == bounded.cost
+        assert list(expected) == list(bounded)
+
+
+def test_long_alignment_trace_back():
+    # deep node chains must neither recurse nor compare nodes structurally while tracing back
+    source = list(range(20000))
+    target = list(range(20000))
+    alignment = yasa.align(source, target, heap_size=3, engine='beam')
+    assert 20000 == alignment.size()
+    assert 0 == alignment.errors_n()
+    assert alignment.node_at(-1) == alignment.node_at(-1)
+
+
+def test_store_compaction():
+    text = aligner_data.load_declaration()
+    target = del_some(get_words(text))
+    source = del_some(get_words(text))
+    scorer = yasa.LevinshteinScoring()
+    expected = Aligner(scorer, 20, 0).align(source, target)
+
+    compacting = Aligner(scorer, 20, 0)
+    compacting.COMPACT_THRESHOLD = 100
+    alignment = compacting.align(source, target)
+    assert expected.cost == alignment.cost
+    assert list(expected) == list(alignment)
+
+
+def test_store_trace():
+    store = BackpointerStore()
+    start = store.append(0, -1, 0.)
+    match = store.append(1, start, 0.)
+    store.append(2, start, 1.)
+    ins = store.append(3, match, 1.)
+    assert [match, ins] == store.trace(ins)
+
+    remap = store.compact([ins])
+    assert 3 == len(store)
+    assert [1, 2] == store.trace(remap[ins])
+
+
+def test_alignment_from_nodes():
+    start = Aligner.START_NODE
+    final = Insertion(Match(start, 0), 1)
+    alignment = Alignment(final, ['a'], ['a', 'b'])
+    assert 1 == alignment.cost
+    assert [('a', 'a'), (None, 'b')] == list(alignment)
+    assert AlignmentType.INS == alignment.node_at(1).align_type
+
+
+def test_astar_is_optimal():
+    rng = random.Random(17)
+    for scorer in (yasa.LevinshteinScoring(), yasa.FixedScoring(2, 1, 2.5, 0), yasa.FixedScoring(1, 3, 1, 0.5)):
+        for _ in range(50):
+            source = [rng.choice('abcde') for _ in range(rng.randint(0, 12))]
+            target = [rng.choice('abcdf') for _ in range(rng.randint(0, 12))]
+            optimal = yasa.ExactAligner(scorer).align(source, target).cost
+            for heuristic in ('length', 'bag'):
+                alignment = Aligner(scorer, 0, 0, heuristic=heuristic).align(source, target)
+                assert optimal == pytest.approx(alignment.cost)
+                assert source == [s for s, _ in alignment if s is not None]
+                assert target == [t for _, t in alignment if t is not None]
+
+
+def test_astar_text():
+    words = get_words(aligner_data.load_declaration())[:300]
+    source, target = del_some(words), del_some(words)
+    optimal = yasa.align(source, target, engine='exact').cost
+    assert optimal == yasa.align(source, target, engine='beam', heuristic='bag').cost
+
+
+def test_astar_falls_back_to_beam():
+    random.seed(31)
+    words = get_words(aligner_data.load_declaration())[:300]
+    source, target = del_some(words), del_some(words)
+    scorer = yasa.LevinshteinScoring()
+    optimal = yasa.ExactAligner(scorer).align(source, target).cost
+    # a heap of 3 is too small to find the optimal alignment, so it shows the beam search ran
+    assert optimal < Aligner(scorer, 3, 0).align(source, target).cost
+    for heap_size in (3, 0):
+        capped = Aligner(scorer, heap_size, 0, heuristic='length')
+        capped.MAX_EXPANSIONS = 50
+        beam = Aligner(scorer, heap_size or capped.FALLBACK_HEAP_SIZE, 0)
+        expected = beam.align(source, target)
+        alignment = capped.align(source, target)
+        assert expected.cost == alignment.cost
+        assert list(expected) == list(alignment)
+        assert expected.cost == capped.distance(source, target)
+        assert beam.align(source, target, max_cost=expected.cost - 1) is None
+        assert capped.align(source, target, max_cost=expected.cost - 1) is None
+    # far enough from the cap, the search is still optimal
+    assert optimal == Aligner(scorer, 3, 0, heuristic='length').align(source, target).cost
+
+
+def test_remaining_cost_is_a_lower_bound():
+    rng = random.Random(5)
+    scorer = yasa.LevinshteinScoring()
+    for _ in range(30):
+        source = [rng.choice('abcd') for _ in range(rng.randint(0, 8))]
+        target = [rng.choice('abce') for _ in range(rng.randint(0, 8))]
+        vocabulary = yasa.Vocabulary()
+        source_ids, target_ids = vocabulary.encode(source).tolist(), vocabulary.encode(target).tolist()
+        estimates = [RemainingCost.for_scorer(kind, scorer, source, target, source_ids, target_ids)
+                     for kind in ('length', 'bag')]
+        for source_pos in range(-1, len(source)):
+            for target_pos in range(-1, len(target)):
+                remaining = yasa.ExactAligner(scorer).align(source[source_pos + 1:], target[target_pos + 1:]).cost
+                length, bag = (estimate(source_pos, target_pos) for estimate in estimates)
+                assert length <= bag <= remaining
+
+
+def test_astar_negative_costs():
+    # matches of the nested scoring have negative costs, so there is no bound and the beam search runs instead
+    assert RemainingCost.for_scorer('length', yasa.NestedLevinshteinScoring(), ['ab'], ['ab'], [0], [0]) is None
+    source = "this is a test of the beam aligner".split()
+    target = "that was a test of the bean aligner".split()
+    assert (yasa.align(source, target, scoring='nested', engine='beam').cost ==
+            yasa.align(source, target, scoring='nested', engine='beam', heuristic='bag').cost)
+    with pytest.raises(ValueError):
+        Aligner(yasa.LevinshteinScoring(), 10, 0, heuristic='nope')
+
+
+def test_counts_and_columns():
+    source = "this is a test of the beam aligner".split()
+    target = "that was a test of the bean aligner extra".split()
+    alignment = yasa.align(source, target)
+    assert len(alignment.matches()) == alignment.correct_n()
+    assert len(alignment.errors()) == alignment.errors_n()
+    assert 3 == alignment.substitutions_n()
+    assert 1 == alignment.insertions_n()
+    assert 0 == alignment.deletions_n()
+
+    columns = alignment.columns()
+    assert alignment.size() == len(columns['op'])
+    assert [yasa.aligner.OP_TYPES[op] for op in columns['op']] == [node.align_type for node in alignment._nodes()]
+    for (source_token, target_token), source_pos, target_pos in zip(alignment, columns['source_pos'],
+                                                                    columns['target_pos']):
+        assert source_token == (source[source_pos] if source_pos >= 0 else None)
+        assert target_token == (target[target_pos] if target_pos >= 0 else None)
+    assert alignment.cost == columns['cost'][-1]
+
+
+@pytest.mark.parametrize('options', [dict(), dict(recombine=True), dict(heuristic='bag'), dict(scoring='nested'),
+                                     dict(heap_size=5, beam=1)])
+def test_distance_matches_align(options):
+    random.seed(19)
+    words = get_words(aligner_data.load_declaration())[:120]
+    target = list(words)
+    jumble(target)
+    target = del_some(target)
+    options = dict(engine='beam', **options)
+    assert yasa.align(words, target, **options).cost == yasa.distance(words, target, **options)
+    assert yasa.distance([], [], **options) == 0.
+
+
+def test_distance_keeps_no_paths():
+    stores = []
+
+    class Spy(Aligner):
+        def _align_beam(self, *args):
+            stores.append(args[5])
+            return super(Spy, self)._align_beam(*args)
+
+    aligner = Spy(yasa.LevinshteinScoring(), 10, 0)
+    assert 2 == aligner.distance("a b c".split(), "a c d".split())
+    assert [None] == stores
+
+
+@pytest.mark.parametrize('options', [dict(), dict(heuristic='bag'), dict(anchors=True)])
+def test_max_cost(options):
+    random.seed(23)
+    words = get_words(aligner_data.load_declaration())[:80]
+    target = del_some(list(words))
+    options = dict(engine='beam', **options)
+    cost = yasa.distance(words, target, **options)
+    assert cost > 0
+    for max_cost in [cost, cost + 1, 10 * cost]:
+        assert yasa.distance(words, target, max_cost=max_cost, **options) == cost
+        assert yasa.align(words, target, max_cost=max_cost, **options).cost == cost
+    assert yasa.distance(words, target, max_cost=cost - 1, **options) is None
+    assert yasa.align(words, target, max_cost=cost / 2, **options) is None
+    assert yasa.align(words, list(reversed(words)), max_cost=0, **options) is None
+
+
+def test_max_cost_negative_costs():
+    # no lower bound to prune on, only the final cost is checked
+    scorer = yasa.FixedScoring(1, 1, 1, -0.5)
+    aligner = Aligner(scorer, 100, 0)
+    source, target = "a b c d".split(), "a x c d e".split()
+    cost = aligner.distance(source, target)
+    assert cost == aligner.distance(source, target, max_cost=cost)
+    assert aligner.align(source, target, max_cost=cost - 0.1) is None
+
+
+@pytest.mark.parametrize('heuristic', [None, 'length'])
+def test_max_cost_rounding(heuristic):
+    random.seed(29)
+    scorer = yasa.FixedScoring(0.7, 1.3, 1.1, 0)
+    aligner = Aligner(scorer, 50, 0, heuristic=heuristic)
+    for _ in range(20):
+        source = [random.choice('abcd') for _ in range(random.randint(5, 25))]
+        target = [random.choice('abcd') for _ in range(random.randint(5, 25))]
+        cost = aligner.distance(source, target)
+        # pruned hypotheses leave room in the beam, which may then find a cheaper alignment; A* is optimal anyway
+        bounded = aligner.distance(source, target, max_cost=cost)
+        assert bounded == cost if heuristic else bounded <= cost
+        assert aligner.align(source, target, max_cost=cost).cost == bounded
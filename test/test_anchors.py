@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import random
+
+import yasa
+from yasa.aligner import Aligner
+from yasa.anchors import AnchoredAligner, find_anchors
+from yasa.exact import ExactAligner
+from yasa.scoring import LevinshteinScoring
+
+
+def test_find_anchors():
+    source = "a x b c d e".split()
+    target = "a b y c e d".split()
+    vocabulary = yasa.Vocabulary()
+    runs = find_anchors(vocabulary.encode(source).tolist(), vocabulary.encode(target).tolist())
+    # d / e cross, so only one of them can be an anchor
+    assert [(0, 0, 1), (2, 1, 1), (3, 3, 1)] == runs[:3]
+    assert 4 == len(runs)
+
+
+def test_find_anchors_grows_runs():
+    source = "the cat sat on the mat".split()
+    target = "the cat sat on a mat".split()
+    vocabulary = yasa.Vocabulary()
+    runs = find_anchors(vocabulary.encode(source).tolist(), vocabulary.encode(target).tolist())
+    # 'the' is not unique in source, but is grown over from 'cat'
+    assert [(0, 0, 4), (5, 5, 1)] == runs
+
+
+def test_no_anchors():
+    source = "a a b b".split()
+    target = "b b a a".split()
+    alignment = AnchoredAligner(ExactAligner(LevinshteinScoring())).align(source, target)
+    assert ExactAligner(LevinshteinScoring()).align(source, target).cost == alignment.cost
+
+
+def test_anchored_alignment():
+    rng = random.Random(11)
+    words = ["w{}".format(x) for x in range(300)]
+    for _ in range(20):
+        source = rng.sample(words, rng.randint(0, 60))
+        target = [token for token in source if rng.random() > 0.2]
+        target = [rng.choice(words) if rng.random() < 0.1 else token for token in target]
+        for inner in (Aligner(LevinshteinScoring(), 100, 0), ExactAligner(LevinshteinScoring())):
+            alignment = AnchoredAligner(inner).align(source, target)
+            assert source == [s for s, _ in alignment if s is not None]
+            assert target == [t for _, t in alignment if t is not None]
+            assert alignment.cost == alignment.errors_n()
+        assert ExactAligner(LevinshteinScoring()).align(source, target).cost == alignment.cost
+
+
+def test_anchored_pool():
+    source = ["w{}".format(x) for x in range(2000)]
+    target = [token for x, token in enumerate(source) if x % 7] + ["extra"]
+    alignment = yasa.align(source, target, engine='beam', anchors=True)
+    pooled = AnchoredAligner(Aligner(LevinshteinScoring(), 100, 0), workers=2).align(source, target)
+    assert alignment.cost == pooled.cost
+    assert list(alignment) == list(pooled)
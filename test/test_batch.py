@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+import pytest
+
+import yasa
+from aligner_data import random_pairs
+
+
+def test_inline_matches_align():
+    pairs = random_pairs(20, 7)
+    for (source, target), alignment in zip(pairs, yasa.align_many(pairs, workers=1)):
+        assert yasa.align(source, target).cost == alignment.cost
+        assert list(yasa.align(source, target)) == list(alignment)
+
+
+def test_pool_ordered():
+    pairs = random_pairs(50, 7)
+    expected = [yasa.align(source, target).cost for source, target in pairs]
+    assert expected == list(yasa.align_many(pairs, workers=2, chunksize=7, result='cost'))
+
+
+def test_pool_unordered():
+    pairs = random_pairs(50, 7)
+    expected = [yasa.align(source, target) for source, target in pairs]
+    results = list(yasa.align_many(iter(pairs), workers=2, chunksize=4, ordered=False, result='counts',
+                                   max_pending=1))
+    assert sorted(idx for idx, _ in results) == list(range(len(pairs)))
+    for idx, (cost, correct_n, errors_n) in results:
+        assert expected[idx].cost == cost
+        assert expected[idx].correct_n() == correct_n
+        assert expected[idx].errors_n() == errors_n
+
+
+def test_pool_alignments():
+    pairs = random_pairs(10, 7)
+    for (source, target), alignment in zip(pairs, yasa.align_many(pairs, workers=2, chunksize=3, engine='beam')):
+        assert list(yasa.align(source, target, engine='beam')) == list(alignment)
+
+
+def test_unknown_result():
+    with pytest.raises(ValueError):
+        list(yasa.align_many([], result='nope'))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_max_cost(workers):
+    pairs = random_pairs(30, 7)
+    costs = [yasa.distance(source, target) for source, target in pairs]
+    max_cost = sorted(costs)[len(costs) // 2]
+    results = list(yasa.align_many(pairs, workers=workers, chunksize=4, result='cost', max_cost=max_cost))
+    assert results == [cost if cost <= max_cost else None for cost in costs]
+    alignments = list(yasa.align_many(pairs, workers=workers, chunksize=4, result='counts', max_cost=max_cost))
+    assert [alignment is None for alignment in alignments] == [cost > max_cost for cost in costs]
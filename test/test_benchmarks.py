@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+import copy
+
+import yasa
+from benchmarks import compare, run, synthetic
+
+
+def test_make_pair():
+    source, target = synthetic.make_pair(2000, 0.2, seed=1)
+    assert 2000 == len(source)
+    assert (source, target) == synthetic.make_pair(2000, 0.2, seed=1)
+    error_rate = yasa.align(source, target).errors_n() / len(source)
+    assert 0.1 < error_rate < 0.3
+    assert source == synthetic.make_pair(2000, 0., seed=1)[1]
+
+
+def test_measure_and_compare():
+    result = run.measure('exact', 'levinshtein', 200, 0.1, repeat=2)
+    assert 'ok' == result['status']
+    assert result['peak_bytes'] >= 0
+    assert result['errors'] == result['cost']
+
+    report = run.run(['beam-10', 'exact'], ['levinshtein'], [100], [0.1], repeat=1, timeout=60, log=None)
+    assert ['beam-10', 'exact'] == [result['case'] for result in report['results']]
+    assert 0 == report['results'][1]['cost_gap']
+    assert report['results'][0]['cost_gap'] >= 0
+
+    after = copy.deepcopy(report)
+    assert not any(change['regressions'] for change in compare.compare(report, after))
+    after['results'][0]['seconds'] *= 2
+    after['results'][1]['status'] = 'timeout'
+    changes = compare.compare(report, after, tolerance=0.5)
+    assert [['time'], ['timeout']] == [change['regressions'] for change in changes]
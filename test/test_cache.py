@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+import yasa
+from yasa.cache import fingerprint
+from yasa.factory import make_aligner
+from yasa.scoring import Scoring
+
+SOURCE = "this is a test of the beam aligner".split()
+TARGET = "that was a test of the bean aligner".split()
+
+
+def test_round_trip(tmpdir):
+    cache = yasa.AlignmentCache(str(tmpdir.join('cache.db')))
+    first = yasa.align(SOURCE, TARGET, engine='beam', cache=cache)
+    second = yasa.align(SOURCE, TARGET, engine='beam', cache=cache)
+    assert (1, 1) == (cache.misses, cache.hits)
+    assert first.cost == second.cost
+    assert list(first) == list(second)
+    assert first.errors_n() == second.errors_n()
+    assert 1 == len(cache)
+
+    # anything which may change the result is part of the key
+    yasa.align(SOURCE, TARGET, engine='beam', heap_size=10, cache=cache)
+    yasa.align(SOURCE, TARGET, engine='exact', cache=cache)
+    yasa.align(SOURCE, TARGET, engine='exact', scoring=yasa.FixedScoring(1, 1, 2, 0), cache=cache)
+    yasa.align(SOURCE, TARGET[:-1], engine='exact', cache=cache)
+    assert 5 == len(cache)
+    # ... but not the vocabulary tokens are interned with
+    yasa.align(SOURCE, TARGET, engine='exact', vocabulary=yasa.Vocabulary(['x']), cache=cache)
+    assert 2 == cache.hits
+
+
+def test_fingerprint_is_stable():
+    script = ("from yasa.factory import make_aligner; from yasa.cache import fingerprint; "
+              "print(fingerprint(make_aligner(20, 2, 'nested', True)))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    other_process = subprocess.check_output([sys.executable, '-c', script], env=env).decode().strip()
+    nested = make_aligner(20, 2, 'nested', True)
+    nested.scorer.substitution('abc', 'abd')
+    assert other_process == fingerprint(nested)
+    assert fingerprint(make_aligner(20, 2, 'nested', False)) != fingerprint(nested)
+
+
+def test_lru_eviction(tmpdir):
+    cache = yasa.AlignmentCache(str(tmpdir.join('cache.db')), max_entries=10)
+    cache.EVICT_EVERY = 1
+    aligner = yasa.CachedAligner(yasa.ExactAligner(yasa.LevinshteinScoring()), cache)
+    aligner.align(SOURCE, TARGET)
+    for n in range(30):
+        aligner.align(SOURCE, TARGET[:n % 8] + [str(n)])
+        # the first pair keeps being used, so it stays
+        aligner.align(SOURCE, TARGET)
+    assert len(cache) <= 10
+    assert 30 == cache.hits
+    assert cache.size_bytes() > 0
+
+    by_size = yasa.AlignmentCache(str(tmpdir.join('small.db')), max_bytes=1000)
+    by_size.EVICT_EVERY = 1
+    aligner = yasa.CachedAligner(yasa.ExactAligner(yasa.LevinshteinScoring()), by_size)
+    for n in range(100):
+        aligner.align(SOURCE * 3, TARGET + [str(n)])
+    assert by_size.size_bytes() <= 1000
+
+
+def test_align_many_shares_the_cache(tmpdir):
+    cache = yasa.AlignmentCache(str(tmpdir.join('cache.db')))
+    pairs = [(SOURCE, TARGET[:n]) for n in range(8)] * 2
+    first = list(yasa.align_many(pairs, workers=2, chunksize=3, result='cost', cache=cache))
+    assert 8 <= len(cache) <= 16
+    assert first == list(yasa.align_many(pairs, workers=1, result='cost', cache=cache))
+    assert (16, 0) == (cache.hits, cache.misses)
+
+    clone = pickle.loads(pickle.dumps(cache))
+    assert len(cache) == len(clone)
+    cache.clear()
+    assert 0 == len(clone)
+
+
+def test_max_cost(tmpdir):
+    cache = yasa.AlignmentCache(str(tmpdir.join('cache.db')))
+    cost = yasa.distance(SOURCE, TARGET, engine='exact')
+    # found under a cutoff: not stored
+    assert yasa.align(SOURCE, TARGET, engine='exact', cache=cache, max_cost=cost - 1) is None
+    assert yasa.distance(SOURCE, TARGET, engine='exact', cache=cache, max_cost=cost) == cost
+    assert 0 == len(cache)
+
+    yasa.align(SOURCE, TARGET, engine='exact', cache=cache)
+    assert yasa.align(SOURCE, TARGET, engine='exact', cache=cache, max_cost=cost).cost == cost
+    assert yasa.align(SOURCE, TARGET, engine='exact', cache=cache, max_cost=cost - 1) is None
+    assert yasa.distance(SOURCE, TARGET, engine='exact', cache=cache, max_cost=cost - 1) is None
+    assert 3 == cache.hits
+
+    # on a miss the aligner gets max_cost as given, and allows for rounding itself
+    class Recording(yasa.ExactAligner):
+        def _search(self, source, target, max_cost, trace):
+            cutoffs.append(max_cost)
+            return super(Recording, self)._search(source, target, max_cost, trace)
+
+    cutoffs = []
+    cached = yasa.CachedAligner(Recording(yasa.LevinshteinScoring()), cache)
+    cached.align(TARGET, SOURCE, max_cost=0.3)
+    cached.distance(TARGET, SOURCE, max_cost=0.3)
+    assert [0.3, 0.3] == cutoffs
+
+
+class GapScoring(Scoring):
+    """Levinshtein scoring with the cost of a gap given by a function of the token"""
+
+    def __init__(self, gap):
+        self.gap = gap
+
+    def insertion(self, token):
+        return self.gap(token)
+
+    def deletion(self, token):
+        return self.gap(token)
+
+    def substitution(self, source, target):
+        return 1.
+
+    def match(self, token):
+        return 0.
+
+
+def scaled(factor):
+    return lambda token: factor * len(token)
+
+
+def test_fingerprint_of_functions(tmpdir):
+    assert fingerprint(GapScoring(lambda token: 1.)) == fingerprint(GapScoring(lambda token: 1.))
+    assert fingerprint(GapScoring(lambda token: 1.)) != fingerprint(GapScoring(lambda token: 5.))
+    assert fingerprint(GapScoring(scaled(1))) != fingerprint(GapScoring(scaled(2)))
+    assert fingerprint(GapScoring(len)) != fingerprint(GapScoring(abs))
+
+    cache = yasa.AlignmentCache(str(tmpdir.join('cache.db')))
+    cheap = yasa.CachedAligner(yasa.ExactAligner(GapScoring(lambda token: 1.)), cache)
+    dear = yasa.CachedAligner(yasa.ExactAligner(GapScoring(lambda token: 5.)), cache)
+    assert cheap.align(['a'], []).cost == 1.
+    assert dear.align(['a'], []).cost == 5.
+    assert 0 == cache.hits
+
+
+def test_fingerprint_refuses_what_it_cannot_tell_apart():
+    class Opaque(object):
+        __slots__ = ()
+
+    with pytest.raises(TypeError):
+        fingerprint(GapScoring(Opaque()))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+import json
+
+import pytest
+
+import yasa
+from aligner_data import random_pairs
+from yasa.cli import IndexedJoin, SortedJoin, main, read_corpus, score_corpus
+
+
+def make_corpus(n, seed=3):
+    refs, hyps = dict(), dict()
+    for idx, (reference, hypothesis) in enumerate(random_pairs(n, seed, max_length=12)):
+        utt_id = 'utt{:03d}'.format(idx)
+        refs[utt_id], hyps[utt_id] = reference, hypothesis
+    return refs, hyps
+
+
+def write_text(path, corpus, ids):
+    with open(str(path), 'w') as ofp:
+        for utt_id in ids:
+            ofp.write(' '.join([utt_id] + corpus[utt_id]) + '\n')
+
+
+def expected_wer(refs, hyps):
+    word_error_rate = yasa.WordErrorRate()
+    for utt_id, reference in refs.items():
+        word_error_rate.accu_alignment(yasa.align(reference, hyps.get(utt_id, [])))
+    return word_error_rate
+
+
+def test_read_formats(tmpdir):
+    text = tmpdir.join('ref.txt')
+    text.write("a x y\n\nb\n")
+    assert list(read_corpus(str(text))) == [('a', ['x', 'y']), ('b', [])]
+
+    jsonl = tmpdir.join('ref.jsonl')
+    jsonl.write('{"id": 1, "text": "x y"}\n{"id": "b", "text": ["x y", "z"]}\n')
+    assert list(read_corpus(str(jsonl))) == [('1', ['x', 'y']), ('b', ['x y', 'z'])]
+
+
+def test_indexed_join_any_order(tmpdir):
+    refs, hyps = make_corpus(30)
+    ids = sorted(refs)
+    write_text(tmpdir.join('ref.txt'), refs, ids)
+    del hyps['utt004']
+    hyps['zzz'] = ['extra']
+    write_text(tmpdir.join('hyp.txt'), hyps, list(reversed(sorted(hyps))))
+
+    joined = IndexedJoin(read_corpus(str(tmpdir.join('ref.txt'))), str(tmpdir.join('hyp.txt')))
+    pairs = list(joined)
+    assert [utt_id for utt_id, _, _ in pairs] == ids
+    assert all(hypothesis == hyps.get(utt_id) for utt_id, _, hypothesis in pairs)
+    assert (joined.missing, joined.extra) == (1, 1)
+
+
+def test_sorted_join():
+    references = [('a', ['x']), ('b', ['y']), ('d', ['z'])]
+    hypotheses = [('0', ['w']), ('b', ['y']), ('c', ['q']), ('d', ['z']), ('e', [])]
+    joined = SortedJoin(references, hypotheses)
+    assert list(joined) == [('a', ['x'], None), ('b', ['y'], ['y']), ('d', ['z'], ['z'])]
+    assert (joined.missing, joined.extra) == (1, 3)
+
+    with pytest.raises(ValueError):
+        list(SortedJoin([('b', []), ('a', [])], []))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_score_corpus(workers):
+    refs, hyps = make_corpus(40)
+    joined = [(utt_id, refs[utt_id], hyps[utt_id]) for utt_id in sorted(refs)]
+    word_error_rate, confusions, count = score_corpus(joined, workers=workers, chunksize=3, max_pending=2)
+    expected = expected_wer(refs, hyps)
+    assert count == 40
+    assert (word_error_rate.correct, word_error_rate.incorrect) == (expected.correct, expected.incorrect)
+    assert confusions.total() == expected.incorrect
+
+
+def test_main(tmpdir, capsys):
+    refs, hyps = make_corpus(25)
+    del hyps['utt007']
+    write_text(tmpdir.join('ref.txt'), refs, sorted(refs))
+    with open(str(tmpdir.join('hyp.jsonl')), 'w') as ofp:
+        for utt_id in sorted(hyps, reverse=True):
+            ofp.write(json.dumps(dict(id=utt_id, text=' '.join(hyps[utt_id]))) + '\n')
+
+    utterances, summary = tmpdir.join('utts.jsonl'), tmpdir.join('summary.json')
+    assert main([str(tmpdir.join('ref.txt')), str(tmpdir.join('hyp.jsonl')), '--workers', '1',
+                 '--utterances', str(utterances), '--summary', str(summary), '--confusions', '5']) == 0
+    assert 'WER' in capsys.readouterr().out
+
+    expected = expected_wer(refs, hyps)
+    report = json.loads(summary.read())
+    assert (report['correct'], report['incorrect']) == (expected.correct, expected.incorrect)
+    assert (report['utterances'], report['missing'], report['extra']) == (25, 1, 0)
+    assert len(report['confusions']) == 5
+
+    rows = [json.loads(line) for line in utterances.readlines()]
+    assert [row['id'] for row in rows] == sorted(refs)
+    assert [row['id'] for row in rows if row['missing']] == ['utt007']
+    assert sum(row['correct'] for row in rows) == expected.correct
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+import pickle
+
+import numpy as np
+import pytest
+
+import yasa
+from aligner_data import random_pairs
+
+
+@pytest.fixture
+def corpus(tmpdir):
+    return yasa.write_corpus(str(tmpdir.join('corpus')), random_pairs(40, 11))
+
+
+def test_round_trip(corpus):
+    pairs = random_pairs(40, 11)
+    assert len(corpus) == 40
+    assert [(list(source), list(target)) for source, target in corpus] == pairs
+    assert corpus.source.lengths().tolist() == [len(source) for source, _ in pairs]
+    assert corpus[-1] == pairs[-1]
+    with pytest.raises(IndexError):
+        corpus[40]
+
+    # reopened from disk, e.g. in another process
+    reopened = pickle.loads(pickle.dumps(corpus))
+    assert reopened.vocabulary.tokens == corpus.vocabulary.tokens
+    assert np.array_equal(reopened.target.ids, corpus.target.ids)
+
+
+def test_views_are_not_copies(corpus):
+    source, _ = corpus[3]
+    assert np.shares_memory(source.ids, corpus.source.ids)
+    # the vocabulary of the corpus hands the ids over as they are
+    assert corpus.vocabulary.encode(source) is source.ids
+    assert np.shares_memory(source[2:5].ids, corpus.source.ids)
+
+
+def test_empty_corpus(tmpdir):
+    corpus = yasa.write_corpus(str(tmpdir.join('empty')), [])
+    assert len(corpus) == 0
+    assert list(yasa.align_corpus(corpus, workers=1)) == []
+
+
+@pytest.mark.parametrize('engine', ['beam', 'exact', 'hirschberg'])
+def test_engines_take_encoded_tokens(corpus, engine):
+    aligner = yasa.make_aligner(100, 0, 'levinshtein', engine=engine, vocabulary=corpus.vocabulary)
+    for (source, target), pair in zip(corpus, random_pairs(40, 11)):
+        expected = yasa.align(*pair, engine=engine)
+        alignment = aligner.align(source, target)
+        assert alignment.cost == expected.cost
+        assert list(alignment) == list(expected)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_align_corpus(corpus, workers):
+    pairs = random_pairs(40, 11)
+    expected = list(yasa.align_many(pairs, workers=1))
+
+    alignments = list(yasa.align_corpus(corpus, workers=workers, chunksize=3))
+    assert [alignment.cost for alignment in alignments] == [alignment.cost for alignment in expected]
+    assert [list(alignment) for alignment in alignments] == [list(alignment) for alignment in expected]
+
+    indices = [7, 0, 39, 7]
+    counts = list(yasa.align_corpus(corpus, indices, workers=workers, chunksize=2, result='counts'))
+    assert counts == [(expected[idx].cost, expected[idx].correct_n(), expected[idx].errors_n()) for idx in indices]
+
+    unordered = list(yasa.align_corpus(corpus, iter(indices), workers=workers, chunksize=1, ordered=False))
+    assert sorted(position for position, _ in unordered) == list(range(len(indices)))
+    for position, alignment in unordered:
+        assert list(alignment) == list(expected[indices[position]])
+
+
+def test_align_corpus_max_cost(corpus):
+    costs = [yasa.distance(*pair) for pair in random_pairs(40, 11)]
+    alignments = list(yasa.align_corpus(corpus, workers=1, max_cost=10))
+    assert [alignment.cost if alignment is not None else None for alignment in alignments] == \
+        [cost if cost <= 10 else None for cost in costs]
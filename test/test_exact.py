@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+import random
+
+import yasa
+from yasa.exact import BandedAligner, ExactAligner, HirschbergAligner
+from yasa.scoring import FixedScoring
+
+random.seed(2834701)
+
+
+def reference_cost(scorer, source, target):
+    # plain python DP, no tricks
+    n, m = len(source), len(target)
+    table = [[0.] * (m + 1) for _ in range(n + 1)]
+    for j in range(1, m + 1):
+        table[0][j] = table[0][j - 1] + scorer.insertion(target[j - 1])
+    for i in range(1, n + 1):
+        table[i][0] = table[i - 1][0] + scorer.deletion(source[i - 1])
+        for j in range(1, m + 1):
+            if source[i - 1] == target[j - 1]:
+                diag = scorer.match(source[i - 1])
+            else:
+                diag = scorer.substitution(source[i - 1], target[j - 1])
+            table[i][j] = min(table[i - 1][j - 1] + diag,
+                              table[i - 1][j] + scorer.deletion(source[i - 1]),
+                              table[i][j - 1] + scorer.insertion(target[j - 1]))
+    return table[n][m]
+
+
+def random_tokens(n, vocab='abcdef'):
+    return [random.choice(vocab) for _ in range(n)]
+
+
+def check_alignment(alignment, source, target):
+    pairs = list(alignment)
+    assert source == [s for s, _ in pairs if s is not None]
+    assert target == [t for _, t in pairs if t is not None]
+
+
+def test_exact_matches_reference():
+    scorers = [yasa.LevinshteinScoring(), FixedScoring(2, 1, 1.5, 0), FixedScoring(1, 3, 5, -1),
+               yasa.NestedLevinshteinScoring()]
+    for scorer in scorers:
+        aligner = ExactAligner(scorer)
+        for _ in range(20):
+            source = random_tokens(random.randint(0, 12))
+            target = random_tokens(random.randint(0, 12))
+            alignment = aligner.align(source, target)
+            assert abs(reference_cost(scorer, source, target) - alignment.cost) < 1e-9
+            check_alignment(alignment, source, target)
+
+
+def test_exact_beats_beam():
+    for (source, target) in [("this is a test of the beam aligner", "that was a test of the bean aligner"),
+                             ("a b c d e f g", "x y a b c q e f")]:
+        source, target = source.split(), target.split()
+        exact = yasa.align(source, target, engine='exact')
+        beam = yasa.align(source, target, heap_size=5, engine='beam')
+        assert exact.cost <= beam.cost
+        assert exact.cost == exact.errors_n()
+
+
+def test_auto_engine():
+    source = "the quick brown fox".split()
+    target = "the quick brown dog".split()
+    assert 1 == yasa.align(source, target).cost
+    assert 1 == yasa.align(source, target, scoring='nested', heap_size=10).errors_n()
+
+    assert 'exact' == yasa.pick_engine('auto', 'levinshtein', source, target)
+    assert 'banded' == yasa.pick_engine('auto', 'levinshtein', source, target, exact_max_cells=15)
+    assert 'beam' == yasa.pick_engine('auto', 'nested', source, target)
+    # the threshold is read from yasa.factory on every call
+    default = yasa.factory.EXACT_MAX_CELLS
+    try:
+        yasa.factory.EXACT_MAX_CELLS = 15
+        assert 'banded' == yasa.pick_engine('auto', 'levinshtein', source, target)
+    finally:
+        yasa.factory.EXACT_MAX_CELLS = default
+    assert 64 == yasa.make_aligner(100, 0, 'levinshtein', engine='banded', banded_max_cells=64).max_cells
+
+
+def test_banded_matches_reference():
+    for scorer in [yasa.LevinshteinScoring(), FixedScoring(2, 1, 1.5, 0)]:
+        aligner = BandedAligner(scorer, band=1)
+        for _ in range(30):
+            source = random_tokens(random.randint(0, 15), 'abc')
+            target = random_tokens(random.randint(0, 15), 'abc')
+            alignment = aligner.align(source, target)
+            assert abs(reference_cost(scorer, source, target) - alignment.cost) < 1e-9
+            check_alignment(alignment, source, target)
+
+
+def test_banded_long_similar():
+    source = random_tokens(3000, 'abcdefghijklmnopqrstuvwxyz')
+    target = list(source)
+    for _ in range(30):
+        x = random.randrange(len(target))
+        if random.random() < 0.5:
+            del target[x]
+        else:
+            target[x] = '#'
+    exact = ExactAligner(yasa.LevinshteinScoring()).align(source, target)
+    banded = BandedAligner(yasa.LevinshteinScoring(), band=2).align(source, target)
+    assert exact.cost == banded.cost
+    check_alignment(banded, source, target)
+
+    limited = BandedAligner(yasa.LevinshteinScoring(), band=1, max_cells=1).align(source, target)
+    check_alignment(limited, source, target)
+    assert limited.cost >= exact.cost
+
+
+def test_hirschberg_matches_reference():
+    scorers = [yasa.LevinshteinScoring(), FixedScoring(2, 1, 1.5, 0), yasa.NestedLevinshteinScoring()]
+    for scorer in scorers:
+        aligner = HirschbergAligner(scorer, cutoff=4)
+        for _ in range(20):
+            source = random_tokens(random.randint(0, 14))
+            target = random_tokens(random.randint(0, 14))
+            alignment = aligner.align(source, target)
+            assert abs(reference_cost(scorer, source, target) - alignment.cost) < 1e-9
+            check_alignment(alignment, source, target)
+
+
+def test_hirschberg_long():
+    source = random_tokens(2000, 'abcdefghij')
+    target = random_tokens(1500, 'abcdefghij')
+    exact = ExactAligner(yasa.LevinshteinScoring()).align(source, target)
+    linear = HirschbergAligner(yasa.LevinshteinScoring(), cutoff=10000).align(source, target)
+    assert exact.cost == linear.cost
+    check_alignment(linear, source, target)
+
+
+def test_distance_matches_align():
+    for scorer in [yasa.LevinshteinScoring(), FixedScoring(2, 1, 1.5, 0), FixedScoring(1, 1, 1, -0.5)]:
+        aligners = [ExactAligner(scorer), BandedAligner(scorer, band=1), BandedAligner(scorer, band=1, max_cells=1),
+                    HirschbergAligner(scorer, cutoff=10), yasa.AnchoredAligner(ExactAligner(scorer))]
+        for _ in range(20):
+            source = random_tokens(random.randint(0, 25), 'abcd')
+            target = random_tokens(random.randint(0, 25), 'abcd')
+            for aligner in aligners:
+                assert abs(aligner.align(source, target).cost - aligner.distance(source, target)) < 1e-9
+            assert abs(reference_cost(scorer, source, target) - aligners[0].distance(source, target)) < 1e-9
+
+
+def test_distance_is_align_cost_to_the_bit():
+    # costs which are not sums of powers of two round differently in a different order
+    for scorer in [FixedScoring(0.7, 1.3, 1.1, 0), FixedScoring(0.3, 0.7, 0.9, 0.1)]:
+        aligners = [ExactAligner(scorer), BandedAligner(scorer, band=1), HirschbergAligner(scorer, cutoff=10)]
+        pairs = [(random_tokens(random.randint(0, 30), 'abcd'), random_tokens(random.randint(0, 30), 'abcd'))
+                 for _ in range(30)]
+        for aligner in aligners:
+            for source, target in pairs:
+                assert aligner.distance(source, target) == aligner.align(source, target).cost
+        engine = ExactAligner(scorer)
+        assert list(yasa.align_many(pairs, workers=1, result='cost', engine='exact', scoring=scorer)) == \
+            [engine.align(source, target).cost for source, target in pairs]
+
+
+def test_max_cost():
+    for scorer in [yasa.LevinshteinScoring(), FixedScoring(2, 1, 1.5, 0), FixedScoring(1, 1, 1, -0.5)]:
+        aligners = [ExactAligner(scorer), BandedAligner(scorer, band=1), BandedAligner(scorer, band=1, max_cells=1),
+                    HirschbergAligner(scorer, cutoff=10)]
+        for _ in range(20):
+            source = random_tokens(random.randint(0, 30), 'abcd')
+            target = random_tokens(random.randint(0, 30), 'abcd')
+            for aligner in aligners:
+                # with max_cells=1 the unbounded cost needn't be optimal, but the bounded search finds it too
+                cost = aligner.distance(source, target)
+                for max_cost in [0, cost - 1, cost - 0.25, cost, cost + 2, 100]:
+                    distance = aligner.distance(source, target, max_cost=max_cost)
+                    alignment = aligner.align(source, target, max_cost=max_cost)
+                    if cost > max_cost + 1e-9:
+                        assert distance is None and alignment is None
+                    else:
+                        assert abs(distance - cost) < 1e-9
+                        assert abs(alignment.cost - cost) < 1e-9
+                        check_alignment(alignment, source, target)
+
+
+def test_max_cost_rounding():
+    # a band of the DP may add the costs up in another order than the full table; exactly max_cost still passes
+    source = random_tokens(22, 'abcdefgh')
+    for scorer in [FixedScoring(0.7, 1.3, 1.1, 0), FixedScoring(0.3, 0.7, 0.9, 0.1)]:
+        for aligner in [ExactAligner(scorer), BandedAligner(scorer, band=1), HirschbergAligner(scorer, cutoff=10)]:
+            for _ in range(20):
+                target = random_tokens(random.randint(15, 30), 'abcdefgh')
+                for pair in [(source, source[:-1]), (source, target), (target, source)]:
+                    cost = aligner.align(*pair).cost
+                    assert aligner.align(*pair, max_cost=cost).cost == cost
+                    assert aligner.distance(*pair, max_cost=cost) == cost
+
+
+def test_max_cost_band():
+    # similar sequences a long way from the cutoff: the DP stays in a narrow band
+    source = random_tokens(3000)
+    target = list(source)
+    for x in random.sample(range(len(target)), 20):
+        target[x] = 'z'
+    aligner = ExactAligner(yasa.LevinshteinScoring())
+    assert aligner.distance(source, target, max_cost=25) == 20
+    assert aligner.distance(source, target, max_cost=19) is None
+    assert aligner.align(source, target, max_cost=20).cost == 20
+    assert aligner.distance(source, source[:-100], max_cost=99) is None
+
+
+def test_hirschberg_cache_is_linear():
+    # a scorer which is not vectorized: its pair costs are cached, within O(n + m) cells for hirschberg
+    scorer = yasa.NestedLevinshteinScoring()
+    source = [random.choice(['ab', 'abc', 'bcd', 'cd', 'x']) + str(random.randint(0, 50)) for _ in range(300)]
+    target = [random.choice(['ab', 'abc', 'bcd', 'cd', 'y']) + str(random.randint(0, 50)) for _ in range(250)]
+    seen = []
+
+    class Spy(HirschbergAligner):
+        def _costs(self, *args):
+            costs = super(Spy, self)._costs(*args)
+            pairs = costs._pairs
+
+            def watched(*pair_args):
+                found = pairs(*pair_args)
+                seen.append(costs._cached_cells)
+                return found
+
+            costs._pairs = watched
+            return costs
+
+    alignment = Spy(scorer, cutoff=500).align(source, target)
+    assert alignment.cost == ExactAligner(scorer).align(source, target).cost
+    check_alignment(alignment, source, target)
+    assert seen and max(seen) <= 16 * (len(source) + len(target)) < 256 * len(source)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+import aligner_data
+import yasa
+from test_aligner import del_some, get_words
+from yasa.aligner import Aligner, BoundedNodeHeap
+
+
+class StepLog(yasa.SearchObserver):
+    def __init__(self):
+        self.events = []
+
+    def on_start(self, aligner, source, target):
+        self.events.append('start')
+
+    def on_step(self, step, expanded, heap):
+        self.events.append(step)
+
+    def on_end(self, alignment, scorer_calls):
+        self.events.append('end')
+
+
+def declaration_pair(n=300):
+    words = get_words(aligner_data.load_declaration())[:n]
+    return del_some(words), del_some(words)
+
+
+def test_observer_leaves_result_alone():
+    source, target = declaration_pair()
+    scorer = yasa.LevinshteinScoring()
+    for settings in (dict(), dict(recombine=True), dict(heap_class=BoundedNodeHeap),
+                     dict(heap_class=BoundedNodeHeap, recombine=True), dict(heuristic='bag')):
+        expected = Aligner(scorer, 20, 2, **settings).align(source, target)
+        log = StepLog()
+        observed = Aligner(scorer, 20, 2, observer=log, **settings).align(source, target)
+        assert list(expected) == list(observed)
+        assert 'start' == log.events[0] and 'end' == log.events[-1]
+        assert list(range(1, len(log.events) - 1)) == log.events[1:-1]
+
+
+def test_search_stats():
+    source, target = declaration_pair()
+    for heap_class in (yasa.NodeHeap, BoundedNodeHeap):
+        stats = yasa.SearchStats()
+        aligner = Aligner(yasa.LevinshteinScoring(), 20, 2, recombine=True, heap_class=heap_class, observer=stats)
+        alignment = aligner.align(source, target)
+
+        assert 1 == stats.alignments
+        assert stats.steps == len(stats.heap_sizes) == len(stats.best_costs)
+        assert max(stats.heap_sizes) <= 20
+        assert sum(stats.heap_sizes[:-1]) + 1 == stats.expanded
+        assert alignment.cost == stats.best_costs[-1]
+        assert stats.pruned_beam > 0 and stats.pruned_size > 0 and stats.recombined > 0
+        # every expanded hypothesis not at the end asks for an insertion, a deletion or both
+        assert stats.scorer_calls['insertion'] + stats.scorer_calls['deletion'] >= stats.expanded - 1
+        # every step moves each hypothesis at least one token on
+        assert stats.steps <= len(source) + len(target)
+
+    total = sum([stats, stats])
+    assert 2 == total.alignments
+    assert 2 * stats.expanded == total.expanded
+    assert 2 * stats.scorer_calls['match'] == total.scorer_calls['match']
+    assert 'pruned by beam' in str(total)
+    assert stats.as_dict()['expanded'] == stats.expanded
+
+
+def test_search_stats_cache_and_astar():
+    source = "this is a test of the beam aligner".split() * 3
+    target = "that was a test of the bean aligner".split() * 3
+    stats = yasa.SearchStats()
+    Aligner(yasa.NestedLevinshteinScoring(), 20, 0, observer=stats).align(source, target)
+    assert stats.cache_hits > 0 and stats.cache_misses > 0
+    assert stats.cache_hits + stats.cache_misses == stats.scorer_calls['substitution']
+    assert 0 < stats.cache_hit_rate < 1
+
+    stats = yasa.SearchStats()
+    alignment = Aligner(yasa.LevinshteinScoring(), 0, 0, heuristic='bag', observer=stats).align(source, target)
+    assert stats.steps == stats.expanded
+    assert 0 == stats.pruned_beam + stats.pruned_size
+    assert alignment.cost == yasa.align(source, target, engine='exact').cost
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+import pickle
+import random
+
+import numpy as np
+import pytest
+
+import yasa
+from aligner_data import random_pairs
+from yasa.aligner import Aligner
+
+
+class DictScoring(yasa.scoring.Scoring):
+    """the costs of a MatrixScoring, one python call at a time"""
+
+    def __init__(self, tokens, ins, dels, subs, default=1.):
+        self.ins = dict(zip(tokens, ins))
+        self.dels = dict(zip(tokens, dels))
+        self.subs = subs
+        self.default = default
+
+    def insertion(self, token):
+        return self.ins.get(token, self.default)
+
+    def deletion(self, token):
+        return self.dels.get(token, self.default)
+
+    def substitution(self, source, target):
+        return self.subs.get((source, target), self.default)
+
+    def match(self, token):
+        return self.subs.get((token, token), 0.)
+
+
+def random_costs(tokens, seed):
+    rng = random.Random(seed)
+    ins = [rng.uniform(0.5, 1.5) for _ in tokens]
+    dels = [rng.uniform(0.5, 1.5) for _ in tokens]
+    subs = {(a, b): (rng.uniform(0., 0.2) if a == b else rng.uniform(0.3, 2.)) for a in tokens for b in tokens}
+    return ins, dels, subs
+
+
+def test_matrix_matches_per_token_scoring():
+    tokens = list('abcdefgh')
+    ins, dels, subs = random_costs(tokens[:6], seed=1)
+    vocabulary = yasa.Vocabulary(tokens[:6])
+    table = np.array([[subs[a, b] for b in tokens[:6]] for a in tokens[:6]])
+    dense = yasa.MatrixScoring(vocabulary, ins, dels, table)
+    sparse = yasa.MatrixScoring(vocabulary, ins, dels, {pair: cost for pair, cost in subs.items() if cost < 1.5})
+    reference = DictScoring(tokens[:6], ins, dels, subs)
+    sparse_reference = DictScoring(tokens[:6], ins, dels, {pair: cost for pair, cost in subs.items() if cost < 1.5})
+
+    # g and h have no costs in the matrix: they get the defaults
+    for source, target in random_pairs(30, 2, tokens, 40):
+        for scorer, expected_scorer in ((dense, reference), (sparse, sparse_reference)):
+            expected = yasa.ExactAligner(expected_scorer).align(source, target).cost
+            assert expected == pytest.approx(yasa.ExactAligner(scorer).align(source, target).cost)
+            assert expected == pytest.approx(yasa.BandedAligner(scorer, band=1).align(source, target).cost)
+            assert expected == pytest.approx(yasa.HirschbergAligner(scorer, cutoff=50).align(source, target).cost)
+            assert expected == pytest.approx(Aligner(scorer, 0, 0, heuristic='bag').align(source, target).cost)
+            beam = Aligner(expected_scorer, 20, 0).align(source, target)
+            assert beam.cost == pytest.approx(Aligner(scorer, 20, 0).align(source, target).cost)
+
+
+def test_batch_methods():
+    tokens = list('abcd')
+    ins, dels, subs = random_costs(tokens, seed=3)
+    scorer = yasa.MatrixScoring.from_costs(subs, dict(zip(tokens, ins)), dict(zip(tokens, dels)))
+    reference = DictScoring(tokens, ins, dels, subs)
+
+    # a vocabulary of its own, in another order and with an unknown token
+    vocabulary = yasa.Vocabulary(list('xdcba'))
+    ids = vocabulary.encode(list('abcdx'))
+    for batch, single in ((scorer.insertions, reference.insertion), (scorer.deletions, reference.deletion)):
+        assert [single(token) for token in 'abcdx'] == pytest.approx(batch(ids, vocabulary).tolist())
+    # the vectorized methods agree with the per token defaults of Scoring
+    assert yasa.scoring.Scoring.insertions(scorer, ids, vocabulary) == pytest.approx(scorer.insertions(ids, vocabulary))
+    assert yasa.scoring.Scoring.deletions(scorer, ids, vocabulary) == pytest.approx(scorer.deletions(ids, vocabulary))
+
+    pairs = scorer.pairs(ids[:, None], ids[None, :], vocabulary)
+    expected = yasa.scoring.Scoring.pairs(reference, ids[:, None], ids[None, :], vocabulary)
+    assert (5, 5) == pairs.shape
+    assert expected == pytest.approx(pairs)
+    # the vocabulary grows and the translation follows
+    more = vocabulary.encode(['y', 'a'])
+    assert [0., subs['a', 'a']] == pytest.approx(scorer.pairs(more, more, vocabulary).tolist())
+    assert 1. == scorer.pairs(more[0], vocabulary.encode(['z']), vocabulary)[0]
+
+    fixed = yasa.FixedScoring(2, 3, 4, 0.5)
+    assert [0.5, 4.] == fixed.pairs(ids[0], ids[:2], vocabulary).tolist()
+    assert [2., 2.] == fixed.insertions(ids[:2], vocabulary).tolist()
+    assert 0.5 == fixed.min_pair_cost()
+    assert scorer.min_pair_cost() <= min(subs.values())
+
+
+def test_matrix_pickles():
+    tokens = list('abc')
+    ins, dels, subs = random_costs(tokens, seed=4)
+    scorer = yasa.MatrixScoring.from_costs(subs, dict(zip(tokens, ins)))
+    scorer.insertions(np.array([0]), yasa.Vocabulary('a'))
+    clone = pickle.loads(pickle.dumps(scorer))
+    assert scorer.substitution('a', 'b') == clone.substitution('a', 'b')
+    with pytest.raises(ValueError):
+        yasa.MatrixScoring(yasa.Vocabulary(tokens), ins, dels, np.zeros((2, 2)))
+    with pytest.raises(KeyError):
+        yasa.MatrixScoring(yasa.Vocabulary(tokens), ins, dels, {('a', 'z'): 1.})
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+import pickle
+import random
+
+import pytest
+
+from yasa.nested import NestedLevinshteinScoring, edit_distance
+
+
+def reference_distance(source, target):
+    previous = list(range(len(target) + 1))
+    for x, source_token in enumerate(source, 1):
+        current = [x]
+        for y, target_token in enumerate(target, 1):
+            current.append(min(previous[y] + 1, current[y - 1] + 1,
+                               previous[y - 1] + (source_token != target_token)))
+        previous = current
+    return previous[-1]
+
+
+def test_edit_distance():
+    rng = random.Random(3)
+    for _ in range(2000):
+        source = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 12)))
+        target = ''.join(rng.choice('abcd') for _ in range(rng.randint(0, 90)))
+        assert reference_distance(source, target) == edit_distance(source, target)
+        assert reference_distance(source, target) == edit_distance(target, source)
+
+
+def test_inner_aligners_agree():
+    words = "the quick brown fox jumped over lazy dogs".split()
+    myers = NestedLevinshteinScoring()
+    beam = NestedLevinshteinScoring(inner='beam')
+    for source in words:
+        for target in words:
+            assert beam.substitution(source, target) == myers.substitution(source, target)
+
+
+def test_cache():
+    scorer = NestedLevinshteinScoring(cache_size=2)
+    other = NestedLevinshteinScoring()
+    assert 1 == scorer.substitution('cat', 'hat')
+    assert 1 == scorer.substitution('cat', 'hat')
+    info = scorer.cache_info()
+    assert (1, 1, 2) == (info.hits, info.misses, info.maxsize)
+    # every instance has its own cache
+    assert 0 == other.cache_info().misses
+
+    clone = pickle.loads(pickle.dumps(scorer))
+    assert 2 == clone.cache_size
+    assert 3 == clone.substitution('cat', 'dog')
+
+    with pytest.raises(ValueError):
+        NestedLevinshteinScoring(inner='nope')
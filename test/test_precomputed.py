@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+import pytest
+
+import aligner_data
+import yasa
+from test_aligner import get_words
+from yasa.nested import NestedLevinshteinScoring
+from yasa.precomputed import PrecomputedScoring
+
+
+def test_table_matches_scorer():
+    scorer = NestedLevinshteinScoring()
+    sources = "the cat sat on the mat".split()
+    targets = "a bat sat in a hat".split()
+    precomputed = PrecomputedScoring.build(scorer, sources, targets)
+    assert (5, 5) == precomputed.table.shape
+    for source in sources:
+        for target in targets:
+            assert scorer.substitution(source, target) == precomputed.substitution(source, target)
+    # tokens outside the table fall back to the scorer
+    assert scorer.substitution('dog', 'cat') == precomputed.substitution('dog', 'cat')
+    assert scorer.insertion('dog') == precomputed.insertion('dog')
+
+
+def test_parallel_build_and_align():
+    words = get_words(aligner_data.load_declaration())
+    pairs = [(words[x:x + 40], words[x + 3:x + 43]) for x in range(0, 400, 40)]
+    scorer = NestedLevinshteinScoring()
+    precomputed = PrecomputedScoring.from_pairs(scorer, pairs, workers=2, chunksize=16)
+    assert (precomputed.table == PrecomputedScoring.from_pairs(scorer, pairs).table).all()
+
+    for source, target in pairs:
+        expected = yasa.align(source, target, scoring='nested')
+        alignment = yasa.align(source, target, scoring=precomputed)
+        assert expected.cost == pytest.approx(alignment.cost)
+        assert list(expected) == list(alignment)
+
+
+def test_save_load(tmp_path):
+    scorer = NestedLevinshteinScoring()
+    precomputed = PrecomputedScoring.build(scorer, "one two three".split(), "four five".split())
+    path = str(tmp_path / "table.npz")
+    precomputed.save(path)
+    loaded = PrecomputedScoring.load(path, scorer)
+    assert precomputed.source_vocabulary.tokens == loaded.source_vocabulary.tokens
+    assert precomputed.target_vocabulary.tokens == loaded.target_vocabulary.tokens
+    assert (precomputed.table == loaded.table).all()
+    assert scorer.substitution('three', 'four') == loaded.substitution('three', 'four')
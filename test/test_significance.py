@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import math
+
+import numpy as np
+import pytest
+
+import yasa
+
+
+def counts(n, error_rate, seed):
+    rng = np.random.default_rng(seed)
+    length = rng.integers(1, 30, n)
+    incorrect = rng.binomial(length, error_rate)
+    return length - incorrect, incorrect
+
+
+def test_utterance_counts():
+    source = "this is a test of the beam aligner".split()
+    target = "that was a test of the bean aligner extra".split()
+    alignment = yasa.align(source, target)
+    pairs = [(source, target), (source, source)]
+    correct, incorrect = yasa.utterance_counts([alignment, alignment])
+    assert [alignment.correct_n()] * 2 == correct.tolist()
+    assert [alignment.errors_n()] * 2 == incorrect.tolist()
+
+    correct, incorrect = yasa.utterance_counts(yasa.align_many(pairs, workers=1, result='counts'))
+    assert [4, 0] == incorrect.tolist()
+    assert [5, 8] == correct.tolist()
+
+
+def test_bootstrap_matches_index_resampling():
+    correct, incorrect = counts(300, 0.2, seed=1)
+    interval = yasa.bootstrap_wer(correct, incorrect, n_resamples=20000, seed=2)
+    assert incorrect.sum() / (correct + incorrect).sum() == pytest.approx(interval.estimate)
+    assert interval.low < interval.estimate < interval.high
+
+    rng = np.random.default_rng(3)
+    picks = rng.integers(0, len(correct), (20000, len(correct)))
+    wers = incorrect[picks].sum(axis=1) / (correct + incorrect)[picks].sum(axis=1)
+    low, high = np.quantile(wers, [0.025, 0.975])
+    assert low == pytest.approx(interval.low, abs=2e-3)
+    assert high == pytest.approx(interval.high, abs=2e-3)
+
+    assert interval == yasa.bootstrap_wer(correct, incorrect, n_resamples=20000, seed=2)
+    with pytest.raises(ValueError):
+        yasa.bootstrap_wer(correct, incorrect, confidence=1.5)
+
+
+def test_paired_bootstrap():
+    correct_a, incorrect_a = counts(2000, 0.2, seed=4)
+    # b makes one more error on every tenth utterance
+    incorrect_b = np.minimum(incorrect_a + (np.arange(2000) % 10 == 0), correct_a + incorrect_a)
+    correct_b = correct_a + incorrect_a - incorrect_b
+    result = yasa.paired_bootstrap(correct_a, incorrect_a, correct_b, incorrect_b, n_resamples=2000, seed=5)
+    assert result.delta > 0
+    assert 0 < result.low <= result.delta <= result.high
+    assert result.p_value < 0.01
+
+    same = yasa.paired_bootstrap(correct_a, incorrect_a, correct_a, incorrect_a, n_resamples=100, seed=5)
+    assert (0., 0., 0., 1.) == tuple(same)
+
+
+def test_sign_test():
+    # 9 utterances worse, 1 better: two-sided binomial tail 2 * (1 + 10) / 2^10
+    errors_a = [0] * 10 + [3, 3]
+    errors_b = [1] * 9 + [-1] + [3, 3]
+    assert 22 / 1024 == pytest.approx(yasa.sign_test(errors_a, errors_b))
+    assert 1. == yasa.sign_test([1, 2], [1, 2])
+
+    # 400 worse, 600 better: still the exact tail
+    tail = sum(math.factorial(1000) // (math.factorial(x) * math.factorial(1000 - x)) for x in range(401)) / 2 ** 1000
+    assert 2 * tail == pytest.approx(yasa.sign_test([0] * 1000, [1] * 400 + [-1] * 600))
+
+    # the normal approximation is close to the exact tail
+    rng = np.random.default_rng(6)
+    errors_a = rng.integers(0, 3, 3000)
+    errors_b = errors_a + rng.choice([-1, 0, 1, 1], 3000)
+    assert yasa.sign_test(errors_a, errors_b) < 1e-6
+    assert yasa.sign_test(errors_a, errors_b) == yasa.sign_test(errors_b, errors_a)
+
+
+def test_wilcoxon_test():
+    # differences 1, 2, -3, 4, 5: W+ = 12, mean 7.5, variance 13.75
+    errors_a = [0, 0, 3, 0, 0, 7]
+    errors_b = [1, 2, 0, 4, 5, 7]
+    z = (12 - 7.5 - 0.5) / math.sqrt(13.75)
+    assert math.erfc(z / math.sqrt(2)) == pytest.approx(yasa.wilcoxon_test(errors_a, errors_b))
+    assert yasa.wilcoxon_test(errors_a, errors_b) == pytest.approx(yasa.wilcoxon_test(errors_b, errors_a))
+    assert 1. == yasa.wilcoxon_test([1, 2], [1, 2])
+
+    correct_a, incorrect_a = counts(1000, 0.2, seed=7)
+    incorrect_b = incorrect_a + (np.arange(1000) % 5 == 0)
+    assert yasa.wilcoxon_test(incorrect_a, incorrect_b) < 1e-6
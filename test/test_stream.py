@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+import random
+
+import pytest
+
+import aligner_data
+from test_aligner import del_some, get_words
+from yasa.exact import ExactAligner
+from yasa.scoring import LevinshteinScoring
+from yasa.stream import StreamingAligner
+
+random.seed(5)
+
+
+def chunked(source, target, size):
+    for x in range(0, max(len(source), len(target)), size):
+        yield source[x:x + size], target[x:x + size]
+
+
+def test_stream_matches_batch():
+    source = "this is a test of the beam aligner".split()
+    target = "that was a test of the bean aligner".split()
+    aligner = StreamingAligner(LevinshteinScoring(), 100, 0)
+    pairs = list(aligner.align_stream(chunked(source, target, 3)))
+    exact = ExactAligner(LevinshteinScoring()).align(source, target)
+    assert list(exact) == pairs
+    assert exact.cost == aligner.committed_cost
+
+
+def test_stream_commits_early():
+    words = get_words(aligner_data.load_declaration())
+    source, target = del_some(words), del_some(words)
+    aligner = StreamingAligner(LevinshteinScoring(), 50, 0, lag=100)
+    committed = []
+    for source_chunk, target_chunk in chunked(source, target, 10):
+        committed.extend(aligner.feed(source_chunk, target_chunk))
+        # nothing far behind the streams is kept around
+        assert len(aligner._source._items) < 250
+        assert len(aligner._target._items) < 250
+    assert len(committed) > len(words) // 2
+    committed.extend(aligner.close())
+    assert source == [s for s, _ in committed if s is not None]
+    assert target == [t for _, t in committed if t is not None]
+
+
+def test_stream_compacts():
+    words = get_words(aligner_data.load_declaration())
+    aligner = StreamingAligner(LevinshteinScoring(), 20, 0, lag=50)
+    aligner.COMPACT_THRESHOLD = 1000
+    aligner.reset()
+    n = 0
+    for _ in range(3):
+        for source_chunk, target_chunk in chunked(del_some(words), del_some(words), 10):
+            n += len(aligner.feed(source_chunk, target_chunk))
+            assert len(aligner._store) < 5000
+    n += len(aligner.close())
+    assert n >= 3 * len(words) * 0.9
+
+
+def test_one_sided_feed():
+    aligner = StreamingAligner(LevinshteinScoring(), 10, 0)
+    assert [] == aligner.feed("a b c".split(), [])
+    pairs = aligner.feed([], "a c".split()) + aligner.close()
+    assert [('a', 'a'), ('b', None), ('c', 'c')] == pairs
+    with pytest.raises(ValueError):
+        aligner.feed(['d'], ['d'])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+import pickle
+
+import yasa
+from aligner_data import random_pairs
+
+
+def labelled_pairs(n):
+    # hypotheses are the references with some labels replaced or dropped
+    return random_pairs(n, 3, "a b c d e".split(), 15, substitute=0.3, delete=0.1)
+
+
+def reference_counts(alignments):
+    counts = dict()
+    for alignment in alignments:
+        for ref, hyp in alignment:
+            if ref is not None:
+                counts.setdefault(ref, [0, 0, 0])[0 if ref == hyp else 2] += 1
+            if hyp is not None and hyp != ref:
+                counts.setdefault(hyp, [0, 0, 0])[1] += 1
+    return counts
+
+
+def test_classifier_error_rate():
+    alignments = [yasa.align(source, target) for source, target in labelled_pairs(30)]
+    error_rate = yasa.ClassifierErrorRate()
+    for alignment in alignments:
+        error_rate.accu_alignment(alignment)
+
+    by_tuple = yasa.ClassifierErrorRate()
+    for alignment in alignments:
+        for ref, hyp in alignment:
+            by_tuple.accu_tuple(ref, hyp)
+
+    for label, (tp, fp, fn) in reference_counts(alignments).items():
+        for rates in (error_rate, by_tuple):
+            label_rate = rates.get_error_rate(label)
+            assert (tp, fp, fn) == (label_rate.true_positives, label_rate.false_positives,
+                                    label_rate.false_negatives)
+    assert error_rate.get_error_rate('zzz') is None
+    assert str(error_rate) == str(by_tuple)
+    assert (error_rate.overall.false_negatives ==
+            sum(alignment.insertions_n() for alignment in alignments))
+
+
+def test_merge():
+    alignments = [yasa.align(source, target) for source, target in labelled_pairs(40)]
+    shards = [(yasa.WordErrorRate(), yasa.ClassifierErrorRate()) for _ in range(4)]
+    whole = (yasa.WordErrorRate(), yasa.ClassifierErrorRate())
+    for x, alignment in enumerate(alignments):
+        for accumulator in shards[x % 4] + whole:
+            accumulator.accu_alignment(alignment)
+
+    # accumulators go through pickle on their way back from worker processes
+    shards = pickle.loads(pickle.dumps(shards))
+    wer = sum(shard[0] for shard in shards)
+    classifier = sum(shard[1] for shard in shards)
+    assert (whole[0].correct, whole[0].incorrect) == (wer.correct, wer.incorrect)
+    assert str(whole[1]) == str(classifier)
+    assert whole[1].overall.false_positives == classifier.overall.false_positives
+
+    counted = yasa.WordErrorRate()
+    for cost, correct_n, errors_n in yasa.align_many(labelled_pairs(40), workers=1, result='counts'):
+        counted.accu_counts(correct_n, errors_n)
+    assert whole[0].wer == counted.wer
+
+
+def test_confusion_counter():
+    pairs = labelled_pairs(50)
+    alignments = [yasa.align(source, target) for source, target in pairs]
+    shards = [yasa.ConfusionCounter() for _ in range(3)]
+    for x, alignment in enumerate(alignments):
+        shards[x % 3].accu_alignment(alignment)
+    confusions = sum(pickle.loads(pickle.dumps(shards)))
+
+    expected = dict()
+    for alignment in alignments:
+        for node in alignment.errors():
+            key = (node.align_type, node.source_token(alignment.source_seq), node.target_token(alignment.target_seq))
+            expected[key] = expected.get(key, 0) + 1
+    assert expected == dict(confusions.counts)
+    assert sum(alignment.errors_n() for alignment in alignments) == confusions.total()
+
+    substitutions = confusions.most_common(3, yasa.AlignmentType.SUB)
+    assert 3 == len(substitutions)
+    assert all(key[0] == yasa.AlignmentType.SUB for key, _ in substitutions)
+    assert [count for _, count in substitutions] == sorted((count for key, count in expected.items()
+                                                            if key[0] == yasa.AlignmentType.SUB), reverse=True)[:3]
+
+    # one entry per type, however the errors are interleaved
+    type_counts = dict(confusions.type_counts())
+    assert confusions.total(yasa.AlignmentType.DEL) == type_counts[yasa.AlignmentType.DEL]
+    assert len(type_counts) == len(confusions.type_counts())
+
+
+def test_error_counts_are_not_fragmented():
+    alignment = yasa.align("a b c d e".split(), "a x c y e z".split())
+    assert [(yasa.AlignmentType.SUB, 2), (yasa.AlignmentType.INS, 1)] == yasa.error_counts(alignment)
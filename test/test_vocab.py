@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import pytest
+
+import yasa
+from yasa.vocab import Vocabulary
+
+
+def test_encode_decode():
+    vocabulary = Vocabulary()
+    ids = vocabulary.encode("the cat and the hat".split())
+    assert [0, 1, 2, 0, 3] == ids.tolist()
+    assert 'int32' == str(ids.dtype)
+    assert "the cat and the hat".split() == vocabulary.decode(ids)
+
+    # ids are stable as the vocabulary grows
+    assert [3, 4, 0] == vocabulary.encode("hat bat the".split()).tolist()
+    assert 5 == len(vocabulary)
+    assert 4 == vocabulary.id_of('bat')
+
+
+def test_encode_frozen():
+    vocabulary = Vocabulary(['a', 'b'])
+    assert [1, 0] == vocabulary.encode(['b', 'a'], grow=False).tolist()
+    with pytest.raises(KeyError):
+        vocabulary.encode(['c'], grow=False)
+
+
+def test_unhashable_tokens():
+    vocabulary = Vocabulary()
+    assert [0, 1, 0, 2] == vocabulary.encode([['a'], 'b', ['a'], {'c': 1}]).tolist()
+    assert ['a'] in vocabulary and ['x'] not in vocabulary
+    assert 2 == vocabulary.id_of({'c': 1})
+    with pytest.raises(KeyError):
+        vocabulary.encode([['x']], grow=False)
+
+    # tokens were compared with == before interning, and still are
+    for engine in ['beam', 'exact', 'banded', 'hirschberg']:
+        alignment = yasa.align([['a'], ['b']], [['a']], engine=engine)
+        assert 1 == alignment.cost
+        assert [(['a'], ['a']), (['b'], None)] == list(alignment)
+
+
+def test_shared_vocabulary():
+    vocabulary = Vocabulary()
+    source = "this is a test of the beam aligner".split()
+    target = "that was a test of the bean aligner".split()
+    for engine in ('beam', 'exact'):
+        shared = yasa.align(source, target, engine=engine, vocabulary=vocabulary)
+        fresh = yasa.align(source, target, engine=engine)
+        assert shared.cost == fresh.cost
+        assert list(shared) == list(fresh)
+    assert 'bean' in vocabulary
+
+
+def test_save_load(tmpdir):
+    vocabulary = Vocabulary(["the", "café", "new\nline", 7])
+    path = str(tmpdir.join('vocab.jsonl'))
+    vocabulary.save(path)
+    assert Vocabulary.load(path).tokens == vocabulary.tokens
+
+
+def test_encoded_tokens():
+    vocabulary = Vocabulary()
+    tokens = yasa.EncodedTokens(vocabulary.encode("the cat and the hat".split()), vocabulary)
+    assert 5 == len(tokens)
+    assert 'hat' == tokens[-1]
+    assert "cat and".split() == tokens[1:3]
+    assert "the cat and the hat".split() == list(tokens)
+    assert vocabulary.encode(tokens) is tokens.ids
+    # another vocabulary decodes them
+    assert [0, 1, 2, 0, 3] == Vocabulary().encode(tokens).tolist()
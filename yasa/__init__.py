@@ -1,48 +1,89 @@
-from typing import List
+from typing import List, Optional
 
-from yasa.aligner import Aligner
+from yasa.aligner import Aligner, AlignmentType, BoundedNodeHeap, NodeHeap
+from yasa.anchors import AnchoredAligner, find_anchors
+from yasa.batch import align_corpus, align_many
+from yasa.cache import AlignmentCache, CachedAligner
+from yasa.corpus import EncodedCorpus, PairCorpus, write_corpus
+from yasa.exact import BandedAligner, ExactAligner, HirschbergAligner
+from yasa.factory import BANDED_MAX_CELLS, EXACT_MAX_CELLS, make_aligner, pick_engine
+from yasa.instrument import SearchObserver, SearchStats
+from yasa.matrix import MatrixScoring
 from yasa.nested import NestedLevinshteinScoring
-from yasa.scoring import LevinshteinScoring
+from yasa.precomputed import PrecomputedScoring
+from yasa.scoring import FixedScoring, LevinshteinScoring
+from yasa.significance import *
+from yasa.stream import StreamingAligner
 from yasa.summary import *
+from yasa.vocab import EncodedTokens, Vocabulary
 
 
-def __mk_aligner(heap_size: int, beam_size: int, scoring: str):
+def align(source: List, target: List, heap_size: int = 100, beam: int = 0, scoring: str = 'levinshtein',
+          recombine: bool = False, engine: str = 'auto', vocabulary: Vocabulary = None,
+          anchors: bool = False, heuristic: str = None, cache: AlignmentCache = None, max_cost: float = None):
     """
-    :type beam_size: int
+    :type source: list
+    :type target: list
+    :type beam: int
     :type heap_size: int
     :type scoring: basestring
-    :rtype: _core.Aligner
+    :type recombine: bool
+    :type engine: basestring
+    :type vocabulary: Vocabulary
+    :type anchors: bool
+    :type heuristic: basestring
+    :type cache: AlignmentCache
+    :type max_cost: float
+    :rtype: _core.Alignment
 
-    :param beam_size:
+    :param source:
+    :param target:
+    :param beam:
     :param heap_size:
-    :param scoring:
+    :param scoring: 'levinshtein', 'nested' or a Scoring object (e.g. a PrecomputedScoring)
+    :param recombine: keep only the cheapest path through each grid cell
+    :param engine: 'beam' for the beam search, 'exact' for the optimal dynamic program, 'banded' for the dynamic
+        program restricted to an adaptive diagonal band, 'hirschberg' for the dynamic program in linear memory, or
+        'auto' to use the exact engine for 'levinshtein' scoring whenever the DP table has at most
+        yasa.factory.EXACT_MAX_CELLS cells and the banded one above that
+    :param vocabulary: vocabulary used to intern the tokens; pass the same one for every pair of a corpus
+    :param anchors: match the tokens which are unique in both sequences first, and align only the segments between
+        them with the engine; much faster on long, similar texts
+    :param heuristic: 'length' or 'bag' to replace the beam search of engine='beam' with an optimal A* search
+    :param cache: look the alignment up in (and store it to) this cache
+    :param max_cost: return None instead of any alignment costing more than this, and give up as soon as that is
+        certain; the exact engines then fill only the diagonal band that an alignment within max_cost can reach
     :return:
     """
-    scoring = scoring.lower()
-    if scoring == 'levinshtein':
-        scoring_obj = LevinshteinScoring()
-    elif scoring == 'nested':
-        scoring_obj = NestedLevinshteinScoring(heap_size=10, beam_width=0)
-    else:
-        raise ValueError(u"Unknown scoring type: '{}'".format(scoring))
-
-    return Aligner(scorer=scoring_obj, heap_size=heap_size, beam_width=beam_size)
+    engine = pick_engine(engine, scoring, source, target)
+    aligner = make_aligner(heap_size, beam, scoring, recombine, engine, vocabulary, anchors, heuristic)
+    if cache is not None:
+        aligner = CachedAligner(aligner, cache)
+    return aligner.align(source, target, max_cost)
 
 
-def align(source: List, target: List, heap_size: int = 100, beam: int = 0, scoring: str = 'levinshtein'):
+def distance(source: List, target: List, heap_size: int = 100, beam: int = 0, scoring: str = 'levinshtein',
+             recombine: bool = False, engine: str = 'auto', vocabulary: Vocabulary = None,
+             anchors: bool = False, heuristic: str = None, cache: AlignmentCache = None,
+             max_cost: float = None) -> Optional[float]:
     """
+    Cost of the alignment align would find with the same options, to the last bit, mostly without building it:
+    the exact and banded engines keep a single row of the DP table and the beam search keeps only the costs and
+    positions of its hypotheses (the hirschberg engine does align). Use it when only the cost matters, e.g. for
+    deduplication, filtering or ranking.
+
     :type source: list
     :type target: list
-    :type beam: int
-    :type heap_size: int
-    :type scoring: basestring
-    :rtype: _core.Alignment
+    :rtype: float
 
     :param source:
     :param target:
-    :param beam:
-    :param heap_size:
-    :param scoring:
-    :return:
+    :param cache: look the alignment up in (and store it to) this cache; with a cache the alignment is built
+    :param max_cost: return None instead of any cost above this
+    :return: the cost; all other parameters as in align
     """
-    return __mk_aligner(heap_size, beam, scoring).align(source, target)
+    engine = pick_engine(engine, scoring, source, target)
+    aligner = make_aligner(heap_size, beam, scoring, recombine, engine, vocabulary, anchors, heuristic)
+    if cache is not None:
+        aligner = CachedAligner(aligner, cache)
+    return aligner.distance(source, target, max_cost)
@@ -0,0 +1,5 @@
+import sys
+
+from yasa.cli import main
+
+sys.exit(main())
@@ -4,9 +4,21 @@ Author: Russell Klopfer
 """
 from __future__ import division
 
-__all__ = ['Aligner', ]
+__all__ = ['Aligner', 'NodeHeap', 'BoundedNodeHeap', ]
 
-from typing import List
+import copy
+import heapq
+from array import array
+from itertools import compress
+from operator import itemgetter
+from typing import List, Optional
+
+import numpy as np
+
+from yasa.heuristic import HEURISTICS, RemainingCost
+from yasa.instrument import CountingScoring, SearchObserver
+from yasa.scoring import Scoring
+from yasa.vocab import Vocabulary
 
 
 class AlignmentType:
@@ -20,6 +32,22 @@ class AlignmentType:
     DEL = "DEL"
 
 
+# compact op codes used by the search and by Alignment; index into _OP_TYPES
+_START, _MATCH, _SUB, _INS, _DEL = range(5)
+_OP_TYPES = (AlignmentType.START, AlignmentType.MATCH, AlignmentType.SUB, AlignmentType.INS, AlignmentType.DEL)
+_OP_CODES = {align_type: code for code, align_type in enumerate(_OP_TYPES)}
+# AlignmentType of each op code in Alignment.columns()
+OP_TYPES = _OP_TYPES
+
+
+def _cost_limit(max_cost: Optional[float]) -> Optional[float]:
+    """
+    max_cost with room for rounding, to compare costs against: the same float costs added up in another order (in a
+    band of the DP, or along another of several equally cheap paths) can come out a few ulps apart.
+    """
+    return None if max_cost is None else max_cost + 1e-9 * max(1., abs(max_cost))
+
+
 def _normalize_for_logging(s):
     if not s:
         return s
@@ -28,6 +56,8 @@ def _normalize_for_logging(s):
 
 
 class AlignmentNode(object):
+    __slots__ = ('align_type', 'previous', 'cost', 'source_pos', 'target_pos')
+
     def __init__(self, align_type, previous, source_pos, target_pos, cost):
         """
 
@@ -41,7 +71,7 @@ class AlignmentNode(object):
 
     def _trace_back(self):
         current = self
-        while current != Aligner.START_NODE:
+        while current is not None and current is not Aligner.START_NODE:
             yield current
             current = current.previous
 
@@ -76,14 +106,18 @@ class AlignmentNode(object):
             _normalize_for_logging(str(self.target_token(target_seq))))
 
     def __eq__(self, other):
-        if other is None:
-            return False
-        return (
-                self.previous == other.previous and
-                self.cost == other.cost and
-                self.source_pos == other.source_pos and
-                self.target_pos == other.target_pos
-        )
+        # walk both chains iteratively; recursing through previous would blow the stack on long alignments
+        current = self
+        while current is not other:
+            if current is None or other is None:
+                return False
+            if (current.cost != other.cost or
+                    current.source_pos != other.source_pos or
+                    current.target_pos != other.target_pos):
+                return False
+            current = current.previous
+            other = other.previous
+        return True
 
     def __repr__(self):
         return str(self)
@@ -94,6 +128,8 @@ class AlignmentNode(object):
 
 
 class Insertion(AlignmentNode):
+    __slots__ = ()
+
     def __init__(self, previous, cost):
         super(Insertion, self).__init__(AlignmentType.INS, previous,
                                         previous.source_pos,
@@ -102,6 +138,8 @@ class Insertion(AlignmentNode):
 
 
 class Deletion(AlignmentNode):
+    __slots__ = ()
+
     def __init__(self, previous, cost):
         super(Deletion, self).__init__(AlignmentType.DEL, previous,
                                        previous.source_pos + 1,
@@ -110,6 +148,8 @@ class Deletion(AlignmentNode):
 
 
 class Substitution(AlignmentNode):
+    __slots__ = ()
+
     def __init__(self, previous, cost):
         super(Substitution, self).__init__(AlignmentType.SUB, previous,
                                            previous.source_pos + 1,
@@ -118,6 +158,8 @@ class Substitution(AlignmentNode):
 
 
 class Match(AlignmentNode):
+    __slots__ = ()
+
     def __init__(self, previous, cost):
         super(Match, self).__init__(AlignmentType.MATCH, previous,
                                     previous.source_pos + 1,
@@ -125,6 +167,82 @@ class Match(AlignmentNode):
                                     previous.cost + cost)
 
 
+class BackpointerStore(object):
+    """
+    Compact, array-backed storage for the search graph.
+
+    Every committed hypothesis is one slot in three parallel arrays: its op code, the index of its parent and its
+    accumulated cost. This replaces a linked chain of AlignmentNode objects during the search; tracing back is an
+    index walk and AlignmentNode objects are only created as views once an Alignment is inspected.
+    """
+
+    def __init__(self):
+        self.ops = array('B')
+        self.parents = array('q')
+        self.costs = array('d')
+
+    def __len__(self):
+        return len(self.ops)
+
+    def append(self, op: int, parent: int, cost: float) -> int:
+        """
+        Store a new node.
+
+        :return: index of the new node
+        """
+        self.ops.append(op)
+        self.parents.append(parent)
+        self.costs.append(cost)
+        return len(self.ops) - 1
+
+    def trace(self, idx: int) -> List[int]:
+        """
+        Indices of the nodes on the path ending at idx, start node excluded, in alignment order.
+        """
+        parents = self.parents
+        path = []
+        while idx >= 0:
+            path.append(idx)
+            idx = parents[idx]
+        path.reverse()
+        if path and self.ops[path[0]] == _START:
+            del path[0]
+        return path
+
+    def compact(self, live: List[int]) -> array:
+        """
+        Drop every node which is not an ancestor of (or one of) the live nodes.
+
+        Parents are always stored before their children, so one forward pass renumbers the survivors.
+
+        :param live: indices of the nodes which are still referenced by the search
+        :return: map from old index to new index (-1 for dropped nodes)
+        """
+        keep = bytearray(len(self))
+        parents = self.parents
+        for idx in live:
+            while idx >= 0 and not keep[idx]:
+                keep[idx] = 1
+                idx = parents[idx]
+
+        kept = list(compress(range(len(self)), keep))
+        remap = array('q', [-1]) * len(self)
+        for new_idx, idx in enumerate(kept):
+            remap[idx] = new_idx
+        new_parents = array('q', [remap[parent] if parent >= 0 else -1 for parent in compress(parents, keep)])
+        ops = array('B', compress(self.ops, keep))
+        costs = array('d', compress(self.costs, keep))
+
+        self.ops, self.parents, self.costs = ops, new_parents, costs
+        return remap
+
+    def alignment(self, idx: int, source_seq: List, target_seq: List) -> 'Alignment':
+        path = self.trace(idx)
+        return Alignment.from_ops(array('B', [self.ops[i] for i in path]),
+                                  array('d', [self.costs[i] for i in path]),
+                                  source_seq, target_seq)
+
+
 class Alignment(object):
     def __init__(self, final_node: AlignmentNode, source_seq: List, target_seq: List):
         """
@@ -136,17 +254,62 @@ class Alignment(object):
         :return:
         :rtype: Alignment
         """
-        self.__nodes = final_node.flatten()
+        nodes = final_node.flatten()
+        self._set_ops(array('B', [_OP_CODES[n.align_type] for n in nodes]),
+                      array('d', [n.cost for n in nodes]),
+                      source_seq, target_seq)
+        self.cost = final_node.cost
+
+    @classmethod
+    def from_ops(cls, ops: array, costs: array, source_seq: List, target_seq: List) -> 'Alignment':
+        """
+        Construct an alignment from op codes and the accumulated cost after each op.
+
+        :param ops: op codes, one per aligned position
+        :param costs: accumulated cost at each aligned position
+        :param source_seq:
+        :param target_seq:
+        :rtype: Alignment
+        """
+        alignment = cls.__new__(cls)
+        alignment._set_ops(ops, costs, source_seq, target_seq)
+        alignment.cost = costs[-1] if costs else 0.
+        return alignment
+
+    def _set_ops(self, ops, costs, source_seq, target_seq):
+        self._ops = ops
+        self._costs = costs
+        self.__nodes = None
+        # one pass over the op codes each, in C; every counter below is O(1) after this
+        self._match_n = ops.count(_MATCH)
+        self._sub_n = ops.count(_SUB)
+        self._ins_n = ops.count(_INS)
+        self._del_n = ops.count(_DEL)
 
         self.source_seq = source_seq
         self.target_seq = target_seq
-        self.cost = final_node.cost
+
+    def _nodes(self) -> List[AlignmentNode]:
+        # node views are only built when somebody asks for them
+        if self.__nodes is None:
+            nodes = []
+            previous = Aligner.START_NODE
+            source_pos = target_pos = -1
+            for op, cost in zip(self._ops, self._costs):
+                if op != _INS:
+                    source_pos += 1
+                if op != _DEL:
+                    target_pos += 1
+                previous = AlignmentNode(_OP_TYPES[op], previous, source_pos, target_pos, cost)
+                nodes.append(previous)
+            self.__nodes = nodes
+        return self.__nodes
 
     def size(self) -> int:
-        return len(self.__nodes)
+        return len(self._ops)
 
     def node_at(self, align_x) -> AlignmentNode:
-        return self.__nodes[align_x]
+        return self._nodes()[align_x]
 
     def errors(self) -> List[AlignmentNode]:
         """
@@ -160,7 +323,7 @@ class Alignment(object):
                     node.align_type == AlignmentType.INS or
                     node.align_type == AlignmentType.DEL)
 
-        return [n for n in self.__nodes if is_error(n)]
+        return [n for n in self._nodes() if is_error(n)]
 
     def errors_n(self) -> int:
         """
@@ -170,10 +333,22 @@ class Alignment(object):
         :return: total errors
         :rtype: int
         """
-        return len(self.errors())
+        return self._sub_n + self._ins_n + self._del_n
+
+    def substitutions_n(self) -> int:
+        """:rtype: int"""
+        return self._sub_n
+
+    def insertions_n(self) -> int:
+        """:rtype: int"""
+        return self._ins_n
+
+    def deletions_n(self) -> int:
+        """:rtype: int"""
+        return self._del_n
 
-    def matches(self) -> List[Match]:
-        return [n for n in self.__nodes if n.align_type == AlignmentType.MATCH]
+    def matches(self) -> List[AlignmentNode]:
+        return [n for n in self._nodes() if n.align_type == AlignmentType.MATCH]
 
     def correct_n(self) -> int:
         """
@@ -182,7 +357,7 @@ class Alignment(object):
         :return:
         :rtype: int
         """
-        return len(self.matches())
+        return self._match_n
 
     def wer(self) -> float:
         """
@@ -198,10 +373,43 @@ class Alignment(object):
         else:
             return 0.
 
+    def columns(self) -> dict:
+        """
+        The alignment as NumPy columns, one row per aligned position, for corpus statistics without AlignmentNode
+        objects:
+
+        'op': op code (1 MATCH, 2 SUB, 3 INS, 4 DEL; see OP_TYPES),
+        'source_pos' / 'target_pos': index into source_seq / target_seq, -1 for an insertion / deletion,
+        'cost': accumulated cost.
+
+        :rtype: dict
+        """
+        ops = np.array(self._ops, dtype=np.uint8)
+        is_ins = ops == _INS
+        is_del = ops == _DEL
+        source_pos = np.cumsum(~is_ins, dtype=np.int64) - 1
+        source_pos[is_ins] = -1
+        target_pos = np.cumsum(~is_del, dtype=np.int64) - 1
+        target_pos[is_del] = -1
+        return {
+            'op': ops,
+            'source_pos': source_pos,
+            'target_pos': target_pos,
+            'cost': np.array(self._costs, dtype=np.float64),
+        }
+
     def __iter__(self):
-        for node in self.__nodes:
-            yield (node.source_token(self.source_seq),
-                   node.target_token(self.target_seq))
+        source_seq, target_seq = self.source_seq, self.target_seq
+        source_pos = target_pos = -1
+        for op in self._ops:
+            source_token = target_token = None
+            if op != _INS:
+                source_pos += 1
+                source_token = source_seq[source_pos]
+            if op != _DEL:
+                target_pos += 1
+                target_token = target_seq[target_pos]
+            yield source_token, target_token
 
     def __repr__(self):
         return str(self)
@@ -210,32 +418,51 @@ class Alignment(object):
         return self.pretty_print()
 
     def pretty_print(self, source_title='Source', target_title='Target') -> str:
-        pretty = ("size={} len(source)={}, len(target)={}, cost={}, WER={}\n"
-                  .format(self.size(), len(self.source_seq), len(self.target_seq),
-                          self.cost, self.wer())
-                  )
-        pretty += "{:<30}{:^10}{:>30}\n".format(source_title, 'Operation',
-                                                target_title)
-        pretty += "{:<30}{:^10}{:>30}\n".format('-' * len(source_title), '-' * 9,
-                                                '-' * len(target_title))
-        for node in self.__nodes:
-            pretty += node.pretty_print(self.source_seq, self.target_seq) + "\n"
-        return pretty
+        lines = ["size={} len(source)={}, len(target)={}, cost={}, WER={}"
+                 .format(self.size(), len(self.source_seq), len(self.target_seq),
+                         self.cost, self.wer()),
+                 "{:<30}{:^10}{:>30}".format(source_title, 'Operation',
+                                             target_title),
+                 "{:<30}{:^10}{:>30}".format('-' * len(source_title), '-' * 9,
+                                             '-' * len(target_title))]
+        lines.extend(node.pretty_print(self.source_seq, self.target_seq) for node in self._nodes())
+        lines.append('')
+        return "\n".join(lines)
+
+
+_rank = itemgetter(0)
 
 
 class NodeHeap(object):
-    def __init__(self, beam_size: int, max_size: int):
+    """
+    Holds the hypotheses of one search step.
+
+    A hypothesis is a tuple (rank, source_pos, target_pos, parent, op, cost): it is ranked by its first element,
+    and only becomes a node in the BackpointerStore once it survives pruning and gets expanded.
+    """
+
+    def __init__(self, beam_size: int, max_size: int, recombine: bool = False):
         """
         :type beam_size: float
         :type max_size: int
+        :type recombine: bool
         :param beam_size:
         :param max_size:
+        :param recombine: keep only the cheapest node for each (source_pos, target_pos) cell
         """
         self._beam = beam_size
         self._max_size = max_size
+        self._recombine = recombine
 
-        self._node_list: List[AlignmentNode] = []
+        self._node_list: List[tuple] = []
         self._is_sorted = True
+        # (source_pos, target_pos) -> index into _node_list; rebuilt lazily after sorting
+        self._cells = dict()
+
+        # hypotheses dropped: outside the beam, beyond max_size, or merged into a cheaper one on the same cell
+        self.pruned_beam = 0
+        self.pruned_size = 0
+        self.recombined = 0
 
     def __len__(self):
         return len(self._node_list)
@@ -245,45 +472,70 @@ class NodeHeap(object):
         for node in self._node_list:
             yield node
 
-    def to_string(self, source, target, n=None):
+    def to_string(self, source, target, n=None, store=None):
         """
         Prints the top-n elements of the heap.
 
         :param source:
         :param target:
         :param n:
+        :param store: BackpointerStore the hypotheses point into; needed to print their alignments
 
         :rtype: basestring
         """
+        self._sort_nodes()
         n = len(self) if n is None else min(n, len(self))
         heap_string = "************HEAP (size={})**************\n".format(len(self))
         for idx, node in enumerate(self._node_list[:n][::-1]):
-            if n and n == idx:
-                break
-            tmp_align = Alignment(node, source, target)
+            if store is None:
+                heap_string += "{}.) {}\n".format(n - idx, node)
+                continue
+            rank, source_pos, target_pos, parent, op, cost = node
+            path = store.trace(parent)
+            tmp_align = Alignment.from_ops(array('B', [store.ops[i] for i in path] + [op]),
+                                           array('d', [store.costs[i] for i in path] + [cost]),
+                                           source, target)
             heap_string += "{}.) {}\n".format(n - idx, tmp_align.pretty_print())
         return heap_string
 
-    def add(self, node: AlignmentNode):
+    def add(self, node: tuple):
         """
 
         :param node:
         :return:
         :rtype: None
         """
+        if self._recombine:
+            if self._cells is None:
+                self._index_cells()
+            key = (node[1], node[2])
+            idx = self._cells.get(key)
+            if idx is not None:
+                # paths meeting at the same cell share all possible futures; only the cheapest can win
+                self.recombined += 1
+                if node[0] < self._node_list[idx][0]:
+                    self._node_list[idx] = node
+                    self._is_sorted = False
+                return
+            self._cells[key] = len(self._node_list)
+
         self._is_sorted = False
         self._node_list.append(node)
 
+    def _index_cells(self):
+        self._cells = {(node[1], node[2]): idx for idx, node in enumerate(self._node_list)}
+
     def _sort_nodes(self):
         if self._is_sorted:
             return
 
-        self._node_list.sort(key=lambda node: node.cost)
+        self._node_list.sort(key=_rank)
         self._is_sorted = True
+        self._cells = None
 
     @property
-    def top(self) -> AlignmentNode:
-        """:rtype: AlignmentNode"""
+    def top(self) -> tuple:
+        """:rtype: tuple"""
         self._sort_nodes()
         return self._node_list[0]
 
@@ -294,122 +546,491 @@ class NodeHeap(object):
 
         self._sort_nodes()
         if self._beam > 0:
-            best = self.top.cost
+            best = self.top[0]
             idx = 1
             while idx < len(self._node_list):
-                if self._node_list[idx].cost > best + self._beam:
+                if self._node_list[idx][0] > best + self._beam:
                     break
                 idx += 1
             assert idx > 0
+            self.pruned_beam += len(self._node_list) - idx
             self._node_list = self._node_list[:idx]
 
-        if self._max_size > 0:
-            self._node_list = self._node_list[:min(self._max_size, len(self))]
+        if self._max_size > 0 and len(self._node_list) > self._max_size:
+            self.pruned_size += len(self._node_list) - self._max_size
+            self._node_list = self._node_list[:self._max_size]
+        self._cells = None
+
+
+class BoundedNodeHeap(NodeHeap):
+    """
+    NodeHeap which enforces max_size and beam while nodes are added, instead of sorting everything at prune time.
+
+    Nodes are kept in a bounded max-heap (worst node at the root) and a running best cost is tracked, so a node
+    outside the beam or worse than the current worst of a full heap is rejected immediately. Pruning then only has
+    to sort the at most max_size survivors.
+    """
+
+    def __init__(self, beam_size: int, max_size: int, recombine: bool = False):
+        super(BoundedNodeHeap, self).__init__(beam_size, max_size, recombine=recombine)
+        # entries are (-rank, -order, node) so the root is the worst node; ties go to the latest addition
+        self._heap = []
+        self._order = 0
+        self._best = float('inf')
+        self._beam_limit = float('inf')
+        self._worst_limit = float('inf')
+        self._worst_order = 0
+        self._capacity = max_size if max_size > 0 else float('inf')
+        self._live = 0
+        # (source_pos, target_pos) -> (order, live node or None). As in NodeHeap, a cell keeps the order of the first
+        # node added for it, even one that was rejected or evicted, so the cheapest node for a cell takes its place
+        # among equal ranks. Replaced nodes are left in _heap and skipped lazily.
+        self._cell_nodes = dict()
+
+    def __len__(self):
+        return self._live
+
+    def _is_stale(self, entry) -> bool:
+        node = entry[2]
+        return self._recombine and self._cell_nodes[(node[1], node[2])][1] is not node
+
+    def _drop_stale_root(self):
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def add(self, node: tuple):
+        """
+
+        :param node:
+        :return:
+        :rtype: None
+        """
+        cost = node[0]
+        existing = None
+        if self._recombine:
+            key = (node[1], node[2])
+            cell = self._cell_nodes.get(key)
+            if cell is None:
+                self._order += 1
+                order = self._order
+                self._cell_nodes[key] = (order, None)
+            else:
+                order, existing = cell
+        else:
+            self._order += 1
+            order = self._order
+
+        # anything outside the beam, or no better than the worst node of a full heap, is rejected outright
+        if cost > self._beam_limit:
+            self.pruned_beam += 1
+            return
+        if cost >= self._worst_limit and (cost > self._worst_limit or order > self._worst_order):
+            self.pruned_size += 1
+            return
+
+        if existing is not None:
+            self.recombined += 1
+            if existing[0] <= cost:
+                return
+
+        entry = (-cost, -order, node)
+        if existing is not None:
+            heapq.heappush(self._heap, entry)
+        elif self._live >= self._capacity:
+            # full: the new node takes the place of the current worst one
+            self._drop_stale_root()
+            evicted = heapq.heapreplace(self._heap, entry)[2]
+            self.pruned_size += 1
+            if self._recombine:
+                evicted_key = (evicted[1], evicted[2])
+                self._cell_nodes[evicted_key] = (self._cell_nodes[evicted_key][0], None)
+        else:
+            heapq.heappush(self._heap, entry)
+            self._live += 1
+        if self._recombine:
+            self._cell_nodes[key] = (order, node)
+        if self._live >= self._capacity:
+            self._drop_stale_root()
+            self._worst_limit = -self._heap[0][0]
+            self._worst_order = -self._heap[0][1]
+
+        if cost < self._best:
+            self._best = cost
+            if self._beam > 0:
+                self._beam_limit = cost + self._beam
+        self._is_sorted = False
+
+    def _sort_nodes(self):
+        if self._is_sorted:
+            return
+
+        if self._recombine:
+            self._heap = [entry for entry in self._heap if not self._is_stale(entry)]
+            heapq.heapify(self._heap)
+        self._node_list = [entry[2] for entry in sorted(self._heap, reverse=True)]
+        self._is_sorted = True
+
+    def prune(self) -> None:
+        """Prune the list"""
+        self._sort_nodes()
+        super(BoundedNodeHeap, self).prune()
+        self._heap = [(-node[0], -idx, node) for idx, node in enumerate(self._node_list)]
+        heapq.heapify(self._heap)
+        self._order = self._live = len(self._heap)
+        self._cell_nodes = {(node[1], node[2]): (idx, node) for idx, node in enumerate(self._node_list)}
+        if self._node_list:
+            self._best = self._node_list[0][0]
+            if self._beam > 0:
+                self._beam_limit = self._best + self._beam
+        if self._live >= self._capacity:
+            self._worst_limit = -self._heap[0][0]
+            self._worst_order = -self._heap[0][1]
+
+
+class _OpenList(object):
+    """
+    Open hypotheses of the A* search, cheapest rank first. Among equal ranks the hypothesis furthest along wins, so
+    the search heads for the end instead of widening.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._order = 0
+        # counters of NodeHeap, for observers; nothing is pruned and recombined counts cells popped again
+        self.pruned_beam = 0
+        self.pruned_size = 0
+        self.recombined = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def top(self) -> tuple:
+        return self.entries[0][-1]
+
+    def add(self, node: tuple):
+        self._order += 1
+        heapq.heappush(self.entries, (node[0], -node[1] - node[2], self._order, node))
+
+    def pop(self) -> tuple:
+        return heapq.heappop(self.entries)[-1]
+
+    def remap(self, remap: array):
+        """Re-point every hypothesis after BackpointerStore.compact"""
+        self.entries = [(rank, depth, order, (node[0], node[1], node[2], remap[node[3]], node[4], node[5]))
+                        for rank, depth, order, node in self.entries]
 
 
 class Aligner(object):
     # Constants
     START_NODE = AlignmentNode(AlignmentType.START, None, -1, -1, 0.)
-
-    def __init__(self, scorer, heap_size: int, beam_width: int):
+    # compact the BackpointerStore once it holds this many nodes (and after that, twice what survived)
+    COMPACT_THRESHOLD = 1 << 16
+    # the A* search falls back to the beam search after expanding this many hypotheses, with a heap of
+    # FALLBACK_HEAP_SIZE when heap_size is 0 (infinite)
+    MAX_EXPANSIONS = 1 << 20
+    FALLBACK_HEAP_SIZE = 100
+
+    def __init__(self, scorer, heap_size: int, beam_width: int, recombine: bool = False, heap_class=NodeHeap,
+                 vocabulary: Vocabulary = None, heuristic: str = None, observer: SearchObserver = None):
         """
         Construct a new aligner with the given parameters.
         :param beam_width: beam width (0 -> infinite)
         :param heap_size: heap size (0 -> infinite)
         :param scorer: object to determine the cost of operations
+        :param recombine: merge hypotheses which land on the same (source_pos, target_pos) cell, keeping the
+            cheapest one (Viterbi-style). This keeps the heap free of duplicate paths.
+        :param heap_class: NodeHeap implementation used for the search, e.g. BoundedNodeHeap
+        :param vocabulary: vocabulary used to intern tokens, so the search compares integers; share one across a
+            corpus to intern each token once
+        :param heuristic: search best-first (A*) instead of with a beam, ranking hypotheses by their cost plus a
+            lower bound on the cost still to come: 'length' (the difference of the remaining lengths) or 'bag'
+            (also counting tokens left on one side which the other side doesn't have). The result is optimal, unless
+            the search expands more than MAX_EXPANSIONS hypotheses and falls back to the beam search, the only time
+            heap_size and beam_width apply. Scorers with negative costs have no such bound, so they always use the
+            beam search.
+        :param observer: called at the start, after every step and at the end of each search, e.g. a SearchStats
+            to count expanded and pruned hypotheses and scorer calls; None -> no instrumentation and no overhead
         :return: a new Aligner object
 
         :type beam_width: float
         :type heap_size: int
         :type scorer: Scoring
+        :type recombine: bool
+        :type heap_class: type
+        :type vocabulary: Vocabulary
+        :type heuristic: basestring
+        :type observer: SearchObserver
         :rtype: Aligner
         """
+        if heuristic is not None and heuristic not in HEURISTICS:
+            raise ValueError(u"Unknown heuristic: '{}'".format(heuristic))
         self.beam_width = beam_width
         self.heap_size = heap_size
         self.scorer = scorer
+        self.recombine = recombine
+        self.heap_class = heap_class
+        self.vocabulary = vocabulary
+        self.heuristic = heuristic
+        self.observer = observer
 
     def _new_heap(self) -> NodeHeap:
-        return NodeHeap(self.beam_width, self.heap_size)
+        return self.heap_class(self.beam_width, self.heap_size, recombine=self.recombine)
 
     def __str__(self):
-        return ("beam_width: {}, heap_size: {}, scorer: {}".
-                format(self.beam_width, self.heap_size, self.scorer))
+        return ("beam_width: {}, heap_size: {}, recombine: {}, heap: {}, heuristic: {}, scorer: {}".
+                format(self.beam_width, self.heap_size, self.recombine, self.heap_class.__name__, self.heuristic,
+                       self.scorer))
 
-    def align(self, source: List, target: List):
+    def align(self, source: List, target: List, max_cost: float = None):
         """
         Generate alignment between source and target.
 
+        With max_cost, hypotheses whose cost plus a lower bound on the cost still to come (the heuristic's, or
+        'length') exceeds max_cost are dropped, and the search gives up as soon as none is left. For the beam
+        search, None only means that no alignment within max_cost survived the beam.
+
         :param source:
         :param target:
+        :param max_cost: return None instead of any alignment costing more than this
         :type source: list
         :type target: list
+        :type max_cost: float
         :return:
         :rtype: Alignment
         """
+        return self._search(source, target, True, max_cost)
+
+    def distance(self, source: List, target: List, max_cost: float = None) -> Optional[float]:
+        """
+        Cost of the alignment align(source, target) would find, without keeping any backpointers: hypotheses are
+        just costs and positions, so this is faster and much leaner than align when only the cost matters.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of any cost above this, as in align
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: float
+        """
+        return self._search(source, target, False, max_cost)
+
+    def _search(self, source: List, target: List, traceback: bool, max_cost: Optional[float]):
+        max_cost = _cost_limit(max_cost)
+        vocabulary = self.vocabulary if self.vocabulary is not None else Vocabulary()
+        source_ids = vocabulary.encode(source).tolist()
+        target_ids = vocabulary.encode(target).tolist()
+        estimate = None
+        if self.heuristic is not None:
+            estimate = RemainingCost.for_scorer(self.heuristic, self.scorer, source, target, source_ids, target_ids,
+                                                vocabulary)
+        bound = None
+        if max_cost is not None and estimate is None:
+            # what the beam search prunes on; None with negative costs, when only the final cost can be checked
+            bound = RemainingCost.for_scorer('length', self.scorer, source, target, source_ids, target_ids,
+                                             vocabulary)
+
+        observer = self.observer
+        scorer = None
+        if observer is not None:
+            scorer = CountingScoring(self.scorer)
+            observer.on_start(self, source, target)
+
+        store = BackpointerStore() if traceback else None
+        if estimate is not None:
+            node = self._align_best_first(source, target, source_ids, target_ids, estimate, scorer, store, max_cost)
+        else:
+            node = self._align_beam(source, target, source_ids, target_ids, scorer, store, max_cost, bound)
+        if node is None or (max_cost is not None and node[5] > max_cost):
+            result = None
+        else:
+            rank, source_pos, target_pos, parent, op, cost = node
+            result = store.alignment(store.append(op, parent, cost), source, target) if traceback else cost
+
+        if observer is not None:
+            observer.on_end(result if traceback else None, scorer.calls)
+        return result
+
+    def _align_beam(self, source: List, target: List, source_ids: List[int], target_ids: List[int],
+                    scorer: Scoring = None, store: BackpointerStore = None, max_cost: float = None,
+                    bound: RemainingCost = None) -> Optional[tuple]:
+        """
+        Beam search: move every hypothesis of the heap one cell on, then prune the new heap to the beam and heap
+        size.
+
+        :param store: where the paths are kept (None -> nowhere, for the cost alone)
+        :param max_cost: don't expand hypotheses whose cost plus bound exceeds this
+        :param bound: lower bound on the remaining cost from a cell
+        :return: the best final hypothesis, or None when every hypothesis was cut off by max_cost
+        """
+        observer = self.observer
+        compact_at = self.COMPACT_THRESHOLD
+        source_end = len(source) - 1
+        target_end = len(target) - 1
+
         current_heap = self._new_heap()
-        current_heap.add(Aligner.START_NODE)
+        current_heap.add((0., -1, -1, -1, _START, 0.))
+        step = 0
 
-        while (current_heap.top.source_pos < len(source) - 1 or
-               current_heap.top.target_pos < len(target) - 1):
+        while True:
+            top = current_heap.top
+            if top[1] >= source_end and top[2] >= target_end:
+                break
             next_heap = self._new_heap()
             for node in current_heap:
-                self._expand_from_node(next_heap, node, source, target)
+                if bound is not None and node[5] + bound(node[1], node[2]) > max_cost:
+                    continue
+                self._expand_from_node(next_heap, node, source, target, store, source_ids, target_ids, None, scorer)
+            if not len(next_heap):
+                return None
             next_heap.prune()
+            if observer is not None:
+                step += 1
+                observer.on_step(step, len(current_heap), next_heap)
             current_heap = next_heap
 
-        return Alignment(current_heap.top, source, target)
+            if store is not None and len(store) > compact_at:
+                current_heap = self._compact(store, current_heap)
+                compact_at = max(self.COMPACT_THRESHOLD, 2 * len(store))
+
+        return current_heap.top
 
-    def _expand_from_node(self, next_heap: NodeHeap, previous_node: AlignmentNode, source: List, target: List):
+    def _align_best_first(self, source: List, target: List, source_ids: List[int], target_ids: List[int],
+                          estimate: RemainingCost, scorer: Scoring = None, store: BackpointerStore = None,
+                          max_cost: float = None) -> Optional[tuple]:
+        """
+        A* search: always expand the open hypothesis with the lowest cost + estimate, so the first hypothesis to
+        reach the end is optimal. Nothing is pruned; the estimate alone keeps the search near the optimal path. When
+        it doesn't (a weak estimate on long, dissimilar sequences), the open list and the expanded cells would grow
+        towards O(n m), so after MAX_EXPANSIONS expansions the search starts over as a bounded beam search.
+
+        :param store: where the paths are kept (None -> nowhere, for the cost alone)
+        :param max_cost: give up once the lowest cost + estimate exceeds this
+        :return: the first final hypothesis, or None after giving up
+        """
+        max_expansions = self.MAX_EXPANSIONS
+        compact_at = self.COMPACT_THRESHOLD
+        source_end = len(source) - 1
+        target_end = len(target) - 1
+
+        open_list = _OpenList()
+        open_list.add((estimate(-1, -1), -1, -1, -1, _START, 0.))
+        # cheapest cost each (source_pos, target_pos) cell has been expanded with
+        expanded = dict()
+        observer = self.observer
+        step = 0
+
+        while True:
+            node = open_list.pop()
+            rank, source_pos, target_pos, parent, op, cost = node
+            if max_cost is not None and rank > max_cost:
+                # every path still open costs at least rank
+                return None
+            if source_pos >= source_end and target_pos >= target_end:
+                break
+            cell = (source_pos, target_pos)
+            best = expanded.get(cell)
+            if best is not None and best <= cost:
+                if observer is not None:
+                    open_list.recombined += 1
+                continue
+            expanded[cell] = cost
+            if len(expanded) > max_expansions:
+                return self._fall_back_to_beam(source, target, source_ids, target_ids, estimate, scorer, store,
+                                               max_cost)
+
+            self._expand_from_node(open_list, node, source, target, store, source_ids, target_ids, estimate, scorer)
+            if observer is not None:
+                step += 1
+                observer.on_step(step, 1, open_list)
+                open_list.recombined = 0
+
+            if store is not None and len(store) > compact_at:
+                remap = store.compact([entry[-1][3] for entry in open_list.entries])
+                open_list.remap(remap)
+                compact_at = max(self.COMPACT_THRESHOLD, 2 * len(store))
+
+        return node
+
+    def _fall_back_to_beam(self, source: List, target: List, source_ids: List[int], target_ids: List[int],
+                           estimate: RemainingCost, scorer: Scoring = None, store: BackpointerStore = None,
+                           max_cost: float = None) -> Optional[tuple]:
+        """Beam search in place of an A* search which expanded too much, pruning on max_cost with its estimate"""
+        beam = copy.copy(self)
+        beam.heuristic = None
+        beam.heap_size = self.heap_size or self.FALLBACK_HEAP_SIZE
+        if store is not None:
+            # nothing the A* search kept is needed anymore
+            store.compact([])
+        return beam._align_beam(source, target, source_ids, target_ids, scorer, store, max_cost,
+                                estimate if max_cost is not None else None)
+
+    def _compact(self, store: BackpointerStore, heap: NodeHeap) -> NodeHeap:
+        """
+        Free the nodes of every path which has been pruned, and re-point the hypotheses of heap into the compacted
+        store.
         """
-        Create new nodes pointing back to previous_node and place them in next_heap.
+        nodes = list(heap)
+        remap = store.compact([node[3] for node in nodes])
+        compacted = self._new_heap()
+        for rank, source_pos, target_pos, parent, op, cost in nodes:
+            compacted.add((rank, source_pos, target_pos, remap[parent], op, cost))
+        compacted.prune()
+        return compacted
+
+    def _expand_from_node(self, next_heap: NodeHeap, previous_node: tuple, source: List, target: List,
+                          store: BackpointerStore, source_ids: List[int], target_ids: List[int],
+                          estimate: RemainingCost = None, scorer: Scoring = None):
+        """
+        Commit previous_node to the store, create new hypotheses pointing back to it and place them in next_heap.
+        Hypotheses are ranked by their cost, plus estimate of the cost still to come when given. Without a store,
+        the new hypotheses have no parent.
 
         :type next_heap: NodeHeap
-        :type previous_node: AlignmentNode
+        :type previous_node: tuple
         :type source: list
         :type target: list
+        :type store: BackpointerStore
+        :type source_ids: list[int]
+        :type target_ids: list[int]
 
         :param next_heap:
         :param previous_node:
         :param source:
         :param target:
+        :param store: where the paths are kept, or None
+        :param source_ids: interned source tokens
+        :param target_ids: interned target tokens
+        :param estimate: lower bound on the remaining cost from a (source_pos, target_pos) cell
+        :param scorer: scorer to use instead of self.scorer, e.g. one counting its calls
         """
-        source_x = previous_node.source_pos
-        target_x = previous_node.target_pos
+        rank, source_x, target_x, parent, op, cost = previous_node
         source_finished = source_x == len(source) - 1
         target_finished = target_x == len(target) - 1
 
-        def insertion():
-            return Insertion(previous_node,
-                             self.scorer.insertion(target[target_x]))
-
-        def deletion():
-            return Deletion(previous_node,
-                            self.scorer.deletion(source[source_x]))
-
-        def match():
-            return Match(previous_node,
-                         self.scorer.match(source[source_x]))
-
-        def substitution():
-            return Substitution(previous_node,
-                                self.scorer.substitution(source[source_x + 1],
-                                                         target[target_x + 1])
-                                )
-
         # we're at the end of the alignment already. just copy the previous node
         # into the next heap.
         if source_finished and target_finished:
             next_heap.add(previous_node)
             return
 
+        node_id = store.append(op, parent, cost) if store is not None else -1
+        if scorer is None:
+            scorer = self.scorer
+
         # we're at the end of the source sequence. this must be an insertion.
         if source_finished:
-            next_heap.add(insertion())
+            ins_cost = cost + scorer.insertion(target[target_x + 1])
+            ins_rank = ins_cost + estimate(source_x, target_x + 1) if estimate is not None else ins_cost
+            next_heap.add((ins_rank, source_x, target_x + 1, node_id, _INS, ins_cost))
             return
 
         # we're at the end of the target sequence. this must be a deletion.
         if target_finished:
-            next_heap.add(deletion())
+            del_cost = cost + scorer.deletion(source[source_x + 1])
+            del_rank = del_cost + estimate(source_x + 1, target_x) if estimate is not None else del_cost
+            next_heap.add((del_rank, source_x + 1, target_x, node_id, _DEL, del_cost))
             return
 
         """
@@ -418,15 +1039,29 @@ class Aligner(object):
         (2) Insertion
         (3) Deletion
         """
+        source_token = source[source_x + 1]
+        target_token = target[target_x + 1]
 
-        if source[source_x + 1] == target[target_x + 1]:
+        if source_ids[source_x + 1] == target_ids[target_x + 1]:
             # match
-            next_heap.add(match())
+            diag_op = _MATCH
+            diag_cost = cost + scorer.match(source_token)
         else:
             # sub
-            next_heap.add(substitution())
-
-        # always allow for insertions
-        next_heap.add(insertion())
-        # and deletions
-        next_heap.add(deletion())
+            diag_op = _SUB
+            diag_cost = cost + scorer.substitution(source_token, target_token)
+        # always allow for insertions and deletions
+        ins_cost = cost + scorer.insertion(target_token)
+        del_cost = cost + scorer.deletion(source_token)
+
+        if estimate is not None:
+            next_heap.add((diag_cost + estimate(source_x + 1, target_x + 1), source_x + 1, target_x + 1, node_id,
+                           diag_op, diag_cost))
+            next_heap.add((ins_cost + estimate(source_x, target_x + 1), source_x, target_x + 1, node_id, _INS,
+                           ins_cost))
+            next_heap.add((del_cost + estimate(source_x + 1, target_x), source_x + 1, target_x, node_id, _DEL,
+                           del_cost))
+        else:
+            next_heap.add((diag_cost, source_x + 1, target_x + 1, node_id, diag_op, diag_cost))
+            next_heap.add((ins_cost, source_x, target_x + 1, node_id, _INS, ins_cost))
+            next_heap.add((del_cost, source_x + 1, target_x, node_id, _DEL, del_cost))
@@ -0,0 +1,231 @@
+"""
+Anchored (divide and conquer) alignment
+"""
+__all__ = ['AnchoredAligner', 'find_anchors', ]
+
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from yasa.aligner import Alignment, _MATCH, _cost_limit
+from yasa.vocab import Vocabulary
+
+
+def _unique_ngrams(ids: Sequence[int], ngram: int) -> dict:
+    """n-gram -> start position, for the n-grams which occur exactly once in ids"""
+    grams = [tuple(ids[x:x + ngram]) for x in range(len(ids) - ngram + 1)]
+    counts = Counter(grams)
+    return {gram: x for x, gram in enumerate(grams) if counts[gram] == 1}
+
+
+def _longest_chain(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Longest chain of pairs increasing in both positions (patience sorting); pairs must be sorted by source"""
+    tails = []  # tails[k]: target position ending the best chain of length k + 1
+    tail_idx = []
+    back = [-1] * len(pairs)
+    for idx, (_, target_pos) in enumerate(pairs):
+        k = bisect_left(tails, target_pos)
+        if k == len(tails):
+            tails.append(target_pos)
+            tail_idx.append(idx)
+        else:
+            tails[k] = target_pos
+            tail_idx[k] = idx
+        back[idx] = tail_idx[k - 1] if k else -1
+
+    chain = []
+    idx = tail_idx[-1] if tail_idx else -1
+    while idx >= 0:
+        chain.append(pairs[idx])
+        idx = back[idx]
+    chain.reverse()
+    return chain
+
+
+def find_anchors(source_ids: Sequence[int], target_ids: Sequence[int], ngram: int = 1) -> List[Tuple[int, int, int]]:
+    """
+    Find runs of tokens which can safely be aligned as matches before running any search: n-grams which occur
+    exactly once in both sequences, chained so that they increase in both sequences (as in patience diff), then
+    grown over the identical tokens around them.
+
+    :param source_ids: encoded source tokens
+    :param target_ids: encoded target tokens
+    :param ngram: length of the unique n-grams to anchor on; longer n-grams give fewer, but safer, anchors
+    :return: non overlapping (source_pos, target_pos, length) runs of matches, in order
+    :rtype: list
+    """
+    in_target = _unique_ngrams(target_ids, ngram)
+    pairs = [(source_pos, in_target[gram])
+             for gram, source_pos in _unique_ngrams(source_ids, ngram).items() if gram in in_target]
+    pairs.sort()
+
+    runs = []
+    for source_pos, target_pos in _longest_chain(pairs):
+        if runs:
+            last_source, last_target, length = runs[-1]
+            if source_pos - last_source == target_pos - last_target and source_pos <= last_source + length:
+                # overlapping n-grams on the same diagonal
+                runs[-1] = (last_source, last_target, source_pos + ngram - last_source)
+                continue
+            if source_pos < last_source + length or target_pos < last_target + length:
+                continue
+        runs.append((source_pos, target_pos, ngram))
+
+    # grow each run over the identical tokens next to it, without crossing its neighbours
+    grown = []
+    source_end, target_end = 0, 0
+    for x, (source_pos, target_pos, length) in enumerate(runs):
+        while (source_pos > source_end and target_pos > target_end and
+               source_ids[source_pos - 1] == target_ids[target_pos - 1]):
+            source_pos -= 1
+            target_pos -= 1
+            length += 1
+        source_stop, target_stop = ((runs[x + 1][0], runs[x + 1][1]) if x + 1 < len(runs)
+                                    else (len(source_ids), len(target_ids)))
+        while (source_pos + length < source_stop and target_pos + length < target_stop and
+               source_ids[source_pos + length] == target_ids[target_pos + length]):
+            length += 1
+        grown.append((source_pos, target_pos, length))
+        source_end, target_end = source_pos + length, target_pos + length
+    return grown
+
+
+# the aligner of a segment worker process, set up by the pool initializer
+_segment_aligner = None
+
+
+def _init_segment_worker(aligner):
+    global _segment_aligner
+    _segment_aligner = aligner
+
+
+def _align_segment(segment: Tuple[List, List]) -> Alignment:
+    return _segment_aligner.align(*segment)
+
+
+def _distance_segment(segment: Tuple[List, List]) -> float:
+    return _segment_aligner.distance(*segment)
+
+
+class AnchoredAligner(object):
+    def __init__(self, aligner, ngram: int = 1, workers: int = 1, vocabulary: Vocabulary = None):
+        """
+        Aligner which first matches the anchors found by find_anchors, then aligns the segments between them
+        independently with another aligner and stitches the pieces into a single Alignment.
+
+        On long, mostly similar texts this turns one huge search into many small ones, and keeps a beam search from
+        wandering off the diagonal. The result is only as good as the anchors: it is optimal when the optimal
+        alignment matches them, which unique tokens nearly always are.
+
+        :param aligner: aligner for the segments between anchors, e.g. Aligner or ExactAligner
+        :param ngram: length of the unique n-grams to anchor on
+        :param workers: align segments in this many processes (1 -> in this process)
+        :param vocabulary: vocabulary used to find anchors; defaults to the vocabulary of aligner
+        :type ngram: int
+        :type workers: int
+        :type vocabulary: Vocabulary
+        :rtype: AnchoredAligner
+        """
+        self.aligner = aligner
+        self.ngram = ngram
+        self.workers = workers
+        self.vocabulary = vocabulary if vocabulary is not None else getattr(aligner, 'vocabulary', None)
+
+    def __str__(self):
+        return "anchored, ngram: {}, workers: {}, aligner: ({})".format(self.ngram, self.workers, self.aligner)
+
+    def _segments(self, source: List, target: List) -> Tuple[List, List]:
+        """The anchor runs, and the segments between them (and before the first / after the last one)"""
+        vocabulary = self.vocabulary if self.vocabulary is not None else Vocabulary()
+        runs = find_anchors(vocabulary.encode(source).tolist(), vocabulary.encode(target).tolist(), self.ngram)
+
+        # possibly empty
+        segments = []
+        source_end = target_end = 0
+        for source_pos, target_pos, length in runs:
+            segments.append((source[source_end:source_pos], target[target_end:target_pos]))
+            source_end, target_end = source_pos + length, target_pos + length
+        segments.append((source[source_end:], target[target_end:]))
+        return runs, segments
+
+    def _solve(self, segments: List, function: Callable, method: str) -> Iterator:
+        """method of the aligner applied to every non-empty segment, in order"""
+        pending = [segment for segment in segments if segment[0] or segment[1]]
+        if self.workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_segment_worker,
+                                     initargs=(self.aligner,)) as pool:
+                return iter(list(pool.map(function, pending,
+                                          chunksize=max(1, len(pending) // (4 * self.workers)))))
+        solve = getattr(self.aligner, method)
+        return (solve(*segment) for segment in pending)
+
+    def align(self, source: List, target: List, max_cost: float = None) -> Optional[Alignment]:
+        """
+        Generate alignment between source and target.
+
+        max_cost is checked on the stitched alignment only: the segments are aligned without a cutoff, since
+        matching an anchor may cost less than nothing.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of an alignment costing more than this
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: Alignment
+        """
+        max_cost = _cost_limit(max_cost)
+        runs, segments = self._segments(source, target)
+        aligned = self._solve(segments, _align_segment, 'align')
+
+        ops = array('B')
+        costs = array('d')
+        total = 0.
+        match = self.aligner.scorer.match
+        for x, segment in enumerate(segments):
+            if segment[0] or segment[1]:
+                alignment = next(aligned)
+                ops.extend(alignment._ops)
+                costs.extend(total + cost for cost in alignment._costs)
+                total += alignment.cost
+            if x < len(runs):
+                source_pos, _, length = runs[x]
+                for token in source[source_pos:source_pos + length]:
+                    total += match(token)
+                    ops.append(_MATCH)
+                    costs.append(total)
+        if max_cost is not None and total > max_cost:
+            return None
+        return Alignment.from_ops(ops, costs, source, target)
+
+    def distance(self, source: List, target: List, max_cost: float = None) -> Optional[float]:
+        """
+        Cost of the alignment align(source, target) would find, from the distance of every segment.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of a cost above this, as in align
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: float
+        """
+        max_cost = _cost_limit(max_cost)
+        runs, segments = self._segments(source, target)
+        distances = self._solve(segments, _distance_segment, 'distance')
+
+        # summed in the same order as align does
+        total = 0.
+        match = self.aligner.scorer.match
+        for x, segment in enumerate(segments):
+            if segment[0] or segment[1]:
+                total += next(distances)
+            if x < len(runs):
+                source_pos, _, length = runs[x]
+                for token in source[source_pos:source_pos + length]:
+                    total += match(token)
+        if max_cost is not None and total > max_cost:
+            return None
+        return total
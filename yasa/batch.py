@@ -0,0 +1,270 @@
+"""
+Aligning many pairs at once
+"""
+__all__ = ['align_many', 'align_corpus', ]
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from yasa.aligner import Alignment
+from yasa.cache import AlignmentCache, CachedAligner
+from yasa.corpus import PairCorpus
+from yasa.factory import make_aligner, pick_engine
+from yasa.vocab import Vocabulary
+
+
+def alignment_cost(alignment: Alignment) -> float:
+    return alignment.cost
+
+
+def alignment_wer(alignment: Alignment) -> float:
+    return alignment.wer()
+
+
+def alignment_counts(alignment: Alignment) -> Tuple[float, int, int]:
+    """(cost, correct, errors): enough to accumulate corpus WER"""
+    return alignment.cost, alignment.correct_n(), alignment.errors_n()
+
+
+_RESULTS = {
+    'alignment': None,
+    'cost': alignment_cost,
+    'wer': alignment_wer,
+    'counts': alignment_counts,
+}
+
+
+class _Worker(object):
+    """
+    Aligns pairs with the options of align_many. Aligners (and so scorers, with their caches) are built once per
+    engine and reused for every pair this worker sees.
+    """
+
+    def __init__(self, heap_size, beam, scoring, recombine, engine, anchors, heuristic, result, cache=None,
+                 vocabulary=None, max_cost=None):
+        self.heap_size = heap_size
+        self.beam = beam
+        self.scoring = scoring
+        self.recombine = recombine
+        self.engine = engine
+        self.anchors = anchors
+        self.heuristic = heuristic
+        self.result = _RESULTS[result] if isinstance(result, str) else result
+        self.cache = cache
+        self.max_cost = max_cost
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self._aligners = dict()
+
+    def aligner(self, source, target):
+        engine = pick_engine(self.engine, self.scoring, source, target)
+        aligner = self._aligners.get(engine)
+        if aligner is None:
+            aligner = make_aligner(self.heap_size, self.beam, self.scoring, self.recombine, engine, self.vocabulary,
+                                   self.anchors, self.heuristic)
+            if self.cache is not None:
+                aligner = CachedAligner(aligner, self.cache)
+            self._aligners[engine] = aligner
+        return aligner
+
+    def __call__(self, pair):
+        aligner = self.aligner(*pair)
+        if self.result is alignment_cost:
+            # no alignment needed, so none is built
+            return aligner.distance(*pair, max_cost=self.max_cost)
+        alignment = aligner.align(*pair, max_cost=self.max_cost)
+        if alignment is None or self.result is None:
+            return alignment
+        return self.result(alignment)
+
+
+# the worker of the current process, set up by the pool initializer
+_worker = None
+
+
+def _init_worker(options):
+    global _worker
+    _worker = _Worker(**options)
+
+
+def _align_chunk(chunk: List) -> List:
+    return [_worker(pair) for pair in chunk]
+
+
+# the corpus of the current process, opened by the pool initializer of align_corpus
+_corpus = None
+
+
+def _init_corpus_worker(options, corpus: PairCorpus):
+    global _corpus
+    _corpus = corpus
+    _init_worker(dict(options, vocabulary=corpus.vocabulary))
+
+
+def _corpus_result(worker: _Worker, corpus: PairCorpus, idx: int):
+    pair = corpus[idx]
+    if worker.result is not None:
+        return worker(pair)
+    # the receiving side has the tokens already
+    alignment = worker.aligner(*pair).align(*pair, max_cost=worker.max_cost)
+    return None if alignment is None else (alignment._ops, alignment._costs)
+
+
+def _align_indices(indices: Sequence[int]) -> List:
+    return [_corpus_result(_worker, _corpus, idx) for idx in indices]
+
+
+def _chunks(pairs: Iterable, chunksize: int):
+    pairs = iter(pairs)
+    start = 0
+    while True:
+        chunk = list(islice(pairs, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def align_many(pairs: Iterable[Tuple[List, List]], workers: int = None, chunksize: int = 64, ordered: bool = True,
+               result: Union[str, Callable] = 'alignment', heap_size: int = 100, beam: int = 0,
+               scoring: str = 'levinshtein', recombine: bool = False, engine: str = 'auto',
+               anchors: bool = False, heuristic: str = None, max_pending: int = None,
+               cache: AlignmentCache = None, max_cost: float = None) -> Iterator:
+    """
+    Align many (source, target) pairs in a pool of worker processes.
+
+    Each worker builds its aligners once and reuses them for every pair it gets. Pairs are read lazily and at most
+    max_pending chunks are in flight at any time, so pairs can be streamed from a file larger than memory.
+
+    :param pairs: iterable of (source, target)
+    :param workers: number of worker processes (None -> one per CPU, 1 -> align in this process)
+    :param chunksize: pairs sent to a worker at once
+    :param ordered: yield results in input order; otherwise yield (index, result) as soon as they are done
+    :param result: what to send back for each pair: 'alignment', 'cost', 'wer', 'counts' for (cost, correct,
+        errors), or a module level function of the Alignment. Anything but 'alignment' keeps inter-process
+        traffic small, and 'cost' builds no alignments at all (see Aligner.distance).
+    :param heap_size: as in yasa.align
+    :param beam: as in yasa.align
+    :param scoring: as in yasa.align
+    :param recombine: as in yasa.align
+    :param engine: as in yasa.align
+    :param anchors: as in yasa.align
+    :param heuristic: as in yasa.align
+    :param max_pending: chunks in flight at once (None -> 2 per worker)
+    :param cache: look alignments up in (and store them to) this cache; every worker opens its own connection
+    :param max_cost: the result of a pair whose cost exceeds this is None, as in yasa.align
+    :return: iterator over the results
+    """
+    if isinstance(result, str) and result not in _RESULTS:
+        raise ValueError(u"Unknown result type: '{}'".format(result))
+    options = dict(heap_size=heap_size, beam=beam, scoring=scoring, recombine=recombine, engine=engine,
+                   anchors=anchors, heuristic=heuristic, result=result, cache=cache, max_cost=max_cost)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        worker = _Worker(**options)
+        for idx, pair in enumerate(pairs):
+            yield worker(pair) if ordered else (idx, worker(pair))
+        return
+
+    chunks = _chunks(pairs, chunksize)
+    for value in _pooled(_align_chunk, chunks, workers, max_pending, ordered, _init_worker, (options,)):
+        yield value
+
+
+def _pooled(function: Callable, chunks: Iterator[Tuple[int, List]], workers: int, max_pending: int, ordered: bool,
+            initializer: Callable, initargs: Tuple) -> Iterator:
+    """
+    Map function over chunks in a pool, with at most max_pending chunks in flight. Yields the values of the
+    chunks in order, or (index, value) as soon as a chunk is done.
+    """
+    max_pending = 2 * workers if max_pending is None else max(max_pending, 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for start, chunk in islice(chunks, max_pending):
+            pending.append((start, pool.submit(function, chunk)))
+
+        while pending:
+            if ordered:
+                start, future = pending.popleft()
+                results = future.result()
+                for value in results:
+                    yield value
+            else:
+                done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+                finished = [(start, future) for start, future in pending if future in done]
+                for entry in finished:
+                    pending.remove(entry)
+                for start, future in finished:
+                    for offset, value in enumerate(future.result()):
+                        yield start + offset, value
+
+            for start, chunk in islice(chunks, max_pending - len(pending)):
+                pending.append((start, pool.submit(function, chunk)))
+
+
+def align_corpus(corpus: PairCorpus, indices: Iterable[int] = None, workers: int = None, chunksize: int = 64,
+                 ordered: bool = True, result: Union[str, Callable] = 'alignment', heap_size: int = 100,
+                 beam: int = 0, scoring: str = 'levinshtein', recombine: bool = False, engine: str = 'auto',
+                 anchors: bool = False, heuristic: str = None, max_pending: int = None,
+                 cache: AlignmentCache = None, max_cost: float = None) -> Iterator:
+    """
+    Align the pairs of a memory mapped corpus in a pool of worker processes, like align_many.
+
+    Workers open the corpus themselves and are sent only pair indices; they align the mapped ids directly, with
+    the corpus vocabulary, and send back results (for 'alignment', just the op codes and costs). Nothing is
+    pickled per token either way.
+
+    :param corpus: corpus written by write_corpus
+    :param indices: pairs to align, in this order (None -> all of them)
+    :param workers: number of worker processes (None -> one per CPU, 1 -> align in this process)
+    :param chunksize: pairs sent to a worker at once
+    :param ordered: yield results in the order of indices; otherwise yield (position in indices, result) as soon as
+        they are done
+    :param result: as in align_many
+    :param heap_size: as in yasa.align
+    :param beam: as in yasa.align
+    :param scoring: as in yasa.align
+    :param recombine: as in yasa.align
+    :param engine: as in yasa.align
+    :param anchors: as in yasa.align
+    :param heuristic: as in yasa.align
+    :param max_pending: chunks in flight at once (None -> 2 per worker)
+    :param cache: as in align_many
+    :param max_cost: as in align_many
+    :return: iterator over the results
+    """
+    if isinstance(result, str) and result not in _RESULTS:
+        raise ValueError(u"Unknown result type: '{}'".format(result))
+    options = dict(heap_size=heap_size, beam=beam, scoring=scoring, recombine=recombine, engine=engine,
+                   anchors=anchors, heuristic=heuristic, result=result, cache=cache, max_cost=max_cost)
+    # indices are read twice: once to hand them out, once to know which pair each alignment is of
+    indices = range(len(corpus)) if indices is None else np.fromiter(indices, dtype=np.int64)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        worker = _Worker(vocabulary=corpus.vocabulary, **options)
+        values = (_corpus_result(worker, corpus, idx) for idx in indices)
+        if not ordered:
+            values = enumerate(values)
+    else:
+        values = _pooled(_align_indices, _chunks(indices, chunksize), workers, max_pending, ordered,
+                         _init_corpus_worker, (options, corpus))
+
+    if result != 'alignment':
+        for value in values:
+            yield value
+    elif ordered:
+        # alignments are rebuilt from their op codes and costs, over views of the corpus
+        for idx, value in zip(indices, values):
+            yield None if value is None else Alignment.from_ops(value[0], value[1], *corpus[idx])
+    else:
+        for position, value in values:
+            yield position, None if value is None else Alignment.from_ops(value[0], value[1],
+                                                                          *corpus[indices[position]])
@@ -0,0 +1,375 @@
+"""
+Persistent cache of alignments, keyed by the content of the pair and the configuration of the aligner
+"""
+__all__ = ['AlignmentCache', 'CachedAligner', 'fingerprint', ]
+
+import functools
+import hashlib
+import os
+import sqlite3
+import time
+import types
+import weakref
+import zlib
+from array import array
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from yasa.aligner import Alignment, _cost_limit
+from yasa.vocab import Vocabulary
+
+# bump when the stored format or the meaning of a key changes; old entries then simply miss
+_FORMAT = 1
+# attributes which never change a result: observers and lookup caches
+_SKIPPED = ('observer', '_translations')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alignments (
+    key TEXT PRIMARY KEY,
+    ops BLOB NOT NULL,
+    costs BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alignments_used ON alignments (used);
+"""
+
+
+def _feed(digest, obj, seen: set):
+    """Feed a stable description of obj to digest: the same configuration gives the same bytes in every process"""
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+        digest.update(repr(obj).encode('utf-8', 'surrogatepass'))
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'[')
+        for item in obj:
+            _feed(digest, item, seen)
+            digest.update(b',')
+        digest.update(b']')
+    elif isinstance(obj, dict):
+        digest.update(b'{')
+        for key, value in sorted(obj.items(), key=lambda item: repr(item[0])):
+            _feed(digest, key, seen)
+            digest.update(b':')
+            _feed(digest, value, seen)
+            digest.update(b',')
+        digest.update(b'}')
+    elif isinstance(obj, (set, frozenset)):
+        _feed(digest, sorted(obj, key=repr), seen)
+    elif isinstance(obj, np.ndarray):
+        digest.update('ndarray{}{}'.format(obj.dtype.str, obj.shape).encode())
+        digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, array):
+        digest.update('array{}'.format(obj.typecode).encode())
+        digest.update(obj.tobytes())
+    elif isinstance(obj, type):
+        digest.update('type {}.{}'.format(obj.__module__, obj.__qualname__).encode())
+    elif isinstance(obj, Vocabulary):
+        _feed(digest, obj.tokens, seen)
+    elif isinstance(obj, (weakref.WeakKeyDictionary, weakref.WeakValueDictionary)):
+        # lookup caches
+        return
+    elif isinstance(obj, functools._lru_cache_wrapper):
+        # e.g. the substitution of NestedLevinshteinScoring: what is cached, not the cache
+        _feed(digest, obj.__wrapped__, seen)
+    elif isinstance(obj, types.MethodType):
+        digest.update('method {}('.format(obj.__func__.__qualname__).encode())
+        # a method of an object being hashed already is covered by its class
+        if id(obj.__self__) not in seen:
+            _feed(digest, obj.__func__, seen)
+            _feed(digest, obj.__self__, seen)
+        digest.update(b')')
+    elif isinstance(obj, types.FunctionType):
+        _feed_function(digest, obj, seen)
+    elif isinstance(obj, functools.partial):
+        digest.update(b'partial(')
+        _feed(digest, [obj.func, obj.args, obj.keywords], seen)
+        digest.update(b')')
+    elif isinstance(obj, types.BuiltinFunctionType):
+        digest.update('builtin {}.{}'.format(getattr(obj, '__module__', None), obj.__qualname__).encode())
+    elif id(obj) in seen:
+        digest.update(b'<cycle>')
+    else:
+        seen.add(id(obj))
+        cls = type(obj)
+        digest.update('{}.{}('.format(cls.__module__, cls.__qualname__).encode())
+        state = getattr(obj, '__dict__', None)
+        if state is None:
+            text = repr(obj)
+            if ' at 0x' in text:
+                # the default repr: nothing to tell two of them apart by, and different in every process
+                raise TypeError("can't fingerprint {!r}".format(obj))
+            digest.update(text.encode('utf-8', 'surrogatepass'))
+        else:
+            # an aligner's vocabulary only interns tokens; a scorer's vocabulary says what its costs are for
+            is_aligner = hasattr(obj, 'align')
+            for name in sorted(state):
+                if name in _SKIPPED or (is_aligner and name == 'vocabulary'):
+                    continue
+                digest.update(name.encode())
+                digest.update(b'=')
+                _feed(digest, state[name], seen)
+                digest.update(b',')
+        digest.update(b')')
+
+
+def _feed_function(digest, function: types.FunctionType, seen: set):
+    """A function by where it is defined, its byte code and constants, and the values it closes over"""
+    digest.update('function {}.{}('.format(function.__module__, function.__qualname__).encode())
+    if id(function) in seen:
+        digest.update(b'<cycle>)')
+        return
+    seen.add(id(function))
+    _feed_code(digest, function.__code__)
+    _feed(digest, [function.__defaults__, function.__kwdefaults__], seen)
+    for cell in function.__closure__ or ():
+        try:
+            _feed(digest, cell.cell_contents, seen)
+        except ValueError:
+            # a cell which is not filled yet
+            digest.update(b'<empty>')
+        digest.update(b',')
+    digest.update(b')')
+
+
+def _feed_code(digest, code: types.CodeType):
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            # nested functions and lambdas
+            _feed_code(digest, const)
+        else:
+            digest.update(repr(const).encode('utf-8', 'surrogatepass'))
+        digest.update(b',')
+
+
+def fingerprint(obj) -> str:
+    """
+    Hash of the configuration of an aligner or scorer: its class and, recursively, its attributes. Functions count
+    with their byte code and the values they close over, so keys differ between python versions.
+
+    :raises TypeError: for an attribute which can only be told apart by its address
+
+    :rtype: str
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    _feed(digest, obj, set())
+    return digest.hexdigest()
+
+
+def _tokens_digest(digest, tokens: List):
+    digest.update(str(len(tokens)).encode())
+    digest.update(b'\x1d')
+    # repr escapes control characters, so the separator can't occur inside a token
+    digest.update('\x1e'.join(map(repr, tokens)).encode('utf-8', 'surrogatepass'))
+    digest.update(b'\x1d')
+
+
+class AlignmentCache(object):
+    # check the size bounds every this many puts of a process
+    EVICT_EVERY = 64
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30, max_entries: int = 0, timeout: float = 30.):
+        """
+        Alignments on disk, in an SQLite file which any number of processes can share. Entries hold the op codes
+        and accumulated costs of an alignment, compressed. Once the stored alignments take more than max_bytes (or
+        there are more than max_entries of them), the least recently used ones are evicted down to 90% of the
+        bound.
+
+        Use CachedAligner (or the cache argument of yasa.align and yasa.align_many) to put it in front of an
+        aligner.
+
+        :param path: SQLite file; created if missing
+        :param max_bytes: bound on the compressed size of the stored alignments (0 -> no bound)
+        :param max_entries: bound on the number of stored alignments (0 -> no bound)
+        :param timeout: seconds to wait for another process holding the lock
+        :type path: str
+        :type max_bytes: int
+        :type max_entries: int
+        :type timeout: float
+        :rtype: AlignmentCache
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+        self._puts = 0
+
+    def __getstate__(self):
+        # connections can't cross processes; each process opens its own
+        state = dict(self.__dict__)
+        state.update(_connection=None, _pid=None, _puts=0, hits=0, misses=0)
+        return state
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            # readers don't block the writer and the other way around
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM alignments').fetchone()[0]
+
+    def size_bytes(self) -> int:
+        """Compressed size of the stored alignments"""
+        return self._connect().execute('SELECT COALESCE(SUM(size), 0) FROM alignments').fetchone()[0]
+
+    def clear(self):
+        self._connect().execute('DELETE FROM alignments')
+
+    def get(self, key: str) -> Optional[Tuple[array, array]]:
+        """
+        (ops, costs) stored under key, or None.
+
+        :rtype: tuple
+        """
+        connection = self._connect()
+        row = connection.execute('SELECT ops, costs FROM alignments WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        connection.execute('UPDATE alignments SET used = ? WHERE key = ?', (time.time(), key))
+        ops = array('B', zlib.decompress(row[0]))
+        costs = array('d', zlib.decompress(row[1]))
+        return ops, costs
+
+    def put(self, key: str, alignment: Alignment):
+        """Store the op codes and costs of alignment under key"""
+        ops = zlib.compress(bytes(alignment._ops))
+        costs = zlib.compress(np.asarray(alignment._costs, dtype=np.float64).tobytes())
+        connection = self._connect()
+        connection.execute('INSERT OR REPLACE INTO alignments (key, ops, costs, size, used) VALUES (?, ?, ?, ?, ?)',
+                           (key, ops, costs, len(ops) + len(costs), time.time()))
+        if self._puts % self.EVICT_EVERY == 0:
+            self.evict()
+        self._puts += 1
+
+    def evict(self):
+        """Drop the least recently used alignments until the cache is within its bounds again"""
+        if not self.max_bytes and not self.max_entries:
+            return
+        connection = self._connect()
+        count, total = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM alignments').fetchone()
+        over_entries = self.max_entries and count > self.max_entries
+        over_bytes = self.max_bytes and total > self.max_bytes
+        if not over_entries and not over_bytes:
+            return
+
+        keep_entries = int(self.max_entries * 0.9) if self.max_entries else count
+        keep_bytes = int(self.max_bytes * 0.9) if self.max_bytes else total
+        evicted = []
+        cursor = connection.execute('SELECT key, size FROM alignments ORDER BY used')
+        for key, size in cursor:
+            if count <= keep_entries and total <= keep_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            total -= size
+        cursor.close()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('DELETE FROM alignments WHERE key = ?', evicted)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+
+class CachedAligner(object):
+    def __init__(self, aligner, cache: AlignmentCache):
+        """
+        Aligner which looks alignments up in cache before asking aligner, and stores what aligner finds.
+
+        Keys hash the source and target tokens (by repr) together with the fingerprint of aligner, i.e. its class,
+        scorer and settings such as heap_size and beam_width. The fingerprint is taken once, so don't change the
+        aligner while it is wrapped.
+
+        :param aligner: any aligner, e.g. an Aligner or an ExactAligner
+        :param cache: where the alignments are kept
+        :type cache: AlignmentCache
+        :rtype: CachedAligner
+        """
+        self.aligner = aligner
+        self.cache = cache
+        self._fingerprint = None
+
+    def __str__(self):
+        return "cached ({}), {}".format(self.cache.path, self.aligner)
+
+    def key(self, source: List, target: List) -> str:
+        """Cache key of aligning source with target"""
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint(self.aligner)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update('{}:{}:'.format(_FORMAT, self._fingerprint).encode())
+        _tokens_digest(digest, source)
+        _tokens_digest(digest, target)
+        return digest.hexdigest()
+
+    def align(self, source: List, target: List, max_cost: float = None) -> Optional[Alignment]:
+        """
+        The cached alignment of source and target, or a new one.
+
+        With max_cost, a cached alignment costing more gives None, and on a miss the aligner is called with the
+        cutoff. What it finds then isn't stored: a pruned search needn't find what an unbounded one would.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of an alignment costing more than this
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: Alignment
+        """
+        # the wrapped aligner allows for rounding itself, so it gets max_cost as given
+        limit = _cost_limit(max_cost)
+        key = self.key(source, target)
+        cached = self.cache.get(key)
+        if cached is not None:
+            if limit is not None and len(cached[1]) and cached[1][-1] > limit:
+                return None
+            return Alignment.from_ops(cached[0], cached[1], source, target)
+        if max_cost is not None:
+            return self.aligner.align(source, target, max_cost)
+        alignment = self.aligner.align(source, target)
+        self.cache.put(key, alignment)
+        return alignment
+
+    def distance(self, source: List, target: List, max_cost: float = None) -> Optional[float]:
+        """
+        Cost of the cached alignment of source and target. On a miss the pair is aligned (not just measured) so the
+        alignment can be stored, and later calls of align hit as well; with max_cost only measured.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of a cost above this, as in align
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: float
+        """
+        if max_cost is None:
+            return self.align(source, target).cost
+        limit = _cost_limit(max_cost)
+        key = self.key(source, target)
+        cached = self.cache.get(key)
+        if cached is not None:
+            cost = cached[1][-1] if len(cached[1]) else 0.
+            return None if cost > limit else cost
+        return self.aligner.distance(source, target, max_cost)
@@ -0,0 +1,296 @@
+"""
+Score a hypothesis corpus against a reference corpus.
+
+    yasa-score ref.txt hyp.txt --utterances per_utt.tsv --summary summary.json
+    python -m yasa ref.jsonl hyp.jsonl --workers 8 --confusions 50
+
+Corpora are text files with one utterance per line, its id first and its tokens after it (as in Kaldi's text
+files), or JSONL with an id and a text field; the text is split on whitespace unless it already is a list of tokens.
+Both corpora are streamed: reference utterances are aligned in a pool of workers with a bounded number of pairs in
+flight, and only the ids and byte offsets of the hypotheses are held in memory, or nothing at all with --sorted.
+"""
+__all__ = ['main', 'read_corpus', 'IndexedJoin', 'SortedJoin', 'score_corpus', 'utterance_result', ]
+
+import argparse
+import json
+from collections import Counter, deque
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from yasa.batch import align_many
+from yasa.cache import AlignmentCache
+from yasa.summary import ConfusionCounter, WordErrorRate
+
+FORMATS = ('auto', 'text', 'jsonl')
+
+
+def _format_of(path: str, fmt: str) -> str:
+    if fmt != 'auto':
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.json')) else 'text'
+
+
+def _parse(line: str, fmt: str, id_field: str, text_field: str) -> Optional[Tuple[str, List[str]]]:
+    """(id, tokens) of one line, or None for a blank one"""
+    if fmt == 'jsonl':
+        if not line.strip():
+            return None
+        record = json.loads(line)
+        text = record[text_field]
+        return str(record[id_field]), list(text) if isinstance(text, list) else text.split()
+    fields = line.split(None, 1)
+    if not fields:
+        return None
+    return fields[0], fields[1].split() if len(fields) > 1 else []
+
+
+def read_corpus(path: str, fmt: str = 'auto', id_field: str = 'id',
+                text_field: str = 'text') -> Iterator[Tuple[str, List[str]]]:
+    """
+    Stream the (utterance id, tokens) of a corpus file.
+
+    :param path: text file of 'id token token ...' lines, or JSONL
+    :param fmt: 'text', 'jsonl', or 'auto' to go by the extension (.jsonl and .json are JSONL)
+    :param id_field: JSONL field holding the utterance id
+    :param text_field: JSONL field holding the text, a string or a list of tokens
+    :rtype: iterator
+    """
+    fmt = _format_of(path, fmt)
+    with open(path, encoding='utf-8') as ifp:
+        for line in ifp:
+            record = _parse(line, fmt, id_field, text_field)
+            if record is not None:
+                yield record
+
+
+class _Joined(object):
+    """
+    Iterable of (id, reference tokens, hypothesis tokens or None) for every reference utterance. Once iterated,
+    missing counts the references without a hypothesis and extra the hypotheses without a reference.
+    """
+
+    def __init__(self):
+        self.missing = 0
+        self.extra = 0
+
+
+class IndexedJoin(_Joined):
+    def __init__(self, references: Iterable[Tuple[str, List[str]]], hyp_path: str, fmt: str = 'auto',
+                 id_field: str = 'id', text_field: str = 'text'):
+        """
+        Pair every reference utterance with the hypothesis of the same id, in any order. The hypothesis file is
+        indexed first, keeping the byte offset of each id, and each hypothesis is read back when its reference
+        comes along.
+
+        :param references: (id, tokens) of the reference utterances, e.g. read_corpus(ref_path)
+        :param hyp_path: hypothesis corpus
+        :rtype: IndexedJoin
+        """
+        super(IndexedJoin, self).__init__()
+        self.references = references
+        self.hyp_path = hyp_path
+        self.fmt = _format_of(hyp_path, fmt)
+        self.id_field = id_field
+        self.text_field = text_field
+
+    def _index(self, ifp) -> Dict[str, int]:
+        offsets = dict()
+        offset = 0
+        for line in ifp:
+            record = _parse(line.decode('utf-8'), self.fmt, self.id_field, self.text_field)
+            if record is not None:
+                offsets[record[0]] = offset
+            offset += len(line)
+        return offsets
+
+    def __iter__(self):
+        with open(self.hyp_path, 'rb') as ifp:
+            offsets = self._index(ifp)
+            for utt_id, reference in self.references:
+                offset = offsets.pop(utt_id, None)
+                if offset is None:
+                    self.missing += 1
+                    yield utt_id, reference, None
+                    continue
+                ifp.seek(offset)
+                line = ifp.readline().decode('utf-8')
+                yield utt_id, reference, _parse(line, self.fmt, self.id_field, self.text_field)[1]
+            self.extra = len(offsets)
+
+
+class SortedJoin(_Joined):
+    def __init__(self, references: Iterable[Tuple[str, List[str]]], hypotheses: Iterable[Tuple[str, List[str]]]):
+        """
+        Pair every reference utterance with the hypothesis of the same id by merging, in constant memory. Both
+        corpora must be sorted by id (as by `sort -k1,1` with LC_ALL=C).
+
+        :param references: (id, tokens) of the reference utterances
+        :param hypotheses: (id, tokens) of the hypotheses
+        :raises ValueError: when the ids of either corpus are out of order
+        :rtype: SortedJoin
+        """
+        super(SortedJoin, self).__init__()
+        self.references = references
+        self.hypotheses = hypotheses
+
+    @staticmethod
+    def _checked(records: Iterable, name: str) -> Iterator:
+        previous = None
+        for record in records:
+            if previous is not None and record[0] <= previous:
+                raise ValueError(u"{} ids are not sorted: '{}' after '{}'".format(name, record[0], previous))
+            previous = record[0]
+            yield record
+
+    def __iter__(self):
+        hypotheses = self._checked(self.hypotheses, 'hypothesis')
+        hypothesis = next(hypotheses, None)
+        for utt_id, reference in self._checked(self.references, 'reference'):
+            while hypothesis is not None and hypothesis[0] < utt_id:
+                self.extra += 1
+                hypothesis = next(hypotheses, None)
+            if hypothesis is not None and hypothesis[0] == utt_id:
+                yield utt_id, reference, hypothesis[1]
+                hypothesis = next(hypotheses, None)
+            else:
+                self.missing += 1
+                yield utt_id, reference, None
+        while hypothesis is not None:
+            self.extra += 1
+            hypothesis = next(hypotheses, None)
+
+
+def utterance_result(alignment) -> Tuple[float, int, int, int, int, Counter]:
+    """(cost, correct, substitutions, insertions, deletions, confusions) of one alignment, as workers send it back"""
+    confusions = ConfusionCounter()
+    confusions.accu_alignment(alignment)
+    return (alignment.cost, alignment.correct_n(), alignment.substitutions_n(), alignment.insertions_n(),
+            alignment.deletions_n(), confusions.counts)
+
+
+def _utterance_row(utt_id: str, result: Tuple, missing: bool) -> Dict:
+    cost, correct, substitutions, insertions, deletions, _ = result
+    errors = substitutions + insertions + deletions
+    return dict(id=utt_id, cost=cost, correct=correct, substitutions=substitutions, insertions=insertions,
+                deletions=deletions, wer=errors / (correct + errors) if correct + errors else None, missing=missing)
+
+
+_TSV_COLUMNS = ('id', 'cost', 'correct', 'substitutions', 'insertions', 'deletions', 'wer', 'missing')
+
+
+def _write_row(ofp: TextIO, row: Dict, fmt: str):
+    if fmt == 'jsonl':
+        ofp.write(json.dumps(row, ensure_ascii=False))
+    else:
+        ofp.write('\t'.join('' if row[name] is None else str(row[name]) for name in _TSV_COLUMNS))
+    ofp.write('\n')
+
+
+def score_corpus(joined: Iterable[Tuple[str, List[str], Optional[List[str]]]], utterances: TextIO = None,
+                 utterances_format: str = 'tsv', **align_options) -> Tuple[WordErrorRate, ConfusionCounter, int]:
+    """
+    Align every (id, reference, hypothesis) with align_many and add the results up. A missing hypothesis (None) is
+    scored as an empty one.
+
+    :param joined: e.g. IndexedJoin or SortedJoin
+    :param utterances: where to write a line per utterance (None -> nowhere)
+    :param utterances_format: 'tsv' or 'jsonl'
+    :param align_options: passed to align_many, e.g. workers, chunksize, max_pending, engine, cache
+    :return: corpus WER, confusions, and the number of utterances
+    :rtype: tuple
+    """
+    word_error_rate = WordErrorRate()
+    confusions = ConfusionCounter()
+    # ids (and whether the hypothesis was missing) of the pairs align_many has taken but not answered yet; bounded
+    # by the pairs in flight
+    in_flight = deque()
+
+    def pairs():
+        for utt_id, reference, hypothesis in joined:
+            in_flight.append((utt_id, hypothesis is None))
+            yield reference, hypothesis if hypothesis is not None else []
+
+    if utterances is not None and utterances_format == 'tsv':
+        utterances.write('\t'.join(_TSV_COLUMNS) + '\n')
+    count = 0
+    for result in align_many(pairs(), ordered=True, result=utterance_result, **align_options):
+        utt_id, missing = in_flight.popleft()
+        correct, errors = result[1], sum(result[2:5])
+        word_error_rate.accu_counts(correct, errors)
+        confusions.counts.update(result[5])
+        count += 1
+        if utterances is not None:
+            _write_row(utterances, _utterance_row(utt_id, result, missing), utterances_format)
+    return word_error_rate, confusions, count
+
+
+def _summary(word_error_rate: WordErrorRate, confusions: ConfusionCounter, utterances: int, joined: _Joined,
+             top: int) -> Dict:
+    total = word_error_rate.correct + word_error_rate.incorrect
+    return dict(utterances=utterances, missing=joined.missing, extra=joined.extra,
+                wer=word_error_rate.wer if total else None, correct=word_error_rate.correct,
+                incorrect=word_error_rate.incorrect, types=dict(confusions.type_counts()),
+                confusions=[dict(type=align_type, source=source, target=target, count=count)
+                            for (align_type, source, target), count in confusions.most_common(top)])
+
+
+def format_summary(summary: Dict) -> str:
+    lines = ["utterances: {utterances}, missing hypotheses: {missing}, extra hypotheses: {extra}".format(**summary)]
+    if summary['wer'] is None:
+        lines.append("WER: - Correct: 0 Incorrect: 0")
+    else:
+        lines.append("WER: {wer:.5f} Correct: {correct} Incorrect: {incorrect}".format(**summary))
+    lines.append(', '.join("{}: {}".format(align_type, count) for align_type, count in summary['types'].items()))
+    if summary['confusions']:
+        lines.append(u"{:<10}{:<30}{:<30}{:>10}".format('Type', 'Source', 'Target', 'Count'))
+        for confusion in summary['confusions']:
+            lines.append(u"{:<10}{:<30}{:<30}{:>10}".format(confusion['type'], str(confusion['source']),
+                                                            str(confusion['target']), confusion['count']))
+    return '\n'.join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='yasa-score', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('ref', help="reference corpus")
+    parser.add_argument('hyp', help="hypothesis corpus")
+    parser.add_argument('--format', choices=FORMATS, default='auto', help="format of both corpora")
+    parser.add_argument('--id-field', default='id', help="JSONL field of the utterance id")
+    parser.add_argument('--text-field', default='text', help="JSONL field of the text")
+    parser.add_argument('--sorted', action='store_true',
+                        help="both corpora are sorted by id: merge them instead of indexing the hypotheses")
+    parser.add_argument('--utterances', help="file to write a line per utterance to (.jsonl for JSONL, else TSV)")
+    parser.add_argument('--summary', help="JSON file to write the corpus summary to")
+    parser.add_argument('--confusions', type=int, default=20, help="number of most frequent confusions to report")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunksize', type=int, default=64, help="utterances sent to a worker at once")
+    parser.add_argument('--max-pending', type=int, default=None, help="chunks in flight (default: 2 per worker)")
+    parser.add_argument('--engine', default='auto', choices=('auto', 'beam', 'exact', 'banded', 'hirschberg'))
+    parser.add_argument('--scoring', default='levinshtein', choices=('levinshtein', 'nested'))
+    parser.add_argument('--heap-size', type=int, default=100)
+    parser.add_argument('--beam', type=int, default=0)
+    parser.add_argument('--anchors', action='store_true')
+    parser.add_argument('--cache', help="SQLite alignment cache to use")
+    args = parser.parse_args(argv)
+
+    options = dict(id_field=args.id_field, text_field=args.text_field)
+    references = read_corpus(args.ref, args.format, **options)
+    if args.sorted:
+        joined = SortedJoin(references, read_corpus(args.hyp, args.format, **options))
+    else:
+        joined = IndexedJoin(references, args.hyp, args.format, **options)
+    align_options = dict(workers=args.workers, chunksize=args.chunksize, max_pending=args.max_pending,
+                         engine=args.engine, scoring=args.scoring, heap_size=args.heap_size, beam=args.beam,
+                         anchors=args.anchors, cache=AlignmentCache(args.cache) if args.cache else None)
+
+    if args.utterances:
+        with open(args.utterances, 'w', encoding='utf-8') as ofp:
+            fmt = 'jsonl' if args.utterances.endswith('.jsonl') else 'tsv'
+            results = score_corpus(joined, ofp, fmt, **align_options)
+    else:
+        results = score_corpus(joined, **align_options)
+
+    summary = _summary(*results, joined, args.confusions)
+    print(format_summary(summary))
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as ofp:
+            json.dump(summary, ofp, indent=1, ensure_ascii=False)
+    return 0
@@ -0,0 +1,163 @@
+"""
+Memory mapped corpora of (source, target) pairs of token ids
+"""
+__all__ = ['EncodedCorpus', 'PairCorpus', 'write_corpus', ]
+
+import os
+from array import array
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from yasa.vocab import EncodedTokens, Vocabulary
+
+VOCABULARY_FILE = 'vocab.jsonl'
+SIDES = ('source', 'target')
+# little endian on disk, whatever the machine
+_ID_DTYPE = np.dtype('<i4')
+_OFFSET_DTYPE = np.dtype('<i8')
+# pairs whose offsets are buffered before they are written
+_FLUSH_EVERY = 1 << 16
+
+
+def _map(path: str, dtype: np.dtype) -> np.ndarray:
+    """Read-only memory map of a whole file, as a plain ndarray (slices of a np.memmap are slow to index)"""
+    if os.path.getsize(path) == 0:
+        # numpy can't map an empty file
+        return np.zeros(0, dtype=dtype)
+    return np.asarray(np.memmap(path, dtype=dtype, mode='r'))
+
+
+class EncodedCorpus(object):
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray, vocabulary: Vocabulary):
+        """
+        Sequences of token ids stored back to back: sequence i is ids[offsets[i]:offsets[i + 1]].
+
+        :param ids: concatenated token ids
+        :param offsets: start of every sequence in ids, and the end of the last one
+        :param vocabulary: vocabulary of the ids
+        :type ids: np.ndarray
+        :type offsets: np.ndarray
+        :type vocabulary: Vocabulary
+        :rtype: EncodedCorpus
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def open(cls, path: str, name: str, vocabulary: Vocabulary) -> 'EncodedCorpus':
+        """Map the files name.ids and name.offsets of directory path"""
+        return cls(_map(os.path.join(path, name + '.ids'), _ID_DTYPE),
+                   _map(os.path.join(path, name + '.offsets'), _OFFSET_DTYPE), vocabulary)
+
+    def __len__(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def __getitem__(self, idx: int) -> EncodedTokens:
+        """Sequence idx as a view of the ids, without copying them"""
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return EncodedTokens(self.ids[self.offsets[idx]:self.offsets[idx + 1]], self.vocabulary)
+
+    def __iter__(self) -> Iterator[EncodedTokens]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def lengths(self) -> np.ndarray:
+        """Length of every sequence"""
+        return np.diff(self.offsets)
+
+
+class PairCorpus(object):
+    def __init__(self, path: str):
+        """
+        Corpus of (source, target) pairs written by write_corpus, read through numpy memory maps: opening it reads
+        only the vocabulary, and each pair is a view of the mapped ids, so processes which open the same corpus
+        share its pages and nothing is copied or unpickled.
+
+        The directory holds vocab.jsonl (one token per line, ordered by id) and, for each of source and target, the
+        int32 ids of all sequences back to back (.ids) and the int64 offset of each sequence (.offsets, one more
+        than the number of pairs).
+
+        :param path: directory of the corpus
+        :type path: str
+        :rtype: PairCorpus
+        """
+        self.path = path
+        self.vocabulary = Vocabulary.load(os.path.join(path, VOCABULARY_FILE))
+        self.source = EncodedCorpus.open(path, 'source', self.vocabulary)
+        self.target = EncodedCorpus.open(path, 'target', self.vocabulary)
+        if len(self.source) != len(self.target):
+            raise ValueError("{} source and {} target sequences in {}".format(len(self.source), len(self.target),
+                                                                              path))
+
+    def __getstate__(self):
+        # the maps are opened again on the other side
+        return dict(path=self.path)
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, idx: int) -> Tuple[EncodedTokens, EncodedTokens]:
+        return self.source[idx], self.target[idx]
+
+    def __iter__(self) -> Iterator[Tuple[EncodedTokens, EncodedTokens]]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class _SideWriter(object):
+    """Appends the ids and offsets of the sequences of one side of a corpus to its files"""
+
+    def __init__(self, path: str, name: str):
+        self.ids = open(os.path.join(path, name + '.ids'), 'wb')
+        self.offsets = open(os.path.join(path, name + '.offsets'), 'wb')
+        self.end = 0
+        self.pending = array('q', [0])
+
+    def write(self, ids: np.ndarray):
+        self.ids.write(np.asarray(ids, dtype=_ID_DTYPE).tobytes())
+        self.end += len(ids)
+        self.pending.append(self.end)
+        if len(self.pending) >= _FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        self.offsets.write(np.frombuffer(self.pending, dtype=np.int64).astype(_OFFSET_DTYPE).tobytes())
+        self.pending = array('q')
+
+    def close(self):
+        self.flush()
+        self.ids.close()
+        self.offsets.close()
+
+
+def write_corpus(path: str, pairs: Iterable[Tuple[List, List]], vocabulary: Vocabulary = None) -> PairCorpus:
+    """
+    Convert (source, target) token lists to a PairCorpus, streaming: only the vocabulary is kept in memory.
+
+    :param path: directory to write to; created if missing, and existing corpus files are overwritten
+    :param pairs: iterable of (source, target)
+    :param vocabulary: vocabulary to encode with, e.g. that of a scoring; it grows with every new token
+    :type path: str
+    :type vocabulary: Vocabulary
+    :rtype: PairCorpus
+    """
+    vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+    os.makedirs(path, exist_ok=True)
+    writers = [_SideWriter(path, name) for name in SIDES]
+    try:
+        for pair in pairs:
+            for writer, tokens in zip(writers, pair):
+                writer.write(vocabulary.encode(tokens))
+    finally:
+        for writer in writers:
+            writer.close()
+    vocabulary.save(os.path.join(path, VOCABULARY_FILE))
+    return PairCorpus(path)
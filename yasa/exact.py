@@ -0,0 +1,612 @@
+"""
+Exact (dynamic programming) aligners
+"""
+from __future__ import division
+
+__all__ = ['ExactAligner', 'BandedAligner', 'HirschbergAligner', ]
+
+from array import array
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from yasa.aligner import Alignment, _MATCH, _SUB, _INS, _DEL, _cost_limit
+from yasa.scoring import Scoring
+from yasa.vocab import Vocabulary
+
+# 2-bit traceback codes
+_DIAG, _ROW_GAP, _COL_GAP = 0, 1, 2
+# rows of substitution costs kept per _Costs for scorers which are not vectorized, of the longer sequence
+_ROW_CACHE_SIZE = 256
+# cells of substitution costs HirschbergAligner keeps, per token of the two sequences
+_HIRSCHBERG_CACHE_CELLS = 16
+
+
+class _Costs(object):
+    """
+    Operation costs of one (source, target) pair as NumPy vectors, asked from the scorer in bulk.
+
+    Vectorized scorings (FixedScoring, MatrixScoring) are asked for every row of the diagonal; any other Scoring is
+    asked once per token (and once per distinct token pair for the diagonal), so the DP itself never calls back into
+    python per cell. Those rows of pair costs are cached per token, for at most cache_cells cells in all: whole rows
+    which are sliced as asked, or with whole_rows=False only the slices asked for, for callers which ask for the same
+    narrow slice again and again.
+    """
+
+    def __init__(self, scorer: Scoring, source: List, target: List, vocabulary: Vocabulary, cache_cells: int = None,
+                 whole_rows: bool = True):
+        self.scorer = scorer
+        self.source = source
+        self.target = target
+        self.source_ids = vocabulary.encode(source)
+        self.target_ids = vocabulary.encode(target)
+        self.vocabulary = vocabulary
+        self._vectorized = scorer.vectorized
+
+        self.del_costs = scorer.deletions(self.source_ids, vocabulary)
+        self.ins_costs = scorer.insertions(self.target_ids, vocabulary)
+        if cache_cells is None:
+            cache_cells = _ROW_CACHE_SIZE * max(len(source), len(target))
+        self.cache_cells = cache_cells
+        self.whole_rows = whole_rows
+        self._cache = dict()
+        self._cached_cells = 0
+
+    def pair(self, source_x: int, target_x: int) -> float:
+        """Match or substitution cost of source[source_x] and target[target_x]"""
+        source_token = self.source[source_x]
+        if self.source_ids[source_x] == self.target_ids[target_x]:
+            return self.scorer.match(source_token)
+        return self.scorer.substitution(source_token, self.target[target_x])
+
+    def _pairs(self, key: tuple, costs: Callable[[int, int], np.ndarray], size: int, start: int,
+               stop: int) -> np.ndarray:
+        """costs(start, stop) through the cache, of a row or column of size cells in all"""
+        if self.whole_rows and size <= self.cache_cells:
+            key, first, last = key, 0, size
+        else:
+            key, first, last = key + (start, stop), start, stop
+        found = self._cache.get(key)
+        if found is None:
+            found = costs(first, last)
+            if len(found) <= self.cache_cells:
+                if self._cached_cells + len(found) > self.cache_cells:
+                    self._cache.clear()
+                    self._cached_cells = 0
+                self._cache[key] = found
+                self._cached_cells += len(found)
+        return found[start - first:stop - first]
+
+    def diag_row(self, source_x: int, start: int, stop: int) -> np.ndarray:
+        """Match or substitution costs of source[source_x] against target[start:stop]"""
+        source_id = self.source_ids[source_x]
+        if self._vectorized:
+            return self.scorer.pairs(source_id, self.target_ids[start:stop], self.vocabulary)
+        return self._pairs(('row', source_id), lambda first, last: np.fromiter(
+            (self.pair(source_x, target_x) for target_x in range(first, last)), dtype=np.float64,
+            count=last - first), len(self.target), start, stop)
+
+    def diag_col(self, target_x: int, start: int, stop: int) -> np.ndarray:
+        """Match or substitution costs of source[start:stop] against target[target_x]"""
+        target_id = self.target_ids[target_x]
+        if self._vectorized:
+            return self.scorer.pairs(self.source_ids[start:stop], target_id, self.vocabulary)
+        return self._pairs(('col', target_id), lambda first, last: np.fromiter(
+            (self.pair(source_x, target_x) for source_x in range(first, last)), dtype=np.float64,
+            count=last - first), len(self.source), start, stop)
+
+    def min_diag(self):
+        """Lower bound on any match or substitution cost, or None when it is not known up front"""
+        return self.scorer.min_pair_cost()
+
+
+def _pack(codes: np.ndarray) -> np.ndarray:
+    """Pack 2-bit codes four to a byte"""
+    pad = (-len(codes)) % 4
+    if pad:
+        codes = np.concatenate((codes, np.zeros(pad, dtype=np.uint8)))
+    codes = codes.reshape(-1, 4)
+    return codes[:, 0] | (codes[:, 1] << 2) | (codes[:, 2] << 4) | (codes[:, 3] << 6)
+
+
+def _fill(row_gaps: np.ndarray, col_gaps: np.ndarray, diag, lo: int = None, hi: int = None, trace: bool = True,
+          max_cost: float = None):
+    """
+    Fill the DP table one row at a time, optionally restricted to a diagonal band.
+
+    Cells are D[i, j] = cost of aligning the first i row tokens with the first j column tokens. Within a row, the
+    diagonal and vertical moves are plain vector ops; the horizontal (column gap) moves form a running minimum,
+    D[i, j] = C[j] + min_{k <= j} (E[k] - C[k]) with C the prefix sums of the column gap costs, which is a single
+    np.minimum.accumulate.
+
+    Only cells with lo <= j - i <= hi are computed; the band must contain both the 0 and the m - n diagonals. For a
+    band, the cheapest way out of it is tracked as well: a path which first leaves the band costs at least the DP value
+    of the boundary cell it leaves from, plus the step out, plus the gaps it needs to get back to the final diagonal.
+    That bound is only valid when no operation has a negative cost.
+
+    :param row_gaps: cost of consuming each row token against nothing
+    :param col_gaps: cost of consuming each column token against nothing
+    :param diag: diag(i, start, stop) -> costs of pairing row token i with column tokens start..stop-1
+    :param lo: lowest diagonal (j - i) of the band, defaults to -n
+    :param hi: highest diagonal (j - i) of the band, defaults to m
+    :param trace: keep the traceback codes; without them only one row of the table is ever in memory
+    :param max_cost: give up once every cell of a row costs more than this; every path crosses every row, so none
+        can end up cheaper. Also only valid without negative costs.
+    :return: (final cost, packed traceback codes with one row per DP row or None, lower bound for leaving the band);
+        the cost is inf and there is no traceback when the fill gave up
+    """
+    n, m = len(row_gaps), len(col_gaps)
+    min_row_gap = row_gaps.min() if n else 0.
+    min_col_gap = col_gaps.min() if m else 0.
+
+    def remaining(i, j):
+        # cheapest gaps needed to get from (i, j) to the final diagonal
+        excess = (m - j) - (n - i)
+        return excess * min_col_gap if excess > 0 else -excess * min_row_gap
+
+    exit_bound = np.inf
+    lo = -n if lo is None else max(lo, -n)
+    hi = m if hi is None else min(hi, m)
+    col_prefix = np.concatenate(([0.], np.cumsum(col_gaps)))
+    width = min(m + 1, hi - lo + 1)
+    traceback = np.zeros((n + 1, (width + 3) // 4), dtype=np.uint8) if trace else None
+
+    start, stop = 0, min(m, hi)
+    current = col_prefix[:stop + 1].copy()
+    if trace:
+        codes = np.full(len(current), _COL_GAP, dtype=np.uint8)
+        traceback[0, :(len(codes) + 3) // 4] = _pack(codes)
+    if stop == hi < m:
+        exit_bound = current[-1] + col_gaps[stop] + remaining(0, stop + 1)
+    if lo == 0 < n:
+        exit_bound = min(exit_bound, current[0] + row_gaps[0] + remaining(1, 0))
+
+    for i in range(n):
+        previous, prev_start, prev_stop = current, start, stop
+        start, stop = max(0, i + 1 + lo), min(m, i + 1 + hi)
+
+        # previous row over columns start - 1 .. stop, infinite outside of its window
+        window = np.full(stop - start + 2, np.inf)
+        first, last = max(start - 1, prev_start), min(stop, prev_stop)
+        window[first - start + 1:last - start + 2] = previous[first - prev_start:last - prev_start + 1]
+
+        current = window[1:] + row_gaps[i]
+        diag_start = max(start, 1)
+        diagonal = window[diag_start - start:-1] + diag(i, diag_start - 1, stop)
+        prefix = col_prefix[start:stop + 1]
+        if trace:
+            codes = np.full(len(current), _ROW_GAP, dtype=np.uint8)
+            take_diag = diagonal <= current[diag_start - start:]
+            current[diag_start - start:][take_diag] = diagonal[take_diag]
+            codes[diag_start - start:][take_diag] = _DIAG
+
+            shifted = current - prefix
+            running = np.minimum.accumulate(shifted)
+            take_gap = running < shifted
+            current[take_gap] = running[take_gap] + prefix[take_gap]
+            codes[take_gap] = _COL_GAP
+
+            traceback[i + 1, :(len(codes) + 3) // 4] = _pack(codes)
+        else:
+            np.minimum(current[diag_start - start:], diagonal, out=current[diag_start - start:])
+            shifted = current - prefix
+            running = np.minimum.accumulate(shifted)
+            current = np.where(running < shifted, running + prefix, current)
+
+        if stop == i + 1 + hi < m:
+            exit_bound = min(exit_bound, current[-1] + col_gaps[stop] + remaining(i + 1, stop + 1))
+        if start == i + 1 + lo and i + 1 < n:
+            exit_bound = min(exit_bound, current[0] + row_gaps[i + 1] + remaining(i + 2, start))
+
+        if max_cost is not None and current.min() > max_cost:
+            # paths which leave the band later cross this row first; exit_bound covers those which left already
+            return np.inf, None, exit_bound
+
+    return current[m - start], traceback, exit_bound
+
+
+def _last_row(row_gaps: np.ndarray, col_gaps: np.ndarray, diag) -> np.ndarray:
+    """
+    Cost-only version of _fill which keeps a single row in memory.
+
+    :param diag: diag(i) -> costs of pairing row token i with every column token
+    :return: the last row of the DP table
+    """
+    col_prefix = np.concatenate(([0.], np.cumsum(col_gaps)))
+    current = col_prefix.copy()
+    for i in range(len(row_gaps)):
+        previous = current
+        current = previous + row_gaps[i]
+        np.minimum(current[1:], previous[:-1] + diag(i), out=current[1:])
+        current = np.minimum(current, np.minimum.accumulate(current - col_prefix) + col_prefix)
+    return current
+
+
+def _hirschberg(row_gaps: np.ndarray, col_gaps: np.ndarray, diag, cutoff: int) -> List[int]:
+    """
+    Hirschberg's divide and conquer: find the column where an optimal path crosses the middle row from a forward and
+    a backward cost-only pass, then solve both halves independently. Sub-problems of at most cutoff cells are
+    handed to the full table solver.
+
+    :param diag: diag(i, start, stop) -> costs of pairing row token i with column tokens start..stop-1
+    :return: the codes of the optimal path, in alignment order
+    """
+    path = []
+    # explicit stack of (row_start, row_stop, col_start, col_stop), right half pushed first
+    stack = [(0, len(row_gaps), 0, len(col_gaps))]
+    while stack:
+        r0, r1, c0, c1 = stack.pop()
+        if (r1 - r0) * (c1 - c0) <= cutoff or r1 - r0 <= 1:
+            _, traceback, _ = _fill(row_gaps[r0:r1], col_gaps[c0:c1],
+                                    lambda i, start, stop: diag(r0 + i, c0 + start, c0 + stop))
+            path.extend(_trace(traceback, r1 - r0, c1 - c0))
+            continue
+
+        mid = (r0 + r1) // 2
+        forward = _last_row(row_gaps[r0:mid], col_gaps[c0:c1], lambda i: diag(r0 + i, c0, c1))
+        backward = _last_row(row_gaps[mid:r1][::-1], col_gaps[c0:c1][::-1], lambda i: diag(r1 - 1 - i, c0, c1)[::-1])
+        split = c0 + int(np.argmin(forward + backward[::-1]))
+        stack.append((mid, r1, split, c1))
+        stack.append((r0, mid, c0, split))
+    return path
+
+
+def _trace(traceback: np.ndarray, n: int, m: int, lo: int = None) -> List[int]:
+    """
+    Walk the packed traceback codes from (n, m) back to the origin.
+
+    :param lo: lowest diagonal of the band the table was filled with
+    :return: the codes of the path, in alignment order
+    """
+    lo = -n if lo is None else max(lo, -n)
+    path = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i == 0:
+            code = _COL_GAP
+        elif j == 0:
+            code = _ROW_GAP
+        else:
+            x = j - max(0, i + lo)
+            code = (int(traceback[i, x >> 2]) >> ((x & 3) << 1)) & 3
+        path.append(code)
+        if code != _COL_GAP:
+            i -= 1
+        if code != _ROW_GAP:
+            j -= 1
+    path.reverse()
+    return path
+
+
+def _alignment_from_path(path: List[int], costs: _Costs, transposed: bool) -> Alignment:
+    """
+    Turn a DP path into an Alignment, accumulating the cost of each op along the way.
+
+    The costs are added up exactly as _fill adds them: a run of column gaps from column k to column j costs
+    (D[k] - C[k]) + C[j], with C the prefix sums of the column gap costs, rather than one gap at a time. Float
+    sums depend on their order, and this way the cost of the alignment is the DP cell to the last bit, so align
+    and distance agree.
+    """
+    ops = array('B')
+    accumulated = array('d')
+    source_x = target_x = -1
+    total = 0.
+    source_gap, target_gap = (_COL_GAP, _ROW_GAP) if transposed else (_ROW_GAP, _COL_GAP)
+    col_prefix = np.concatenate(([0.], np.cumsum(costs.del_costs if transposed else costs.ins_costs))).tolist()
+    run_base = None
+    source_ids, target_ids = costs.source_ids, costs.target_ids
+    for code in path:
+        if code == _COL_GAP and run_base is None:
+            # DP value less the prefix sum at the column the run starts from
+            run_base = total - col_prefix[(source_x if transposed else target_x) + 1]
+        elif code != _COL_GAP:
+            run_base = None
+
+        if code == _DIAG:
+            source_x += 1
+            target_x += 1
+            ops.append(_MATCH if source_ids[source_x] == target_ids[target_x] else _SUB)
+            total += costs.pair(source_x, target_x)
+        elif code == source_gap:
+            source_x += 1
+            ops.append(_DEL)
+            total = run_base + col_prefix[source_x + 1] if transposed else total + costs.del_costs[source_x]
+        else:
+            target_x += 1
+            ops.append(_INS)
+            total = total + costs.ins_costs[target_x] if transposed else run_base + col_prefix[target_x + 1]
+        accumulated.append(total)
+    return Alignment.from_ops(ops, accumulated, costs.source, costs.target)
+
+
+def _solve(costs: _Costs, lo: int = None, hi: int = None, max_cost: float = None):
+    """
+    Run the DP over the band lo <= target_pos - source_pos <= hi (everything by default), iterating over the
+    shorter of the two sequences.
+
+    :param max_cost: give up once no path can cost less, see _fill
+    :return: (cost, alignment, lower bound on the cost of any alignment leaving the band; inf without a band); inf
+        and None after giving up
+    """
+    n, m = len(costs.source), len(costs.target)
+    if m < n:
+        # rows are the target tokens, so the diagonals flip sign
+        row_lo = None if hi is None else -hi
+        cost, traceback, exit_bound = _fill(costs.ins_costs, costs.del_costs, costs.diag_col,
+                                            row_lo, None if lo is None else -lo, max_cost=max_cost)
+        path = _trace(traceback, m, n, row_lo) if traceback is not None else None
+    else:
+        cost, traceback, exit_bound = _fill(costs.del_costs, costs.ins_costs, costs.diag_row, lo, hi,
+                                            max_cost=max_cost)
+        path = _trace(traceback, n, m, lo) if traceback is not None else None
+    if path is None:
+        return cost, None, exit_bound
+    return cost, _alignment_from_path(path, costs, m < n), exit_bound
+
+
+def _distance(costs: _Costs, lo: int = None, hi: int = None, max_cost: float = None):
+    """
+    Cost-only _solve: the DP over the band keeps a single row and no traceback.
+
+    :return: (cost, lower bound on the cost of any alignment leaving the band; inf without a band)
+    """
+    n, m = len(costs.source), len(costs.target)
+    if m < n:
+        cost, _, exit_bound = _fill(costs.ins_costs, costs.del_costs, costs.diag_col, None if hi is None else -hi,
+                                    None if lo is None else -lo, trace=False, max_cost=max_cost)
+    else:
+        cost, _, exit_bound = _fill(costs.del_costs, costs.ins_costs, costs.diag_row, lo, hi, trace=False,
+                                    max_cost=max_cost)
+    return float(cost), exit_bound
+
+
+def _run(costs: _Costs, lo: Optional[int], hi: Optional[int], max_cost: Optional[float], trace: bool):
+    """_solve, or _distance (with the cost in place of the alignment) without trace"""
+    if trace:
+        return _solve(costs, lo, hi, max_cost)
+    cost, exit_bound = _distance(costs, lo, hi, max_cost)
+    return cost, cost, exit_bound
+
+
+def _cutoff_band(costs: _Costs, max_cost: float) -> Optional[Tuple[int, int]]:
+    """
+    Ukkonen's band: the diagonals lo <= target_pos - source_pos <= hi which an alignment costing at most max_cost
+    can visit, or None when even the gaps between the first and the last diagonal cost more. Leaving the diagonals
+    between those two by d costs at least d insertions and d deletions, at the cheapest gap costs; with free gaps
+    the band is the whole table. Only valid when no operation has a negative cost.
+
+    :rtype: tuple
+    """
+    n, m = len(costs.source), len(costs.target)
+    min_del = float(costs.del_costs.min()) if n else 0.
+    min_ins = float(costs.ins_costs.min()) if m else 0.
+    end = m - n
+    needed = end * min_ins if end > 0 else -end * min_del
+    if needed > max_cost:
+        return None
+    if min_del + min_ins <= 0:
+        return -n, m
+    # a little slack against rounding; a wider band only costs time
+    extra = int(np.floor((max_cost - needed) / (min_del + min_ins) + 1e-9))
+    return min(0, end) - extra, max(0, end) + extra
+
+
+def _nonnegative(costs: _Costs) -> bool:
+    """Whether no operation can have a negative cost, which every band bound relies on"""
+    min_diag = costs.min_diag()
+    return (min_diag is not None and min_diag >= 0 and
+            (not len(costs.ins_costs) or costs.ins_costs.min() >= 0) and
+            (not len(costs.del_costs) or costs.del_costs.min() >= 0))
+
+
+class ExactAligner(object):
+    def __init__(self, scorer: Scoring, vocabulary: Vocabulary = None):
+        """
+        Aligner which solves the full edit distance dynamic program with NumPy, so the result is always optimal.
+
+        Time is O(len(source) * len(target)) and traceback memory is 2 bits per cell. Vectorized scorings
+        (FixedScoring, LevinshteinScoring, MatrixScoring) are asked for whole rows of costs; other Scoring
+        implementations work, but are called once per distinct token pair.
+
+        Runs of gaps are added up from prefix sums, as the DP adds them, so with costs which are not multiples of a
+        power of two (0.7, 1.3) the cost can differ in the last bits from the same costs summed one at a time.
+
+        :param scorer: object to determine the cost of operations
+        :param vocabulary: vocabulary used to encode the tokens; share one across a corpus to intern each token once
+        :type scorer: Scoring
+        :type vocabulary: Vocabulary
+        :rtype: ExactAligner
+        """
+        self.scorer = scorer
+        self.vocabulary = vocabulary
+
+    def _costs(self, source: List, target: List) -> _Costs:
+        vocabulary = self.vocabulary if self.vocabulary is not None else Vocabulary()
+        return _Costs(self.scorer, source, target, vocabulary)
+
+    def __str__(self):
+        return "exact, scorer: {}".format(self.scorer)
+
+    def align(self, source: List, target: List, max_cost: float = None) -> Optional[Alignment]:
+        """
+        Generate the optimal alignment between source and target.
+
+        With max_cost, only the diagonals an alignment costing at most max_cost can reach are filled (Ukkonen's
+        band, O(max_cost * n) cells at unit gap costs), and the fill stops as soon as a whole row costs more.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of any alignment costing more than this
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: Alignment
+        """
+        return self._search(source, target, max_cost, True)
+
+    def distance(self, source: List, target: List, max_cost: float = None) -> Optional[float]:
+        """
+        Cost of the optimal alignment between source and target, from a single row of the DP table at a time: no
+        traceback, and memory linear in the length of the sequences. The costs are added in the same order as for
+        align, so this is align(source, target).cost to the last bit.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of any cost above this, as in align
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: float
+        """
+        return self._search(source, target, max_cost, False)
+
+    def _search(self, source: List, target: List, max_cost: Optional[float], trace: bool):
+        """The alignment (or just the cost, without trace), or None when it costs more than max_cost"""
+        max_cost = _cost_limit(max_cost)
+        costs = self._costs(source, target)
+        if max_cost is None or not _nonnegative(costs):
+            cost, result, _ = _run(costs, None, None, None, trace)
+        else:
+            band = _cutoff_band(costs, max_cost)
+            if band is None:
+                return None
+            cost, result, _ = _run(costs, band[0], band[1], max_cost, trace)
+        return result if max_cost is None or cost <= max_cost else None
+
+
+class BandedAligner(ExactAligner):
+    def __init__(self, scorer: Scoring, band: int = 16, max_cells: int = 0, vocabulary: Vocabulary = None):
+        """
+        Exact aligner for long, similar sequences which only fills a diagonal band of the DP table.
+
+        The band covers every diagonal between the start (0) and the end (len(target) - len(source)) of the
+        table, plus band diagonals on either side. Whenever the best alignment inside the band costs no more than
+        the cheapest alignment which could leave it, the result is optimal; otherwise the band is doubled and the
+        DP is run again. Time and memory are O(n * k) for a final band of k diagonals. With a max_cost, the band
+        never grows past Ukkonen's band (see ExactAligner.align).
+
+        Optimality can only be proven for scorers without negative costs and with a known minimum substitution
+        cost (Scoring.min_pair_cost, e.g. FixedScoring and MatrixScoring); other scorers get the full table.
+
+        :param scorer: object to determine the cost of operations
+        :param band: number of extra diagonals on either side to start with
+        :param max_cells: stop doubling once the band would have more cells than this and return the (possibly
+            suboptimal) best alignment within the current band (0 -> no limit)
+        :param vocabulary: vocabulary used to encode the tokens
+        :type scorer: Scoring
+        :type band: int
+        :type max_cells: int
+        :type vocabulary: Vocabulary
+        :rtype: BandedAligner
+        """
+        super(BandedAligner, self).__init__(scorer, vocabulary)
+        self.band = band
+        self.max_cells = max_cells
+
+    def __str__(self):
+        return "banded, band: {}, max_cells: {}, scorer: {}".format(self.band, self.max_cells, self.scorer)
+
+    @staticmethod
+    def _cells(n: int, m: int, band: int) -> int:
+        return (min(n, m) + 1) * min(max(n, m) + 1, max(0, m - n) - min(0, m - n) + 2 * band + 1)
+
+    def _search(self, source: List, target: List, max_cost: Optional[float], trace: bool):
+        max_cost = _cost_limit(max_cost)
+        costs = self._costs(source, target)
+        n, m = len(source), len(target)
+        if not _nonnegative(costs):
+            cost, result, _ = _run(costs, None, None, None, trace)
+            return result if max_cost is None or cost <= max_cost else None
+
+        cutoff = None
+        if max_cost is not None:
+            cutoff = _cutoff_band(costs, max_cost)
+            if cutoff is None:
+                return None
+        band = max(self.band, 1)
+        while True:
+            lo, hi = min(0, m - n) - band, max(0, m - n) + band
+            if cutoff is not None:
+                # nothing outside Ukkonen's band is cheap enough
+                lo, hi = max(lo, cutoff[0]), min(hi, cutoff[1])
+            cost, result, exit_bound = _run(costs, lo, hi, max_cost, trace)
+            if cost <= exit_bound or (lo, hi) == cutoff or (max_cost is not None and exit_bound > max_cost):
+                break
+
+            band *= 2
+            if 0 < self.max_cells < self._cells(n, m, band):
+                break
+        return result if max_cost is None or cost <= max_cost else None
+
+
+class HirschbergAligner(ExactAligner):
+    def __init__(self, scorer: Scoring, cutoff: int = 1000000, vocabulary: Vocabulary = None):
+        """
+        Exact aligner in linear memory, for sequences whose DP table would not fit (book-length texts and beyond).
+
+        The table is split at its middle row, the crossing point of an optimal path is found from a forward and a
+        backward cost-only pass, and both halves are solved recursively; this takes about twice the time of the full
+        table but only O(len(source) + len(target)) memory, besides the table of a sub-problem of at most cutoff
+        cells. Works with any Scoring; the pair costs of one which is not vectorized are cached for
+        _HIRSCHBERG_CACHE_CELLS cells per token, per slice of the table a pass asks for.
+
+        :param scorer: object to determine the cost of operations
+        :param cutoff: sub-problems with at most this many cells are solved with the full table
+        :param vocabulary: vocabulary used to encode the tokens
+        :type scorer: Scoring
+        :type cutoff: int
+        :type vocabulary: Vocabulary
+        :rtype: HirschbergAligner
+        """
+        super(HirschbergAligner, self).__init__(scorer, vocabulary)
+        self.cutoff = cutoff
+
+    def __str__(self):
+        return "hirschberg, cutoff: {}, scorer: {}".format(self.cutoff, self.scorer)
+
+    def _costs(self, source: List, target: List) -> _Costs:
+        vocabulary = self.vocabulary if self.vocabulary is not None else Vocabulary()
+        # every pass of the recursion asks for the same columns of all its rows
+        return _Costs(self.scorer, source, target, vocabulary,
+                      cache_cells=_HIRSCHBERG_CACHE_CELLS * (len(source) + len(target)), whole_rows=False)
+
+    def align(self, source: List, target: List, max_cost: float = None) -> Optional[Alignment]:
+        """
+        Generate the optimal alignment between source and target.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of any alignment costing more than this; checked first with distance,
+            in Ukkonen's band
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: Alignment
+        """
+        if max_cost is not None and super(HirschbergAligner, self).distance(source, target, max_cost) is None:
+            return None
+        costs = self._costs(source, target)
+        # the DP rows are the shorter sequence; fewer python iterations per pass
+        transposed = len(target) < len(source)
+        if transposed:
+            path = _hirschberg(costs.ins_costs, costs.del_costs, costs.diag_col, self.cutoff)
+        else:
+            path = _hirschberg(costs.del_costs, costs.ins_costs, costs.diag_row, self.cutoff)
+        return _alignment_from_path(path, costs, transposed)
+
+    def distance(self, source: List, target: List, max_cost: float = None) -> Optional[float]:
+        """
+        Cost of the alignment align finds. The splits may pick another of several equally cheap alignments than a
+        single DP pass would, and float costs added along another path can differ in the last bit, so this is
+        align(...).cost: about twice the time of ExactAligner.distance, still in linear memory.
+
+        :param source:
+        :param target:
+        :param max_cost: return None instead of any cost above this, as in align
+        :type source: list
+        :type target: list
+        :type max_cost: float
+        :rtype: float
+        """
+        alignment = self.align(source, target, max_cost)
+        return None if alignment is None else alignment.cost
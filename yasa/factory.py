@@ -0,0 +1,89 @@
+"""
+Construction of aligners from the string options of yasa.align
+"""
+from typing import List
+
+from yasa.aligner import Aligner
+from yasa.anchors import AnchoredAligner
+from yasa.exact import BandedAligner, ExactAligner, HirschbergAligner
+from yasa.nested import NestedLevinshteinScoring
+from yasa.scoring import FixedScoring, LevinshteinScoring, Scoring
+from yasa.vocab import Vocabulary
+
+# engine='auto' solves the full DP up to EXACT_MAX_CELLS cells and switches to the banded DP above that, which widens
+# its band up to BANDED_MAX_CELLS cells (2 bits of traceback each). Change them here, on yasa.factory: yasa only
+# re-exports their values, so assigning yasa.EXACT_MAX_CELLS changes nothing. pick_engine and make_aligner also take
+# them as arguments.
+EXACT_MAX_CELLS = 25000000
+BANDED_MAX_CELLS = 400000000
+
+
+def make_aligner(heap_size: int, beam_size: int, scoring: str, recombine: bool = False, engine: str = 'beam',
+                 vocabulary: Vocabulary = None, anchors: bool = False, heuristic: str = None,
+                 banded_max_cells: int = None):
+    """
+    :type beam_size: int
+    :type heap_size: int
+    :type scoring: basestring | Scoring
+    :type recombine: bool
+    :type engine: basestring
+    :type vocabulary: Vocabulary
+    :type anchors: bool
+    :type heuristic: basestring
+    :type banded_max_cells: int
+    :rtype: Aligner
+
+    :param beam_size:
+    :param heap_size:
+    :param scoring: 'levinshtein', 'nested' or a Scoring object
+    :param recombine:
+    :param engine: 'beam', 'exact', 'banded' or 'hirschberg'
+    :param vocabulary:
+    :param anchors: wrap the aligner in an AnchoredAligner
+    :param heuristic: A* heuristic for the 'beam' engine, see Aligner
+    :param banded_max_cells: widest band of the 'banded' engine, in cells (None -> BANDED_MAX_CELLS)
+    :return:
+    """
+    if isinstance(scoring, Scoring):
+        scoring_obj = scoring
+    elif scoring.lower() == 'levinshtein':
+        scoring_obj = LevinshteinScoring()
+    elif scoring.lower() == 'nested':
+        scoring_obj = NestedLevinshteinScoring(heap_size=10, beam_width=0)
+    else:
+        raise ValueError(u"Unknown scoring type: '{}'".format(scoring))
+
+    engine = engine.lower()
+    if engine == 'beam':
+        aligner = Aligner(scorer=scoring_obj, heap_size=heap_size, beam_width=beam_size, recombine=recombine,
+                          vocabulary=vocabulary, heuristic=heuristic)
+    elif engine == 'exact':
+        aligner = ExactAligner(scorer=scoring_obj, vocabulary=vocabulary)
+    elif engine == 'banded':
+        if banded_max_cells is None:
+            banded_max_cells = BANDED_MAX_CELLS
+        aligner = BandedAligner(scorer=scoring_obj, max_cells=banded_max_cells, vocabulary=vocabulary)
+    elif engine == 'hirschberg':
+        aligner = HirschbergAligner(scorer=scoring_obj, vocabulary=vocabulary)
+    else:
+        raise ValueError(u"Unknown engine: '{}'".format(engine))
+
+    return AnchoredAligner(aligner) if anchors else aligner
+
+
+def pick_engine(engine: str, scoring, source: List, target: List, exact_max_cells: int = None) -> str:
+    """
+    Resolve engine='auto': the full DP for fixed cost scoring when the table is small enough, the banded DP for
+    longer inputs, and the beam search for everything else.
+
+    :param exact_max_cells: largest table for the full DP (None -> EXACT_MAX_CELLS, read on every call)
+    :type exact_max_cells: int
+    :rtype: basestring
+    """
+    if engine.lower() != 'auto':
+        return engine
+    if exact_max_cells is None:
+        exact_max_cells = EXACT_MAX_CELLS
+    if isinstance(scoring, FixedScoring) or (isinstance(scoring, str) and scoring.lower() == 'levinshtein'):
+        return 'exact' if len(source) * len(target) <= exact_max_cells else 'banded'
+    return 'beam'
@@ -0,0 +1,155 @@
+"""
+Lower bounds on the cost of finishing an alignment, for A* ranking in the beam search
+"""
+__all__ = ['RemainingCost', ]
+
+from bisect import bisect_left
+from typing import List, Optional
+
+import numpy as np
+
+from yasa.scoring import FixedScoring, Scoring
+from yasa.vocab import Vocabulary
+
+HEURISTICS = ('length', 'bag')
+
+
+def _min(costs: np.ndarray) -> float:
+    return float(costs.min()) if len(costs) else 0.
+
+
+class RemainingCost(object):
+    """
+    Admissible estimate of the cost of aligning source[source_pos + 1:] with target[target_pos + 1:].
+
+    'length': when one suffix is longer, the difference has to be deleted (or inserted), at the cheapest deletion
+    (insertion) cost.
+
+    'bag': additionally, tokens of one suffix which don't occur in the other (counting repeats) can't be matched, so
+    they cost at least a substitution or a gap. The number of tokens the two suffixes have in common is kept per grid
+    cell and updated from a neighbouring cell in O(log n).
+
+    Both are only lower bounds when no operation costs less than zero; use for_scorer() to get None otherwise.
+    """
+
+    def __init__(self, kind: str, source_ids: List[int], target_ids: List[int], min_del: float, min_ins: float,
+                 min_sub: float):
+        if kind not in HEURISTICS:
+            raise ValueError(u"Unknown heuristic: '{}'".format(kind))
+        self.kind = kind
+        self.source_ids = source_ids
+        self.target_ids = target_ids
+        self.min_del = min_del
+        self.min_ins = min_ins
+        self.min_sub = min_sub
+
+        if kind == 'bag':
+            self._source_at = self._positions(source_ids)
+            self._target_at = self._positions(target_ids)
+            # (source_pos, target_pos) -> number of tokens the two suffixes have in common
+            self._common = dict()
+
+    @classmethod
+    def for_scorer(cls, kind: str, scorer: Scoring, source: List, target: List, source_ids: List[int],
+                   target_ids: List[int], vocabulary: Vocabulary = None) -> Optional['RemainingCost']:
+        """
+        Estimate for scorer, or None when scorer has negative costs and no admissible estimate exists.
+
+        For a FixedScoring the costs are known; for any other scorer the gap and match costs of the tokens at hand
+        are checked (in bulk when the vocabulary of the ids is given), and substitutions are assumed to cost at least
+        Scoring.min_pair_cost, or zero when that is not known.
+        """
+        if kind not in HEURISTICS:
+            raise ValueError(u"Unknown heuristic: '{}'".format(kind))
+        if isinstance(scorer, FixedScoring):
+            min_del, min_ins, min_sub, min_match = scorer.del_cost, scorer.ins_cost, scorer.sub_cost, scorer.match_cost
+        else:
+            if vocabulary is not None:
+                source_array = np.asarray(source_ids, dtype=np.int64)
+                target_array = np.asarray(target_ids, dtype=np.int64)
+                min_del = _min(scorer.deletions(source_array, vocabulary))
+                min_ins = _min(scorer.insertions(target_array, vocabulary))
+                min_match = _min(scorer.pairs(source_array, source_array, vocabulary))
+            else:
+                min_del = min((scorer.deletion(token) for token in source), default=0.)
+                min_ins = min((scorer.insertion(token) for token in target), default=0.)
+                min_match = min((scorer.match(token) for token in source), default=0.)
+            min_pair = scorer.min_pair_cost()
+            min_sub = 0. if min_pair is None else min_pair
+        if min(min_del, min_ins, min_sub, min_match) < 0:
+            return None
+        return cls(kind, source_ids, target_ids, min_del, min_ins, min_sub)
+
+    @staticmethod
+    def _positions(ids: List[int]) -> dict:
+        positions = dict()
+        for pos, idx in enumerate(ids):
+            positions.setdefault(idx, []).append(pos)
+        return positions
+
+    @staticmethod
+    def _count_from(positions: dict, idx: int, start: int) -> int:
+        """Occurrences of idx at or after start"""
+        at = positions.get(idx)
+        return len(at) - bisect_left(at, start) if at else 0
+
+    def _common_from_scratch(self, source_pos: int, target_pos: int) -> int:
+        source_counts = dict()
+        for idx in self.source_ids[source_pos + 1:]:
+            source_counts[idx] = source_counts.get(idx, 0) + 1
+        common = 0
+        for idx in self.target_ids[target_pos + 1:]:
+            left = source_counts.get(idx, 0)
+            if left:
+                source_counts[idx] = left - 1
+                common += 1
+        return common
+
+    def _common_at(self, source_pos: int, target_pos: int) -> int:
+        cells = self._common
+        common = cells.get((source_pos, target_pos))
+        if common is not None:
+            return common
+
+        # drop source[source_pos] from the suffixes of a cell to the left, or target[target_pos] from one above:
+        # the common count falls by one when that token had no spare copy on the other side
+        before = cells.get((source_pos - 1, target_pos))
+        if before is not None:
+            idx = self.source_ids[source_pos]
+            mine = self._count_from(self._source_at, idx, source_pos)
+            theirs = self._count_from(self._target_at, idx, target_pos + 1)
+            common = before - 1 if mine <= theirs else before
+        else:
+            before = cells.get((source_pos, target_pos - 1))
+            if before is not None:
+                idx = self.target_ids[target_pos]
+                mine = self._count_from(self._target_at, idx, target_pos)
+                theirs = self._count_from(self._source_at, idx, source_pos + 1)
+                common = before - 1 if mine <= theirs else before
+            elif (source_pos - 1, target_pos - 1) in cells:
+                # via the cell to the left of this one
+                self._common_at(source_pos - 1, target_pos)
+                return self._common_at(source_pos, target_pos)
+            else:
+                common = self._common_from_scratch(source_pos, target_pos)
+
+        if len(cells) > 1 << 20:
+            cells.clear()
+        cells[(source_pos, target_pos)] = common
+        return common
+
+    def __call__(self, source_pos: int, target_pos: int) -> float:
+        source_left = len(self.source_ids) - 1 - source_pos
+        target_left = len(self.target_ids) - 1 - target_pos
+        if self.kind == 'length':
+            excess = source_left - target_left
+            return excess * self.min_del if excess > 0 else -excess * self.min_ins
+
+        common = self._common_at(source_pos, target_pos)
+        # at least this many source (target) tokens are consumed by a substitution or a deletion (insertion)
+        source_unmatched, target_unmatched = source_left - common, target_left - common
+        paired = min(source_unmatched, target_unmatched)
+        gaps_only = source_unmatched * self.min_del + target_unmatched * self.min_ins
+        with_subs = (paired * self.min_sub + (source_unmatched - paired) * self.min_del +
+                     (target_unmatched - paired) * self.min_ins)
+        return min(gaps_only, with_subs)
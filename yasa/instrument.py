@@ -0,0 +1,183 @@
+"""
+Observers of the Aligner search, for seeing why an alignment is slow or bad
+"""
+__all__ = ['SearchObserver', 'SearchStats', ]
+
+import time
+from array import array
+from collections import Counter
+
+from yasa.scoring import Scoring
+
+
+class SearchObserver(object):
+    """
+    Hook into Aligner.align: pass an instance as Aligner(..., observer=...) and override what you need. Without an
+    observer the search runs unchanged.
+    """
+
+    def on_start(self, aligner, source, target):
+        """
+        Called before the search starts.
+
+        :type aligner: Aligner
+        :type source: list
+        :type target: list
+        """
+
+    def on_step(self, step: int, expanded: int, heap):
+        """
+        Called after every step of the search, once the new heap has been pruned.
+
+        For the beam search a step moves every hypothesis of the heap one cell on; for the A* search a step pops
+        one hypothesis off the open list.
+
+        :param step: number of the step, from 1
+        :param expanded: number of hypotheses expanded in this step
+        :param heap: the heap the step filled; len(heap) survived and heap.top is the best of them. Its
+            pruned_beam, pruned_size and recombined counters tell how many hypotheses were dropped, and why.
+        :type step: int
+        :type expanded: int
+        :type heap: NodeHeap
+        """
+
+    def on_end(self, alignment, scorer_calls: Counter):
+        """
+        Called with the result.
+
+        :param alignment: the alignment found; None for Aligner.distance, which keeps no alignment
+        :param scorer_calls: number of calls of each Scoring method during the search
+        :type alignment: Alignment
+        :type scorer_calls: Counter
+        """
+
+
+class SearchStats(SearchObserver):
+    """
+    Observer which counts what the search did: hypotheses expanded and pruned (by the beam, by the heap size, or
+    recombined), scorer calls and scorer cache hits (for scorers with a cache_info(), e.g.
+    NestedLevinshteinScoring). Counts add up over every alignment observed and stats can be merged, like the
+    summary accumulators.
+
+    The per step heap sizes and best costs (heap_sizes, best_costs) are those of the latest alignment.
+    """
+
+    def __init__(self):
+        self.alignments = 0
+        self.steps = 0
+        self.expanded = 0
+        self.pruned_beam = 0
+        self.pruned_size = 0
+        self.recombined = 0
+        self.scorer_calls = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.seconds = 0.
+
+        self.heap_sizes = array('l')
+        self.best_costs = array('d')
+
+        self._aligner = None
+        self._cache_info = None
+        self._start = None
+
+    @staticmethod
+    def _scorer_cache(aligner):
+        cache_info = getattr(aligner.scorer, 'cache_info', None)
+        return cache_info() if cache_info is not None else None
+
+    def on_start(self, aligner, source, target):
+        self._aligner = aligner
+        self._cache_info = self._scorer_cache(aligner)
+        self.heap_sizes = array('l')
+        self.best_costs = array('d')
+        self._start = time.perf_counter()
+
+    def on_step(self, step: int, expanded: int, heap):
+        self.steps += 1
+        self.expanded += expanded
+        self.pruned_beam += heap.pruned_beam
+        self.pruned_size += heap.pruned_size
+        self.recombined += heap.recombined
+        self.heap_sizes.append(len(heap))
+        if len(heap):
+            self.best_costs.append(heap.top[5])
+
+    def on_end(self, alignment, scorer_calls: Counter):
+        self.seconds += time.perf_counter() - self._start
+        self.alignments += 1
+        self.scorer_calls.update(scorer_calls)
+        if self._cache_info is not None:
+            cache_info = self._scorer_cache(self._aligner)
+            self.cache_hits += cache_info.hits - self._cache_info.hits
+            self.cache_misses += cache_info.misses - self._cache_info.misses
+        self._aligner = None
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of scorer calls answered from the scorer's cache, or nan without a cache"""
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else float('nan')
+
+    def merge(self, other: 'SearchStats') -> 'SearchStats':
+        """
+        Add the counts of other to these, e.g. from another process. The per step trajectories are left alone.
+
+        :rtype: SearchStats
+        """
+        for name in ('alignments', 'steps', 'expanded', 'pruned_beam', 'pruned_size', 'recombined', 'cache_hits',
+                     'cache_misses', 'seconds'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.scorer_calls.update(other.scorer_calls)
+        return self
+
+    def __add__(self, other: 'SearchStats') -> 'SearchStats':
+        return SearchStats().merge(self).merge(other)
+
+    def __radd__(self, other):
+        if other == 0:
+            return SearchStats().merge(self)
+        return NotImplemented
+
+    def as_dict(self) -> dict:
+        """Counts as a dict, e.g. for JSON"""
+        return dict(alignments=self.alignments, steps=self.steps, expanded=self.expanded,
+                    pruned_beam=self.pruned_beam, pruned_size=self.pruned_size, recombined=self.recombined,
+                    scorer_calls=dict(self.scorer_calls), cache_hits=self.cache_hits,
+                    cache_misses=self.cache_misses, seconds=self.seconds)
+
+    def __str__(self):
+        lines = ["alignments: {}, steps: {}, seconds: {:.3f}".format(self.alignments, self.steps, self.seconds),
+                 "expanded: {}, mean heap size: {:.1f}".format(self.expanded, self.expanded / max(self.steps, 1)),
+                 "pruned by beam: {}, by heap size: {}, recombined: {}".format(self.pruned_beam, self.pruned_size,
+                                                                               self.recombined),
+                 "scorer calls: {}".format(', '.join("{}={}".format(name, count)
+                                                     for name, count in sorted(self.scorer_calls.items())))]
+        if self.cache_hits + self.cache_misses:
+            lines.append("scorer cache hit rate: {:.3f}".format(self.cache_hit_rate))
+        return '\n'.join(lines)
+
+
+class CountingScoring(Scoring):
+    """Scoring which counts the calls of each method before handing them to scorer"""
+
+    def __init__(self, scorer: Scoring):
+        super(CountingScoring, self).__init__()
+        self.scorer = scorer
+        self.calls = Counter()
+
+    def insertion(self, token):
+        self.calls['insertion'] += 1
+        return self.scorer.insertion(token)
+
+    def deletion(self, token):
+        self.calls['deletion'] += 1
+        return self.scorer.deletion(token)
+
+    def substitution(self, source, target):
+        self.calls['substitution'] += 1
+        return self.scorer.substitution(source, target)
+
+    def match(self, token):
+        self.calls['match'] += 1
+        return self.scorer.match(token)
@@ -0,0 +1,224 @@
+"""
+Scoring from per token cost vectors and a substitution matrix
+"""
+__all__ = ['MatrixScoring', ]
+
+import weakref
+from array import array
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from yasa.scoring import Scoring
+from yasa.vocab import Vocabulary
+
+
+class MatrixScoring(Scoring):
+    vectorized = True
+
+    def __init__(self, vocabulary: Vocabulary, insertion_costs, deletion_costs,
+                 substitution_costs: Union[np.ndarray, Dict[Tuple, float]], ins_cost: float = 1.,
+                 del_cost: float = 1., sub_cost: float = 1., match_cost: float = 0.):
+        """
+        Weighted scoring, e.g. from learned phonetic confusions: every token of vocabulary has its own insertion and
+        deletion cost, and every pair of tokens its own substitution cost. The costs are arrays, so the DP engines
+        get whole rows of costs at once, at close to the speed of FixedScoring.
+
+        The substitution costs are either dense, a len(vocabulary) x len(vocabulary) array whose diagonal holds the
+        match costs, or sparse, a dict {(source_token, target_token): cost}; pairs missing from the dict cost
+        sub_cost (match_cost for a token with itself). Anything about a token outside vocabulary costs ins_cost,
+        del_cost, sub_cost or match_cost.
+
+        :param vocabulary: the tokens the costs are for, by id
+        :param insertion_costs: insertion cost of each token of vocabulary
+        :param deletion_costs: deletion cost of each token of vocabulary
+        :param substitution_costs: dense array or sparse dict of substitution costs
+        :param ins_cost: insertion cost of other tokens
+        :param del_cost: deletion cost of other tokens
+        :param sub_cost: substitution cost of other pairs
+        :param match_cost: match cost of other tokens
+        :type vocabulary: Vocabulary
+        :type insertion_costs: np.ndarray
+        :type deletion_costs: np.ndarray
+        :type substitution_costs: np.ndarray | dict
+        :raises KeyError: when a token of the sparse substitution costs is not in vocabulary
+        :rtype: MatrixScoring
+        """
+        super(MatrixScoring, self).__init__()
+        size = len(vocabulary)
+        self.vocabulary = vocabulary
+        self.ins_cost = ins_cost
+        self.del_cost = del_cost
+        self.sub_cost = sub_cost
+        self.match_cost = match_cost
+        # one slot past the vocabulary holds the cost of unknown tokens
+        self.insertion_costs = self._with_default(insertion_costs, size, ins_cost)
+        self.deletion_costs = self._with_default(deletion_costs, size, del_cost)
+
+        if isinstance(substitution_costs, dict):
+            self.dense = False
+            id_of = vocabulary.id_of
+            pairs = {(id_of(source), id_of(target)): cost for (source, target), cost in substitution_costs.items()}
+            self._pair_costs = pairs
+            # row * size + col of every pair, sorted, for lookups of any shape; plus the same by row and by column
+            # (like CSR and CSC matrices), for the rows and columns the DP engines ask for
+            self._keys, self._values = self._sorted(pairs, size)
+            self._by_row = self._compressed(pairs, size)
+            self._by_col = self._compressed({(col, row): cost for (row, col), cost in pairs.items()}, size)
+            match_costs = np.full(size, match_cost, dtype=np.float64)
+            for (row, col), cost in pairs.items():
+                if row == col:
+                    match_costs[row] = cost
+        else:
+            self.dense = True
+            table = np.asarray(substitution_costs, dtype=np.float64)
+            if table.shape != (size, size):
+                raise ValueError("substitution_costs is {}, expected {}".format(table.shape, (size, size)))
+            # one row and column past the vocabulary hold the costs of unknown tokens; two unknown tokens are only
+            # ever looked up here when they differ
+            self.table = np.full((size + 1, size + 1), sub_cost, dtype=np.float64)
+            self.table[:size, :size] = table
+            self._flat = array('d', self.table.tobytes())
+            match_costs = np.diagonal(table)
+        self.match_costs = self._with_default(match_costs, size, match_cost)
+        self._size = size
+
+        # costs as python floats for the per token methods
+        self._insertion_list = self.insertion_costs.tolist()
+        self._deletion_list = self.deletion_costs.tolist()
+        self._match_list = self.match_costs.tolist()
+        # id of vocabulary -> own id, for every other vocabulary the batch methods were asked with
+        self._translations = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _sorted(pairs: Dict[Tuple[int, int], float], size: int) -> Tuple[np.ndarray, np.ndarray]:
+        keys = np.array(sorted(row * size + col for row, col in pairs), dtype=np.int64)
+        values = np.array([pairs[divmod(int(key), size)] for key in keys], dtype=np.float64)
+        return keys, values
+
+    @classmethod
+    def _compressed(cls, pairs: Dict[Tuple[int, int], float], size: int) -> Tuple:
+        """(starts, minors, values): the pairs of major index i are minors[starts[i]:starts[i + 1]]"""
+        keys, values = cls._sorted(pairs, size)
+        # one more major index for unknown tokens, which has no pairs
+        starts = np.searchsorted(keys, np.arange(size + 2) * size)
+        return starts, keys % size if size else keys, values
+
+    def _lookup(self, compressed: Tuple, major: int, minors: np.ndarray) -> np.ndarray:
+        """substitution costs of major index major against minors"""
+        starts, all_minors, all_values = compressed
+        lo, hi = starts[major], starts[major + 1]
+        if lo == hi:
+            return np.full(np.shape(minors), self.sub_cost, dtype=np.float64)
+        known = all_minors[lo:hi]
+        at = np.minimum(np.searchsorted(known, minors), hi - lo - 1)
+        return np.where(known[at] == minors, all_values[lo:hi][at], self.sub_cost)
+
+    @staticmethod
+    def _with_default(costs, size: int, default: float) -> np.ndarray:
+        costs = np.asarray(costs, dtype=np.float64)
+        if costs.shape != (size,):
+            raise ValueError("got {} costs, expected {}".format(costs.shape, (size,)))
+        return np.append(costs, default)
+
+    @classmethod
+    def from_costs(cls, substitution_costs: Dict[Tuple, float], insertion_costs: Dict = None,
+                   deletion_costs: Dict = None, ins_cost: float = 1., del_cost: float = 1., sub_cost: float = 1.,
+                   match_cost: float = 0.) -> 'MatrixScoring':
+        """
+        Sparse MatrixScoring over the tokens of dicts of costs.
+
+        :param substitution_costs: {(source_token, target_token): cost}
+        :param insertion_costs: {token: cost}; other tokens cost ins_cost
+        :param deletion_costs: {token: cost}; other tokens cost del_cost
+        :rtype: MatrixScoring
+        """
+        insertion_costs = insertion_costs or dict()
+        deletion_costs = deletion_costs or dict()
+        vocabulary = Vocabulary()
+        for source, target in substitution_costs:
+            vocabulary.add(source)
+            vocabulary.add(target)
+        for token in list(insertion_costs) + list(deletion_costs):
+            vocabulary.add(token)
+        tokens = vocabulary.tokens
+        return cls(vocabulary, [insertion_costs.get(token, ins_cost) for token in tokens],
+                   [deletion_costs.get(token, del_cost) for token in tokens], substitution_costs,
+                   ins_cost, del_cost, sub_cost, match_cost)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_translations']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._translations = weakref.WeakKeyDictionary()
+
+    def __str__(self):
+        return "matrix {}, {} tokens".format('dense' if self.dense else 'sparse', self._size)
+
+    def _own(self, token) -> int:
+        idx = self.vocabulary.get(token)
+        # the vocabulary may have grown since, with tokens there are no costs for
+        return idx if idx is not None and idx < self._size else self._size
+
+    def insertion(self, token):
+        return self._insertion_list[self._own(token)]
+
+    def deletion(self, token):
+        return self._deletion_list[self._own(token)]
+
+    def match(self, token):
+        return self._match_list[self._own(token)]
+
+    def substitution(self, source, target):
+        row, col = self._own(source), self._own(target)
+        if self.dense:
+            return self._flat[row * (self._size + 1) + col]
+        return self._pair_costs.get((row, col), self.sub_cost)
+
+    def _translate(self, ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        """own ids of the ids of vocabulary, with the unknown slot for tokens this scoring has no costs for"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if vocabulary is self.vocabulary:
+            return np.minimum(ids, self._size)
+        translation = self._translations.get(vocabulary)
+        if translation is None or len(translation) < len(vocabulary):
+            # vocabularies only ever grow, so only the new ids need translating
+            known = 0 if translation is None else len(translation)
+            extra = np.fromiter((self._own(vocabulary.token_of(idx)) for idx in range(known, len(vocabulary))),
+                                dtype=np.int64, count=len(vocabulary) - known)
+            translation = extra if translation is None else np.concatenate((translation, extra))
+            self._translations[vocabulary] = translation
+        return translation[ids]
+
+    def insertions(self, ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        return self.insertion_costs[self._translate(ids, vocabulary)]
+
+    def deletions(self, ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        return self.deletion_costs[self._translate(ids, vocabulary)]
+
+    def pairs(self, source_ids: np.ndarray, target_ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        rows = self._translate(source_ids, vocabulary)
+        cols = self._translate(target_ids, vocabulary)
+        # equal ids of vocabulary are the same token, even when neither is known here
+        same = np.equal(source_ids, target_ids)
+        if self.dense:
+            costs = self.table[rows, cols]
+        elif not rows.ndim:
+            costs = self._lookup(self._by_row, rows, cols)
+        elif not cols.ndim:
+            costs = self._lookup(self._by_col, cols, rows)
+        else:
+            keys = np.asarray(rows, dtype=np.int64) * self._size + cols
+            at = np.searchsorted(self._keys, keys)
+            at = np.minimum(at, max(len(self._keys) - 1, 0))
+            found = (self._keys[at] == keys) if len(self._keys) else np.zeros(np.shape(keys), dtype=bool)
+            found &= (rows < self._size) & (cols < self._size)
+            costs = np.where(found, self._values[at] if len(self._values) else 0., self.sub_cost)
+        return np.where(same, self.match_costs[rows], costs)
+
+    def min_pair_cost(self) -> Optional[float]:
+        pair_min = self.table.min() if self.dense else self._values.min(initial=self.sub_cost)
+        return float(min(self.match_costs.min(), self.sub_cost, pair_min))
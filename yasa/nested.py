@@ -1,13 +1,108 @@
 from functools import lru_cache
+from typing import Sequence
 
 from yasa.aligner import Aligner
 from yasa.scoring import Scoring, LevinshteinScoring
 
 
+def edit_distance(source: Sequence, target: Sequence) -> int:
+    """
+    Levinshtein distance between two short sequences (e.g. the characters of two words), computed with Myers'
+    bit-parallel algorithm: one column of the DP table is a pair of integers, so the cost is O(len(source) +
+    len(target)) integer operations for tokens of realistic length.
+
+    :param source:
+    :param target:
+    :rtype: int
+    """
+    # strip the common prefix and suffix, they never cost anything
+    start = 0
+    stop = min(len(source), len(target))
+    while start < stop and source[start] == target[start]:
+        start += 1
+    source_stop, target_stop = len(source), len(target)
+    while source_stop > start and target_stop > start and source[source_stop - 1] == target[target_stop - 1]:
+        source_stop -= 1
+        target_stop -= 1
+    source, target = source[start:source_stop], target[start:target_stop]
+
+    # bit vectors run over the shorter sequence
+    if len(source) > len(target):
+        source, target = target, source
+    if not source:
+        return len(target)
+
+    peq = dict()
+    bit = 1
+    for token in source:
+        peq[token] = peq.get(token, 0) | bit
+        bit <<= 1
+    mask = bit - 1
+    high = bit >> 1
+
+    pv, mv, score = mask, 0, len(source)
+    for token in target:
+        eq = peq.get(token, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
 class NestedLevinshteinScoring(Scoring):
-    def __init__(self, heap_size: int = 10, beam_width: int = 0):
+    def __init__(self, heap_size: int = 10, beam_width: int = 0, cache_size: int = 10000, inner: str = 'myers'):
+        """
+        Scoring for words: insertions and deletions cost the length of the word, and substitutions the Levinshtein
+        distance between the characters of the two words.
+
+        :param heap_size: heap size of the inner character aligner, for inner='beam'
+        :param beam_width: beam width of the inner character aligner, for inner='beam'
+        :param cache_size: substitution costs remembered by this scorer (None -> unbounded)
+        :param inner: 'myers' for the exact bit-parallel edit distance, 'beam' to run a beam search Aligner over the
+            characters
+        :type heap_size: int
+        :type beam_width: int
+        :type cache_size: int
+        :type inner: basestring
+        :rtype: NestedLevinshteinScoring
+        """
         super(NestedLevinshteinScoring, self).__init__()
-        self._aligner = Aligner(LevinshteinScoring(), heap_size, beam_width)
+        inner = inner.lower()
+        if inner not in ('myers', 'beam'):
+            raise ValueError(u"Unknown inner aligner: '{}'".format(inner))
+        self.heap_size = heap_size
+        self.beam_width = beam_width
+        self.cache_size = cache_size
+        self.inner = inner
+        self._setup()
+
+    def _setup(self):
+        self._aligner = (Aligner(LevinshteinScoring(), self.heap_size, self.beam_width) if self.inner == 'beam'
+                         else None)
+        # the cache belongs to this instance, so it goes away with it
+        self.substitution = lru_cache(self.cache_size)(self._substitution)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_aligner']
+        del state['substitution']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
+
+    def __str__(self):
+        return "nested, inner: {}, cache_size: {}".format(self.inner, self.cache_size)
 
     def deletion(self, token):
         return len(token)
@@ -19,7 +114,17 @@ class NestedLevinshteinScoring(Scoring):
         # we really like matches
         return -len(token) * 1.2
 
-    @lru_cache(10000)
-    def substitution(self, source, target):
-        return self._aligner.align(source, target).cost
+    def cache_info(self):
+        """Hits, misses, maxsize and currsize of the substitution cost cache"""
+        return self.substitution.cache_info()
+
+    def cache_clear(self):
+        self.substitution.cache_clear()
 
+    def _substitution(self, source, target):
+        # against an empty token, the distance is just the length of the other one
+        if not source or not target:
+            return max(len(source), len(target))
+        if self._aligner is None:
+            return edit_distance(source, target)
+        return self._aligner.distance(source, target)
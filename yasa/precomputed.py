@@ -0,0 +1,155 @@
+"""
+Substitution costs computed up front for a whole corpus
+"""
+__all__ = ['PrecomputedScoring', ]
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from yasa.scoring import Scoring
+from yasa.vocab import Vocabulary
+
+
+# the scorer and target tokens of a worker process, set up by the pool initializer
+_worker_scorer = None
+_worker_targets = None
+
+
+def _init_worker(scorer, target_tokens):
+    global _worker_scorer, _worker_targets
+    _worker_scorer = scorer
+    _worker_targets = target_tokens
+
+
+def _rows(scorer: Scoring, source_tokens: List, target_tokens: List) -> np.ndarray:
+    substitution = scorer.substitution
+    table = np.empty((len(source_tokens), len(target_tokens)), dtype=np.float64)
+    for row, source_token in enumerate(source_tokens):
+        table[row] = [substitution(source_token, target_token) for target_token in target_tokens]
+    return table
+
+
+def _worker_rows(source_tokens: List) -> np.ndarray:
+    return _rows(_worker_scorer, source_tokens, _worker_targets)
+
+
+class PrecomputedScoring(Scoring):
+    def __init__(self, scorer: Scoring, source_vocabulary: Vocabulary, target_vocabulary: Vocabulary,
+                 table: np.ndarray):
+        """
+        Scoring which looks substitution costs up in a table of every source token against every target token, so
+        an expensive scorer (e.g. NestedLevinshteinScoring) is never called from the search. Insertions, deletions,
+        matches and tokens missing from the table are left to scorer.
+
+        Use build() or from_pairs() to compute the table.
+
+        :param scorer: scorer the table was computed with
+        :param source_vocabulary: row of each source token
+        :param target_vocabulary: column of each target token
+        :param table: substitution costs, len(source_vocabulary) x len(target_vocabulary)
+        :type scorer: Scoring
+        :type source_vocabulary: Vocabulary
+        :type target_vocabulary: Vocabulary
+        :type table: np.ndarray
+        :rtype: PrecomputedScoring
+        """
+        super(PrecomputedScoring, self).__init__()
+        if table.shape != (len(source_vocabulary), len(target_vocabulary)):
+            raise ValueError("table is {}, expected {}".format(table.shape,
+                                                               (len(source_vocabulary), len(target_vocabulary))))
+        self.scorer = scorer
+        self.source_vocabulary = source_vocabulary
+        self.target_vocabulary = target_vocabulary
+        # lookups index a flat array of python floats; numpy scalars would be slow to index and slow to add up.
+        # table is a view of the same memory.
+        self._flat = array('d', np.ascontiguousarray(table, dtype=np.float64).tobytes())
+        self._width = table.shape[1]
+        self.table = np.frombuffer(self._flat, dtype=np.float64).reshape(table.shape)
+        self._row_of = source_vocabulary.get
+        self._col_of = target_vocabulary.get
+
+    @classmethod
+    def build(cls, scorer: Scoring, source_tokens: Iterable, target_tokens: Iterable, workers: int = 1,
+              chunksize: int = 64) -> 'PrecomputedScoring':
+        """
+        Compute the substitution cost of every distinct source token against every distinct target token.
+
+        :param scorer: scorer to compute the costs with
+        :param source_tokens: source tokens; duplicates are fine
+        :param target_tokens: target tokens; duplicates are fine
+        :param workers: compute blocks of rows in this many processes (1 -> in this process)
+        :param chunksize: rows per block
+        :rtype: PrecomputedScoring
+        """
+        source_vocabulary = Vocabulary(source_tokens)
+        target_vocabulary = Vocabulary(target_tokens)
+        sources, targets = source_vocabulary.tokens, target_vocabulary.tokens
+
+        if workers > 1 and len(sources) > chunksize:
+            blocks = [sources[start:start + chunksize] for start in range(0, len(sources), chunksize)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(scorer, targets)) as pool:
+                table = np.concatenate(list(pool.map(_worker_rows, blocks)))
+        else:
+            table = _rows(scorer, sources, targets)
+        return cls(scorer, source_vocabulary, target_vocabulary, table)
+
+    @classmethod
+    def from_pairs(cls, scorer: Scoring, pairs: Iterable[Tuple[List, List]], workers: int = 1,
+                   chunksize: int = 64) -> 'PrecomputedScoring':
+        """
+        build() over the tokens of a corpus of (source, target) pairs.
+
+        :rtype: PrecomputedScoring
+        """
+        source_tokens, target_tokens = set(), set()
+        for source, target in pairs:
+            source_tokens.update(source)
+            target_tokens.update(target)
+        return cls.build(scorer, sorted(source_tokens), sorted(target_tokens), workers, chunksize)
+
+    def save(self, path: str):
+        """
+        Save the table and its tokens (which must be strings) to a .npz file.
+
+        :param path:
+        """
+        np.savez(path, table=self.table,
+                 source_tokens=np.array(self.source_vocabulary.tokens, dtype=np.str_),
+                 target_tokens=np.array(self.target_vocabulary.tokens, dtype=np.str_))
+
+    @classmethod
+    def load(cls, path: str, scorer: Scoring) -> 'PrecomputedScoring':
+        """
+        Load a table written by save().
+
+        :param path:
+        :param scorer: scorer the table was computed with, for everything but the substitutions in the table
+        :rtype: PrecomputedScoring
+        """
+        with np.load(path) as data:
+            return cls(scorer, Vocabulary(data['source_tokens'].tolist()), Vocabulary(data['target_tokens'].tolist()),
+                       data['table'])
+
+    def __str__(self):
+        return "precomputed {}x{}, scorer: {}".format(len(self.source_vocabulary), len(self.target_vocabulary),
+                                                      self.scorer)
+
+    def insertion(self, token):
+        return self.scorer.insertion(token)
+
+    def deletion(self, token):
+        return self.scorer.deletion(token)
+
+    def match(self, token):
+        return self.scorer.match(token)
+
+    def substitution(self, source, target):
+        row = self._row_of(source)
+        col = self._col_of(target)
+        if row is None or col is None:
+            return self.scorer.substitution(source, target)
+        return self._flat[row * self._width + col]
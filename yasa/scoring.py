@@ -1,9 +1,23 @@
 """
 Scoring / Aligner Implementations
 """
+from typing import Optional
+
+import numpy as np
+
+from yasa.vocab import Vocabulary
 
 
 class Scoring(object):
+    """
+    Costs of the edit operations on tokens.
+
+    Besides the per token methods, a scoring answers in bulk for arrays of token ids (of a Vocabulary), which is
+    what the DP engines ask for. The defaults below call the per token methods once per id; scorings which
+    compute them with NumPy set vectorized = True, so the engines call them for every row instead of caching rows.
+    """
+    vectorized = False
+
     def insertion(self, token):
         raise NotImplementedError
 
@@ -16,8 +30,55 @@ class Scoring(object):
     def match(self, token):
         raise NotImplementedError
 
+    def insertions(self, ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        """
+        Insertion costs of the tokens with ids.
+
+        :param ids: token ids of vocabulary
+        :param vocabulary: vocabulary the ids are from
+        :rtype: np.ndarray
+        """
+        token_of = vocabulary.token_of
+        return np.fromiter((self.insertion(token_of(idx)) for idx in ids), dtype=np.float64, count=len(ids))
+
+    def deletions(self, ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        """
+        Deletion costs of the tokens with ids.
+
+        :param ids: token ids of vocabulary
+        :param vocabulary: vocabulary the ids are from
+        :rtype: np.ndarray
+        """
+        token_of = vocabulary.token_of
+        return np.fromiter((self.deletion(token_of(idx)) for idx in ids), dtype=np.float64, count=len(ids))
+
+    def pairs(self, source_ids: np.ndarray, target_ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        """
+        Costs of aligning source_ids with target_ids element by element: the match cost where the ids are equal,
+        the substitution cost elsewhere. The ids broadcast like NumPy arrays, e.g. one source id against a row of
+        target ids.
+
+        :param source_ids: token ids of vocabulary
+        :param target_ids: token ids of vocabulary
+        :param vocabulary: vocabulary the ids are from
+        :rtype: np.ndarray
+        """
+        source_ids, target_ids = np.broadcast_arrays(source_ids, target_ids)
+        token_of = vocabulary.token_of
+        costs = np.fromiter((self.match(token_of(source_idx)) if source_idx == target_idx
+                             else self.substitution(token_of(source_idx), token_of(target_idx))
+                             for source_idx, target_idx in zip(source_ids.flat, target_ids.flat)),
+                            dtype=np.float64, count=source_ids.size)
+        return costs.reshape(source_ids.shape)
+
+    def min_pair_cost(self) -> Optional[float]:
+        """Lower bound on every match and substitution cost, or None when it is not known up front"""
+        return None
+
 
 class FixedScoring(Scoring):
+    vectorized = True
+
     def __init__(self, ins_cost: float, del_cost: float, sub_cost: float, match_cost: float):
         super(Scoring, self).__init__()
         self.ins_cost = ins_cost
@@ -37,6 +98,18 @@ class FixedScoring(Scoring):
     def match(self, token):
         return self.match_cost
 
+    def insertions(self, ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        return np.full(len(ids), self.ins_cost, dtype=np.float64)
+
+    def deletions(self, ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        return np.full(len(ids), self.del_cost, dtype=np.float64)
+
+    def pairs(self, source_ids: np.ndarray, target_ids: np.ndarray, vocabulary: Vocabulary) -> np.ndarray:
+        return np.where(np.equal(source_ids, target_ids), float(self.match_cost), float(self.sub_cost))
+
+    def min_pair_cost(self) -> Optional[float]:
+        return min(self.match_cost, self.sub_cost)
+
 
 class LevinshteinScoring(FixedScoring):
     """
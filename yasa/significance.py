@@ -0,0 +1,183 @@
+"""
+Confidence intervals and significance tests for corpus WER
+"""
+from __future__ import division
+
+__all__ = ['utterance_counts', 'bootstrap_wer', 'paired_bootstrap', 'sign_test', 'wilcoxon_test',
+           'Interval', 'PairedResult', ]
+
+import math
+from collections import namedtuple
+from typing import Iterable, Tuple
+
+import numpy as np
+
+Interval = namedtuple('Interval', 'estimate low high')
+PairedResult = namedtuple('PairedResult', 'delta low high p_value')
+
+# multinomial draws per batch of resamples; bounds memory at about 8 bytes per draw
+_BATCH_CELLS = 1 << 24
+
+
+def utterance_counts(alignments: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per utterance correct and incorrect counts of alignments, as accumulated by WordErrorRate.
+
+    :param alignments: Alignment objects, or (cost, correct, incorrect) tuples from align_many(..., result='counts')
+    :return: (correct, incorrect) int64 arrays
+    """
+    correct, incorrect = [], []
+    for alignment in alignments:
+        if isinstance(alignment, tuple):
+            correct.append(alignment[1])
+            incorrect.append(alignment[2])
+        else:
+            correct.append(alignment.correct_n())
+            incorrect.append(alignment.errors_n())
+    return np.array(correct, dtype=np.int64), np.array(incorrect, dtype=np.int64)
+
+
+def _wer(correct, incorrect):
+    total = correct + incorrect
+    return np.divide(incorrect, total, out=np.zeros(np.shape(total)), where=total > 0)
+
+
+def _resampled_sums(rows: np.ndarray, n_resamples: int, rng: np.random.Generator):
+    """
+    Column sums of n_resamples bootstrap resamples of rows, in batches.
+
+    A resample of N rows only matters through how often it picks each distinct row, which is multinomial. So
+    resampling draws one count per distinct row instead of N indices per resample, and the sums are a matrix
+    product. Utterance counts have few distinct rows, which makes a million utterances as cheap as a thousand.
+    """
+    unique, weights = np.unique(rows, axis=0, return_counts=True)
+    probabilities = weights / weights.sum()
+    batch = max(1, _BATCH_CELLS // len(unique))
+    for start in range(0, n_resamples, batch):
+        draws = rng.multinomial(len(rows), probabilities, size=min(batch, n_resamples - start))
+        yield draws @ unique
+
+
+def _check_confidence(confidence: float):
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1, got {}".format(confidence))
+
+
+def bootstrap_wer(correct, incorrect, n_resamples: int = 10000, confidence: float = 0.95,
+                  seed: int = None) -> Interval:
+    """
+    Percentile bootstrap confidence interval of the corpus WER, resampling utterances.
+
+    :param correct: per utterance correct counts
+    :param incorrect: per utterance incorrect counts
+    :param n_resamples: number of bootstrap resamples
+    :param confidence: coverage of the interval
+    :param seed: seed of the random generator, for reproducible intervals
+    :rtype: Interval
+    """
+    _check_confidence(confidence)
+    correct, incorrect = np.asarray(correct, dtype=np.int64), np.asarray(incorrect, dtype=np.int64)
+    rows = np.stack((correct, incorrect), axis=1)
+    rng = np.random.default_rng(seed)
+    wers = np.concatenate([_wer(sums[:, 0], sums[:, 1]) for sums in _resampled_sums(rows, n_resamples, rng)])
+
+    tail = (1 - confidence) / 2
+    low, high = np.quantile(wers, [tail, 1 - tail])
+    return Interval(float(_wer(correct.sum(), incorrect.sum())), float(low), float(high))
+
+
+def paired_bootstrap(correct_a, incorrect_a, correct_b, incorrect_b, n_resamples: int = 10000,
+                     confidence: float = 0.95, seed: int = None) -> PairedResult:
+    """
+    Paired bootstrap comparison of two systems on the same utterances: both are resampled with the same utterances,
+    so the interval is that of WER(b) - WER(a) and the p-value two-sided, for the hypothesis that the systems are
+    equally good.
+
+    :param correct_a: per utterance correct counts of system a
+    :param incorrect_a: per utterance incorrect counts of system a
+    :param correct_b: per utterance correct counts of system b, in the same order
+    :param incorrect_b: per utterance incorrect counts of system b
+    :param n_resamples: number of bootstrap resamples
+    :param confidence: coverage of the interval
+    :param seed: seed of the random generator
+    :rtype: PairedResult
+    """
+    _check_confidence(confidence)
+    rows = np.stack([np.asarray(counts, dtype=np.int64)
+                     for counts in (correct_a, incorrect_a, correct_b, incorrect_b)], axis=1)
+    totals = rows.sum(axis=0)
+    delta = float(_wer(totals[2], totals[3]) - _wer(totals[0], totals[1]))
+
+    rng = np.random.default_rng(seed)
+    deltas = np.concatenate([_wer(sums[:, 2], sums[:, 3]) - _wer(sums[:, 0], sums[:, 1])
+                             for sums in _resampled_sums(rows, n_resamples, rng)])
+    tail = (1 - confidence) / 2
+    low, high = np.quantile(deltas, [tail, 1 - tail])
+    # how often the resampled difference lands on the other side of zero
+    p_value = min(1., 2 * min(np.mean(deltas <= 0), np.mean(deltas >= 0)))
+    return PairedResult(delta, float(low), float(high), float(p_value))
+
+
+def _normal_p_value(z: float) -> float:
+    """Two-sided p-value of a standard normal statistic"""
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def sign_test(errors_a, errors_b) -> float:
+    """
+    Two-sided sign test of per utterance error counts of two systems; ties are dropped. Exact up to 1000 untied
+    utterances, normal approximation above that.
+
+    :param errors_a: per utterance incorrect counts of system a
+    :param errors_b: per utterance incorrect counts of system b, in the same order
+    :return: p-value
+    :rtype: float
+    """
+    diff = np.asarray(errors_b, dtype=np.int64) - np.asarray(errors_a, dtype=np.int64)
+    worse = int(np.count_nonzero(diff > 0))
+    better = int(np.count_nonzero(diff < 0))
+    n = worse + better
+    if not n:
+        return 1.
+    k = min(worse, better)
+    if n <= 1000:
+        # binomial coefficients built up one at a time (math.comb needs python 3.8)
+        coefficient = total = 1
+        for x in range(k):
+            coefficient = coefficient * (n - x) // (x + 1)
+            total += coefficient
+        tail = total / 2 ** n
+        return min(1., 2 * tail)
+    # continuity corrected
+    return _normal_p_value((k + 0.5 - n / 2) / math.sqrt(n / 4))
+
+
+def wilcoxon_test(errors_a, errors_b) -> float:
+    """
+    Two-sided Wilcoxon signed-rank test of per utterance error counts of two systems, with the normal approximation
+    (corrected for ties and continuity); zero differences are dropped.
+
+    :param errors_a: per utterance incorrect counts of system a
+    :param errors_b: per utterance incorrect counts of system b, in the same order
+    :return: p-value
+    :rtype: float
+    """
+    diff = np.asarray(errors_b, dtype=np.int64) - np.asarray(errors_a, dtype=np.int64)
+    diff = diff[diff != 0]
+    n = len(diff)
+    if not n:
+        return 1.
+
+    # average ranks of |diff|, ties sharing the mean of their ranks
+    magnitudes, inverse, ties = np.unique(np.abs(diff), return_inverse=True, return_counts=True)
+    last_rank = np.cumsum(ties)
+    ranks = (last_rank - (ties - 1) / 2)[inverse]
+    w_plus = ranks[diff > 0].sum()
+
+    mean = n * (n + 1) / 4
+    variance = n * (n + 1) * (2 * n + 1) / 24 - (ties ** 3 - ties).sum() / 48
+    if variance <= 0:
+        return 1.
+    shift = w_plus - mean
+    z = (shift - math.copysign(0.5, shift) if shift else 0.) / math.sqrt(variance)
+    return _normal_p_value(z)
@@ -0,0 +1,234 @@
+"""
+Online alignment of token streams
+"""
+__all__ = ['StreamingAligner', ]
+
+import heapq
+from typing import Iterable, Iterator, List, Tuple
+
+from yasa.aligner import Aligner, BackpointerStore, NodeHeap, _DEL, _INS, _START
+from yasa.vocab import Vocabulary
+
+
+class _Window(object):
+    """
+    The not yet committed tail of a stream, indexed by absolute position: len() is the number of tokens seen so far,
+    and tokens before the committed position are freed.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._offset = 0
+
+    def __len__(self):
+        return self._offset + len(self._items)
+
+    def __getitem__(self, pos):
+        return self._items[pos - self._offset]
+
+    def extend(self, items: Iterable):
+        self._items.extend(items)
+
+    def trim(self, pos: int):
+        """Free everything before pos"""
+        if pos > self._offset:
+            del self._items[:pos - self._offset]
+            self._offset = pos
+
+
+class StreamingAligner(Aligner):
+    def __init__(self, scorer, heap_size: int, beam_width: int, lag: int = 0, recombine: bool = False,
+                 heap_class=NodeHeap, vocabulary: Vocabulary = None):
+        """
+        Beam search aligner which takes both sequences a few tokens at a time, and hands out the aligned pairs as
+        soon as they are certain.
+
+        A prefix is committed once every surviving hypothesis shares it, or, with lag > 0, once the best hypothesis
+        is more than lag positions past it (hypotheses which disagree with it are dropped). Committed tokens and
+        search nodes are freed, so memory stays flat however long the streams run, as long as heap_size is bounded.
+
+        :param scorer: object to determine the cost of operations
+        :param heap_size: heap size (0 -> infinite)
+        :param beam_width: beam width (0 -> infinite)
+        :param lag: force a commit this many aligned positions behind the best hypothesis (0 -> never force)
+        :param recombine: as in Aligner
+        :param heap_class: as in Aligner
+        :param vocabulary: as in Aligner
+        :type lag: int
+        :rtype: StreamingAligner
+        """
+        super(StreamingAligner, self).__init__(scorer, heap_size, beam_width, recombine, heap_class, vocabulary)
+        self.lag = lag
+        self.reset()
+
+    def __str__(self):
+        return "streaming, lag: {}, {}".format(self.lag, super(StreamingAligner, self).__str__())
+
+    def reset(self):
+        """Forget the streams and start aligning new ones"""
+        self._vocabulary = self.vocabulary if self.vocabulary is not None else Vocabulary()
+        self._source = _Window()
+        self._target = _Window()
+        self._source_ids = _Window()
+        self._target_ids = _Window()
+        self._closed = False
+
+        self._store = BackpointerStore()
+        self._compact_at = self.COMPACT_THRESHOLD
+        # last committed node, and the stream positions it reaches
+        self._root = -1
+        self._source_pos = self._target_pos = -1
+
+        self._heap = self._new_heap()
+        self._heap.add((0., -1, -1, -1, _START, 0.))
+
+    @property
+    def committed_cost(self) -> float:
+        """Accumulated cost of everything committed so far"""
+        return self._store.costs[self._root] if self._root >= 0 else 0.
+
+    def feed(self, source: List = (), target: List = ()) -> List[Tuple]:
+        """
+        Append tokens to either stream and advance the search as far as they allow.
+
+        :param source: new source tokens
+        :param target: new target tokens
+        :return: the newly committed (source_token, target_token) pairs; None marks an insertion or deletion
+        :rtype: list
+        """
+        if self._closed:
+            raise ValueError("Cannot feed a closed stream; reset() it first")
+        self._source.extend(source)
+        self._target.extend(target)
+        self._source_ids.extend(self._vocabulary.encode(source).tolist())
+        self._target_ids.extend(self._vocabulary.encode(target).tolist())
+        self._search()
+        return self._commit(self._common_ancestor())
+
+    def close(self) -> List[Tuple]:
+        """
+        Mark both streams as finished and finish the alignment.
+
+        :return: the remaining (source_token, target_token) pairs
+        :rtype: list
+        """
+        self._closed = True
+        self._search()
+        rank, source_pos, target_pos, parent, op, cost = self._heap.top
+        return self._commit(self._store.append(op, parent, cost))
+
+    def align_stream(self, chunks: Iterable[Tuple[List, List]]) -> Iterator[Tuple]:
+        """
+        Align two streams given as (source_tokens, target_tokens) chunks, either of which may be empty.
+
+        :return: generator of aligned (source_token, target_token) pairs, each yielded once it is committed
+        """
+        self.reset()
+        for source, target in chunks:
+            for pair in self.feed(source, target):
+                yield pair
+        for pair in self.close():
+            yield pair
+
+    def _can_expand(self, node: tuple) -> bool:
+        # every successor of node must be known, so it waits for a token of each side until the streams close
+        return self._closed or (node[1] + 1 < len(self._source) and node[2] + 1 < len(self._target))
+
+    def _search(self):
+        source, target = self._source, self._target
+        source_end, target_end = len(source) - 1, len(target) - 1
+        heap = self._heap
+        while True:
+            if self._closed:
+                top = heap.top
+                if top[1] >= source_end and top[2] >= target_end:
+                    break
+            elif not any(self._can_expand(node) for node in heap):
+                break
+
+            next_heap = self._new_heap()
+            for node in heap:
+                if self._can_expand(node):
+                    self._expand_from_node(next_heap, node, source, target, self._store, self._source_ids,
+                                           self._target_ids)
+                else:
+                    next_heap.add(node)
+            next_heap.prune()
+            heap = next_heap
+        self._heap = heap
+
+    def _common_ancestor(self) -> int:
+        """Deepest node on the path of every hypothesis (or forced by lag)"""
+        parents = self._store.parents
+        # parents are stored before their children, so the deepest pending node always has the largest index
+        pending = list({-node[3] for node in self._heap})
+        heapq.heapify(pending)
+        while len(pending) > 1:
+            idx = -heapq.heappop(pending)
+            parent = -parents[idx]
+            if parent != pending[0] and parent not in pending:
+                heapq.heappush(pending, parent)
+        ancestor = -pending[0]
+
+        if self.lag > 0:
+            idx = self._heap.top[3]
+            for _ in range(self.lag):
+                if idx <= ancestor:
+                    break
+                idx = parents[idx]
+            if idx > ancestor:
+                ancestor = idx
+                self._drop_unless_descends(ancestor)
+        return ancestor
+
+    def _drop_unless_descends(self, ancestor: int):
+        parents = self._store.parents
+        kept = self._new_heap()
+        for node in self._heap:
+            idx = node[3]
+            while idx > ancestor:
+                idx = parents[idx]
+            if idx == ancestor:
+                kept.add(node)
+        self._heap = kept
+
+    def _commit(self, ancestor: int) -> List[Tuple]:
+        """Commit the path up to ancestor, free what is behind it and return its aligned pairs"""
+        store = self._store
+        if ancestor <= self._root:
+            return []
+        ops = []
+        idx = ancestor
+        while idx != self._root:
+            ops.append(store.ops[idx])
+            idx = store.parents[idx]
+        ops.reverse()
+
+        pairs = []
+        source, target = self._source, self._target
+        for op in ops:
+            if op == _START:
+                continue
+            source_token = target_token = None
+            if op != _INS:
+                self._source_pos += 1
+                source_token = source[self._source_pos]
+            if op != _DEL:
+                self._target_pos += 1
+                target_token = target[self._target_pos]
+            pairs.append((source_token, target_token))
+
+        self._root = ancestor
+        self._source.trim(self._source_pos + 1)
+        self._source_ids.trim(self._source_pos + 1)
+        self._target.trim(self._target_pos + 1)
+        self._target_ids.trim(self._target_pos + 1)
+
+        if len(store) > self._compact_at:
+            # nothing before the root is needed any more
+            store.parents[self._root] = -1
+            heap = self._compact(store, self._heap)
+            self._root = 0
+            self._heap = heap
+            self._compact_at = max(self.COMPACT_THRESHOLD, 2 * len(store))
+        return pairs
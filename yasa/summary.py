@@ -1,8 +1,15 @@
 from __future__ import division
 
-import itertools
+import heapq
+from collections import Counter
+from operator import itemgetter
 
-__all__ = ['LabelErrorRate', 'ClassifierErrorRate', 'WordErrorRate',
+import numpy as np
+
+from yasa.aligner import OP_TYPES, _MATCH
+from yasa.vocab import Vocabulary
+
+__all__ = ['LabelErrorRate', 'ClassifierErrorRate', 'WordErrorRate', 'ConfusionCounter',
            'error_counts']
 
 _error_rate_header_format = '{:<32}{:<12}{:<12}{:<12}{:<12}'
@@ -18,13 +25,99 @@ def error_counts(alignment):
     :return: (error, count) pairs
     :rtype: list[(str,int)]
     """
-    errors = [Error.construct(n, alignment.source_seq, alignment.target_seq)
-              for n in alignment.errors()]
+    confusions = ConfusionCounter()
+    confusions.accu_alignment(alignment)
+    return confusions.type_counts()
+
+
+_count = itemgetter(1)
+
+
+class ConfusionCounter(object):
+    def __init__(self, include_matches: bool = False):
+        """
+        Counts (align_type, source token, target token) confusions over any number of alignments, for error
+        analysis of a whole corpus. Counters of shards (e.g. from worker processes) can be merged or added up.
+
+        Gaps have None as their token, so an insertion of 'x' is (AlignmentType.INS, None, 'x').
+
+        :param include_matches: count matches as well as errors
+        :type include_matches: bool
+        """
+        self.include_matches = include_matches
+        self.counts = Counter()
+
+    def accu_alignment(self, alignment):
+        columns = alignment.columns()
+        ops = columns['op']
+        keep = slice(None) if self.include_matches else np.flatnonzero(ops != _MATCH)
+        source_seq, target_seq = alignment.source_seq, alignment.target_seq
+        self.counts.update((OP_TYPES[op],
+                            source_seq[source_pos] if source_pos >= 0 else None,
+                            target_seq[target_pos] if target_pos >= 0 else None)
+                           for op, source_pos, target_pos in zip(ops[keep].tolist(),
+                                                                 columns['source_pos'][keep].tolist(),
+                                                                 columns['target_pos'][keep].tolist()))
+
+    def accu_tuple(self, align_type, source, target, count=1):
+        self.counts[(align_type, source, target)] += count
+
+    def most_common(self, k: int = None, align_type: str = None) -> list:
+        """
+        The k most frequent confusions, optionally only those of one align_type.
+
+        :param k: number of confusions (None -> all of them)
+        :param align_type: e.g. AlignmentType.SUB
+        :return: ((align_type, source, target), count) pairs, most frequent first
+        :rtype: list
+        """
+        items = self.counts.items()
+        if align_type is not None:
+            items = [item for item in items if item[0][0] == align_type]
+        if k is None:
+            return sorted(items, key=_count, reverse=True)
+        return heapq.nlargest(k, items, key=_count)
+
+    def type_counts(self) -> list:
+        """
+        :return: (align_type, count) pairs, most frequent first
+        :rtype: list
+        """
+        totals = Counter()
+        for (align_type, _, _), count in self.counts.items():
+            totals[align_type] += count
+        return totals.most_common()
+
+    def total(self, align_type: str = None) -> int:
+        if align_type is None:
+            return sum(self.counts.values())
+        return sum(count for key, count in self.counts.items() if key[0] == align_type)
 
-    counts = [(errtype, len(list(errs)))
-              for errtype, errs
-              in itertools.groupby(errors, lambda _: _.align_type)]
-    return sorted(counts, key=lambda kv: -kv[1])
+    def merge(self, other):
+        """
+        Add the counts of other to this one.
+
+        :type other: ConfusionCounter
+        :rtype: ConfusionCounter
+        """
+        self.counts.update(other.counts)
+        return self
+
+    def __add__(self, other):
+        return ConfusionCounter(self.include_matches or other.include_matches).merge(self).merge(other)
+
+    def __radd__(self, other):
+        # so that sum() works
+        return self if other == 0 else self + other
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __str__(self):
+        lines = [u"{:<10}{:<30}{:<30}{:>10}".format('Type', 'Source', 'Target', 'Count')]
+        for (align_type, source, target), count in self.most_common():
+            lines.append(u"{:<10}{:<30}{:<30}{:>10}".format(align_type, str(source), str(target), count))
+        return u"\n".join(lines)
 
 
 class Error(object):
@@ -114,6 +207,27 @@ class LabelErrorRate(object):
         elif hyp == self.label:
             self.false_positives += 1
 
+    def merge(self, other):
+        """
+        Add the counts of other, which must be for the same label, to this one.
+
+        :type other: LabelErrorRate
+        :rtype: LabelErrorRate
+        """
+        if other.label != self.label:
+            raise ValueError(u"Cannot merge error rates of '{}' and '{}'".format(self.label, other.label))
+        self.true_positives += other.true_positives
+        self.false_positives += other.false_positives
+        self.false_negatives += other.false_negatives
+        return self
+
+    def __add__(self, other):
+        return LabelErrorRate(self.label).merge(self).merge(other)
+
+    def __radd__(self, other):
+        # so that sum() works
+        return self if other == 0 else self + other
+
     @property
     def precision(self):
         denominator = self.true_positives + self.false_positives
@@ -145,48 +259,120 @@ class LabelErrorRate(object):
 
 
 class ClassifierErrorRate(object):
+    # rows of the count table
+    _TP, _FP, _FN = range(3)
+
     def __init__(self):
-        self.token_error_rates = dict()
+        """
+        Per label precision / recall of aligned (ref, hyp) pairs.
+
+        Counts live in a 3 x labels array indexed by interned label id, so alignments are counted with a few NumPy
+        ops, and error rates of shards (e.g. from worker processes) can be merged or added up.
+        """
+        self._labels = Vocabulary()
+        self._counts = np.zeros((3, 0), dtype=np.int64)
         self.overall = LabelErrorRate(None)
 
+    def _grow(self):
+        missing = len(self._labels) - self._counts.shape[1]
+        if missing > 0:
+            self._counts = np.concatenate((self._counts, np.zeros((3, missing), dtype=np.int64)), axis=1)
+
     def accu_alignment(self, alignment):
-        for ref, hyp in alignment:
-            self.overall.accu_tuple(ref, hyp)
-            self.accu_tuple(ref, hyp)
+        columns = alignment.columns()
+        source_pos, target_pos = columns['source_pos'], columns['target_pos']
+        source_ids = self._labels.encode(alignment.source_seq)
+        target_ids = self._labels.encode(alignment.target_seq)
+        self._grow()
+
+        ref = np.full(len(source_pos), -1, dtype=np.int64)
+        has_ref = source_pos >= 0
+        ref[has_ref] = source_ids[source_pos[has_ref]]
+        hyp = np.full(len(target_pos), -1, dtype=np.int64)
+        has_hyp = target_pos >= 0
+        hyp[has_hyp] = target_ids[target_pos[has_hyp]]
+
+        self._accu_ids(ref, hyp)
+        self.overall.false_negatives += int(np.count_nonzero(~has_ref))
+        self.overall.false_positives += int(np.count_nonzero(~has_hyp))
+
+    def _accu_ids(self, ref, hyp):
+        """Count pairs of label ids, -1 standing for None"""
+        n = self._counts.shape[1]
+        same = ref == hyp
+        self._counts[self._TP] += np.bincount(ref[same & (ref >= 0)], minlength=n)
+        self._counts[self._FN] += np.bincount(ref[~same & (ref >= 0)], minlength=n)
+        self._counts[self._FP] += np.bincount(hyp[~same & (hyp >= 0)], minlength=n)
 
     def accu_tuple(self, ref, hyp):
-        if ref is not None:
-            if ref not in self.token_error_rates:
-                self.token_error_rates[ref] = LabelErrorRate(ref)
+        self.overall.accu_tuple(ref, hyp)
+        ref_id = -1 if ref is None else self._labels.add(ref)
+        hyp_id = -1 if hyp is None else self._labels.add(hyp)
+        self._grow()
+        self._accu_ids(np.array([ref_id]), np.array([hyp_id]))
 
-            self.token_error_rates[ref].accu_tuple(ref, hyp)
+    def merge(self, other):
+        """
+        Add the counts of other to this one.
 
-        if hyp is not None:
-            if hyp not in self.token_error_rates:
-                self.token_error_rates[hyp] = LabelErrorRate(hyp)
+        :type other: ClassifierErrorRate
+        :rtype: ClassifierErrorRate
+        """
+        ids = self._labels.encode(other._labels.tokens).astype(np.int64)
+        self._grow()
+        self._counts[:, ids] += other._counts
+        self.overall.merge(other.overall)
+        return self
+
+    def __add__(self, other):
+        return ClassifierErrorRate().merge(self).merge(other)
+
+    def __radd__(self, other):
+        # so that sum() works
+        return self if other == 0 else self + other
+
+    def __getstate__(self):
+        # the labels are enough to rebuild the vocabulary
+        return self._labels.tokens, self._counts, self.overall
+
+    def __setstate__(self, state):
+        tokens, self._counts, self.overall = state
+        self._labels = Vocabulary(tokens)
+
+    def _error_rate(self, label_id):
+        error_rate = LabelErrorRate(self._labels.token_of(label_id))
+        error_rate.true_positives = int(self._counts[self._TP, label_id])
+        error_rate.false_positives = int(self._counts[self._FP, label_id])
+        error_rate.false_negatives = int(self._counts[self._FN, label_id])
+        return error_rate
 
-            self.token_error_rates[hyp].accu_tuple(ref, hyp)
+    @property
+    def token_error_rates(self):
+        """LabelErrorRate of every label seen, built from the counts"""
+        return {self._labels.token_of(label_id): self._error_rate(label_id) for label_id in range(len(self._labels))}
 
     def get_error_rate(self, label):
-        return self.token_error_rates.get(label)
+        label_id = self._labels.get(label)
+        return None if label_id is None else self._error_rate(label_id)
 
     def __str__(self):
         return self.as_string()
 
     def as_string(self, labels=None):
-        s = ERROR_RATE_HEADER + '\n'
+        lines = [ERROR_RATE_HEADER]
         if labels is not None:
             for key in labels:
-                if key not in self.token_error_rates:
-                    s += '{:<32}{}\n'.format(key, 'NOT OBSERVED')
+                error_rate = self.get_error_rate(key)
+                if error_rate is None:
+                    lines.append('{:<32}{}'.format(key, 'NOT OBSERVED'))
                 else:
-                    error_rate = self.token_error_rates[key]
-                    s += '{}\n'.format(error_rate)
+                    lines.append('{}'.format(error_rate))
         else:
             for key, error_rate in self.token_error_rates.items():
                 if error_rate.accuracy < 1:
-                    s += '{}\n'.format(error_rate)
-        return s
+                    lines.append('{}'.format(error_rate))
+        lines.append('')
+        return '\n'.join(lines)
 
 
 class WordErrorRate(object):
@@ -198,6 +384,29 @@ class WordErrorRate(object):
         self.correct += alignment.correct_n()
         self.incorrect += alignment.errors_n()
 
+    def accu_counts(self, correct, incorrect):
+        """Count an alignment from its counts alone, e.g. align_many(..., result='counts')"""
+        self.correct += correct
+        self.incorrect += incorrect
+
+    def merge(self, other):
+        """
+        Add the counts of other to this one.
+
+        :type other: WordErrorRate
+        :rtype: WordErrorRate
+        """
+        self.correct += other.correct
+        self.incorrect += other.incorrect
+        return self
+
+    def __add__(self, other):
+        return WordErrorRate().merge(self).merge(other)
+
+    def __radd__(self, other):
+        # so that sum() works
+        return self if other == 0 else self + other
+
     @property
     def wer(self):
         return self.incorrect / (self.correct + self.incorrect)
@@ -0,0 +1,188 @@
+"""
+Token interning
+"""
+__all__ = ['Vocabulary', 'EncodedTokens', ]
+
+import json
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+
+class Vocabulary(object):
+    def __init__(self, tokens: Iterable = ()):
+        """
+        Maps tokens to dense integer ids, so aligners can compare (and scorers can look up) integers instead of raw
+        tokens. Ids are assigned in order of first appearance and never change, so a single vocabulary can be
+        shared by every alignment of a corpus.
+
+        Tokens are looked up by hash; unhashable ones (e.g. lists) work too, but are compared with == against every
+        unhashable token seen so far, so keep few distinct ones.
+
+        :param tokens: tokens to add up front
+        :rtype: Vocabulary
+        """
+        self._ids = dict()
+        self._tokens = []
+        # ids of the unhashable tokens, found by equality
+        self._unhashable = []
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, token):
+        return self.get(token) is not None
+
+    def __iter__(self):
+        return iter(self._tokens)
+
+    @property
+    def tokens(self) -> List:
+        """Tokens ordered by id"""
+        return list(self._tokens)
+
+    def add(self, token) -> int:
+        """
+        Add token if it's new.
+
+        :return: id of token
+        """
+        try:
+            idx = self._ids.get(token)
+        except TypeError:
+            idx = self._find_unhashable(token)
+            if idx is None:
+                idx = len(self._tokens)
+                self._unhashable.append(idx)
+                self._tokens.append(token)
+            return idx
+        if idx is None:
+            idx = self._ids[token] = len(self._tokens)
+            self._tokens.append(token)
+        return idx
+
+    def _find_unhashable(self, token):
+        tokens = self._tokens
+        for idx in self._unhashable:
+            if tokens[idx] == token:
+                return idx
+        return None
+
+    def id_of(self, token) -> int:
+        """
+        :raises KeyError: when token is not in the vocabulary
+        """
+        idx = self.get(token)
+        if idx is None:
+            raise KeyError(token)
+        return idx
+
+    def get(self, token, default=None):
+        """Id of token, or default when it is not in the vocabulary"""
+        try:
+            return self._ids.get(token, default)
+        except TypeError:
+            idx = self._find_unhashable(token)
+            return default if idx is None else idx
+
+    def token_of(self, idx: int):
+        return self._tokens[idx]
+
+    def encode(self, tokens: List, grow: bool = True) -> np.ndarray:
+        """
+        Encode tokens as an int32 array of ids.
+
+        :param tokens:
+        :param grow: add unknown tokens; otherwise they raise a KeyError
+        :rtype: np.ndarray
+        """
+        if isinstance(tokens, EncodedTokens) and tokens.vocabulary is self:
+            # already ids of this vocabulary, e.g. a slice of a memory mapped corpus; no copy
+            return tokens.ids
+        ids = self._ids
+        try:
+            if grow:
+                missing = set(tokens).difference(ids)
+                if missing:
+                    for token in tokens:
+                        if token in missing:
+                            self.add(token)
+            return np.fromiter(map(ids.__getitem__, tokens), dtype=np.int32, count=len(tokens))
+        except TypeError:
+            # some tokens are unhashable: one at a time
+            return np.fromiter(map(self.add if grow else self.id_of, tokens), dtype=np.int32, count=len(tokens))
+
+    def decode(self, ids: Iterable[int]) -> List:
+        """
+        Map ids back to their tokens.
+
+        :rtype: list
+        """
+        tokens = self._tokens
+        return [tokens[idx] for idx in ids]
+
+    def save(self, path: str):
+        """
+        Write the tokens, ordered by id, one JSON value per line; tokens must be strings or numbers.
+
+        :param path: file to write
+        """
+        with open(path, 'w', encoding='utf-8') as ofp:
+            for token in self._tokens:
+                ofp.write(json.dumps(token, ensure_ascii=False))
+                ofp.write('\n')
+
+    @classmethod
+    def load(cls, path: str) -> 'Vocabulary':
+        """
+        Read a vocabulary written by save; every token keeps its id.
+
+        :rtype: Vocabulary
+        """
+        with open(path, encoding='utf-8') as ifp:
+            return cls(json.loads(line) for line in ifp)
+
+
+class EncodedTokens(Sequence):
+    def __init__(self, ids: np.ndarray, vocabulary: Vocabulary):
+        """
+        Read-only sequence of the tokens of ids, decoded one at a time as they are asked for. Aligners whose
+        vocabulary is the same one use ids as they are, so a slice of a memory mapped corpus is aligned without
+        copying or decoding it.
+
+        :param ids: token ids of vocabulary
+        :param vocabulary: the vocabulary of ids
+        :type ids: np.ndarray
+        :type vocabulary: Vocabulary
+        :rtype: EncodedTokens
+        """
+        self.ids = ids
+        self.vocabulary = vocabulary
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return EncodedTokens(self.ids[item], self.vocabulary)
+        return self.vocabulary.token_of(self.ids[item])
+
+    def __iter__(self):
+        return iter(self.vocabulary.decode(self.ids.tolist()))
+
+    def __eq__(self, other):
+        if isinstance(other, EncodedTokens) and other.vocabulary is self.vocabulary:
+            return np.array_equal(self.ids, other.ids)
+        return isinstance(other, (EncodedTokens, list, tuple)) and list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "EncodedTokens({!r})".format(list(self))
+
+    def __reduce__(self):
+        # a slice of a memory map would pickle the vocabulary with it; tokens are what the other side needs
+        return list, (list(self),)